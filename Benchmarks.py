@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the simulation and estimation hot paths of COMPASS.
+
+The suite times the building blocks of a power analysis for several numbers of trials and participants:
+    create_design, create_design_bank, simulate_responses, simulate_responses_cohort, likelihood,
+    fit_participant (for each estimator), correlation_repetition, groupdifference_repetition and a small end-to-end power analysis.
+likelihood and simulate_responses_cohort are also timed for tasks with more stimuli and responses (e.g. likelihood_4x4: 4 stimuli X 4 responses).
+All inputs are derived from fixed seeds, so each benchmark does the same work on every commit.
+The results are saved as json (with the commit, the kernel backend and the machine) and as csv in the output folder,
+so runs on different commits can be compared with compare_benchmarks().
+
+Usage:
+    python Benchmarks.py                                  run the full suite
+    python Benchmarks.py --quick                          run a small suite (a few seconds)
+    python Benchmarks.py --compare old.json new.json      compare two saved runs and flag regressions
+"""
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import contextlib
+import numpy as np
+import pandas as pd
+import Kernels
+from Functions import (create_design, create_design_bank, simulate_responses, simulate_responses_cohort, simulate_designs, likelihood,
+                       fit_participant, correlation_repetition, groupdifference_repetition, design_generator, participant_generator,
+                       generate_parameters)
+
+#%% Timing
+
+def time_function(function, nrepeats = 5, minimal_time = 0.05):
+    """
+    Parameters
+    ----------
+    function : callable
+        Function without arguments that is timed.
+    nrepeats : integer, optional
+        Number of times the timing is repeated. The default is 5.
+    minimal_time : float, optional
+        Minimal duration of one timing in seconds: fast functions are called several times per timing. The default is 0.05.
+
+    Returns
+    -------
+    timing : dict
+        'median_seconds' and 'best_seconds': the median and the smallest time per call over the repeats,
+        'ncalls': the number of calls per repeat and 'nrepeats'.
+
+    Description
+    -----------
+    Function to time one benchmark. The function is called once before the timing (e.g. to compile numba kernels);
+    the number of calls per repeat is then doubled until one repeat takes at least minimal_time, so that the timer resolution does not matter.
+    The median is robust to a single disturbed repeat, the best time is the closest to the undisturbed cost.
+    """
+    function()
+    ncalls = 1
+    while True:
+        t0 = time.perf_counter()
+        for call in range(ncalls): function()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= minimal_time: break
+        ncalls *= 2
+    timings = [elapsed / ncalls]
+    for repeat in range(nrepeats - 1):
+        t0 = time.perf_counter()
+        for call in range(ncalls): function()
+        timings.append((time.perf_counter() - t0) / ncalls)
+    return {'median_seconds': float(np.median(timings)), 'best_seconds': float(np.min(timings)), 'ncalls': ncalls, 'nrepeats': nrepeats}
+
+def benchmark_data(ntrials, npp, seed = 0):
+    """
+    Parameters
+    ----------
+    ntrials, npp : integer
+        Number of trials and participants.
+    seed : integer, optional
+        Seed of the design and the participants. The default is 0.
+
+    Returns
+    -------
+    design : numpy array, shape = (ntrials X 5)
+        A design, see function create_design().
+    data : numpy array, shape = (ntrials X 5)
+        The design with the simulated responses of one participant (LR = 0.5, inverse temperature = 2) in column 2.
+
+    Description
+    -----------
+    Function to create the inputs of the benchmarks; the same seed always gives the same inputs.
+    """
+    design = create_design(ntrials = ntrials, nreversals = max(1, ntrials // 40), reward_probability = 0.8, rng = design_generator(seed))
+    data = np.array(design)
+    data[:, 2] = simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 2.0, design = design, rng = participant_generator(seed, 0, 0))
+    return design, data
+
+def benchmark_cases(ntrials_values = (120, 480, 2000), npp_values = (10, 40), estimators = ('Nelder-Mead', 'profile', 'L-BFGS-B'), pool = None,
+                    tasks = ((4, 4), (8, 8))):
+    """
+    Parameters
+    ----------
+    ntrials_values : tuple, optional
+        The numbers of trials for which each benchmark is done. The default is (120, 480, 2000).
+    npp_values : tuple, optional
+        The numbers of participants for which the cohort and repetition benchmarks are done. The default is (10, 40).
+    estimators : tuple, optional
+        The estimators for which fit_participant is timed (see function fit_participant()). The default is ('Nelder-Mead', 'profile', 'L-BFGS-B').
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes for the end-to-end power analysis (see function create_executor() in PowerAnalysis.py).
+        When None, the end-to-end benchmark is skipped. The default is None.
+    tasks : tuple of (nstimuli, nactions), optional
+        The larger tasks for which likelihood and simulate_responses_cohort are timed as well. The default is ((4, 4), (8, 8)).
+
+    Yields
+    ------
+    case : dict
+        The name of the benchmark and its settings (ntrials, npp, estimator).
+    function : callable
+        Function without arguments that executes the benchmark once.
+
+    Description
+    -----------
+    Function that defines the benchmarks. The group difference benchmark uses npp // 2 participants per group, so both repetitions fit npp participants.
+    The functions use the loop variables of this generator, so each function should be timed before the next one is asked for (as in run_benchmarks()).
+    """
+    LR_distribution, inverseTemp_distribution = np.array([0.5, 0.1]), np.array([2.0, 1.0])
+    LR_distributions = np.array([[0.475, 0.1], [0.525, 0.1]])
+    for ntrials in ntrials_values:
+        design, data = benchmark_data(ntrials, max(npp_values))
+        nreversals = max(1, ntrials // 40)
+        yield ({'benchmark': 'create_design', 'ntrials': ntrials},
+               lambda: create_design(ntrials = ntrials, nreversals = nreversals, rng = design_generator(0)))
+        yield ({'benchmark': 'create_design_bank_100', 'ntrials': ntrials},
+               lambda: create_design_bank(100, ntrials = ntrials, nreversals = nreversals, rng = design_generator(0)))
+        yield ({'benchmark': 'simulate_responses', 'ntrials': ntrials},
+               lambda: simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 2.0, design = design, rng = participant_generator(0, 0, 0)))
+        yield ({'benchmark': 'likelihood', 'ntrials': ntrials}, lambda: likelihood(np.array([0.5, 2.0]), data))
+        for estimator in estimators:
+            yield ({'benchmark': 'fit_participant', 'ntrials': ntrials, 'estimator': estimator},
+                   lambda: fit_participant(data, estimator = estimator, rng = participant_generator(0, 0, 0)))
+        for npp in npp_values:
+            rngs = lambda: [participant_generator(0, 0, pp) for pp in range(npp)]
+            yield ({'benchmark': 'simulate_responses_cohort', 'ntrials': ntrials, 'npp': npp},
+                   lambda: simulate_responses_cohort(simulation_LRs = np.full(npp, 0.5), simulation_inverseTemps = np.full(npp, 2.0),
+                                                     design = design, rng = rngs()))
+            yield ({'benchmark': 'correlation_repetition', 'ntrials': ntrials, 'npp': npp, 'estimator': 'Nelder-Mead'},
+                   lambda: correlation_repetition(inverseTemp_distribution, LR_distribution, npp, ntrials, design, 1, seed = 0))
+            yield ({'benchmark': 'groupdifference_repetition', 'ntrials': ntrials, 'npp': npp, 'estimator': 'Nelder-Mead'},
+                   lambda: groupdifference_repetition(inverseTemp_distribution, LR_distributions, npp // 2, ntrials, design, 1, seed = 0))
+        for nstimuli, nactions in tasks:
+            task = '{}x{}'.format(nstimuli, nactions)
+            task_design = create_design(ntrials = ntrials, nreversals = nreversals, reward_probability = 0.8, rng = design_generator(0),
+                                        nstimuli = nstimuli, nactions = nactions)
+            task_data = np.array(task_design)
+            task_data[:, 2] = simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 2.0, design = task_design, rng = participant_generator(0, 0, 0),
+                                                 nactions = nactions)
+            yield ({'benchmark': 'likelihood_' + task, 'ntrials': ntrials}, lambda: likelihood(np.array([0.5, 2.0]), task_data, nactions))
+            for npp in npp_values:
+                rngs = lambda: [participant_generator(0, 0, pp) for pp in range(npp)]
+                yield ({'benchmark': 'simulate_responses_cohort_' + task, 'ntrials': ntrials, 'npp': npp},
+                       lambda: simulate_responses_cohort(simulation_LRs = np.full(npp, 0.5), simulation_inverseTemps = np.full(npp, 2.0),
+                                                         design = task_design, rng = rngs(), nactions = nactions))
+    if pool is not None:
+        # imported here, since PowerAnalysis.py also imports the plotting libraries
+        from PowerAnalysis import power_estimation_correlation
+        ntrials, npp = min(ntrials_values), min(npp_values)
+        def power_run():
+            # the printed output of the power analysis is not shown
+            with contextlib.redirect_stdout(io.StringIO()):
+                power_estimation_correlation(npp = npp, ntrials = ntrials, nreversals = max(1, ntrials // 40), nreps = 4, cut_off = 0.5,
+                                             pool = pool, seed = 0)
+        yield {'benchmark': 'power_estimation_correlation_4reps', 'ntrials': ntrials, 'npp': npp, 'estimator': 'Nelder-Mead'}, power_run
+
+#%% Calibration of the cost model (see function dry_run() in PowerAnalysis.py)
+
+def process_memory():
+    """Peak memory of this process in bytes (the maximal resident set size); None when it is not available (e.g. on Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+def calibrate_costs(fit_settings = (('Nelder-Mead', 'random'), ), tasks = ((2, 2), ), ntrials_values = (100, 400), nparticipants = 8, seed = 0):
+    """
+    Parameters
+    ----------
+    fit_settings : tuple, optional
+        The (estimator, initialisation) pairs that are calibrated (see function fit_participant()): e.g. the grid initialisation 
+        needs fewer optimizer iterations but evaluates the whole grid first. The default is (('Nelder-Mead', 'random'), ).
+    tasks : tuple, optional
+        The (nstimuli, nactions) of the tasks that are calibrated (see function create_design()): with more responses 
+        each trial of the simulation and the likelihood costs more. The default is ((2, 2), ).
+    ntrials_values : tuple, optional
+        The numbers of trials at which the costs are measured; the costs are interpolated linearly in ntrials. The default is (100, 400).
+    nparticipants : integer, optional
+        Number of participants whose simulation and estimation are timed for each number of trials. The default is 8.
+    seed : integer, optional
+        Seed of the designs and the participants. The default is 0.
+
+    Returns
+    -------
+    calibration : dict
+        Coefficients [slope, intercept] of a line in ntrials (use np.polyval()) for:
+            'simulation': {(nstimuli, nactions): seconds to simulate the responses of one participant},
+            'likelihood': {(nstimuli, nactions): seconds of one likelihood evaluation (the kernel only)},
+            'evaluation': {(estimator, initialisation, nstimuli, nactions): seconds per likelihood evaluation during the estimation, the work of the optimizer included},
+            'memory': {(estimator, initialisation, nstimuli, nactions): bytes allocated at the same time while one participant is simulated and estimated};
+        'nfev': {(estimator, initialisation, nstimuli, nactions): mean number of likelihood evaluations to estimate the parameters of one participant (restarts included)},
+        'process_memory': the peak memory of this process (a process that has imported and used the kernels) in bytes, None when not available,
+        'backend', 'ntrials_values' and 'calibration_seconds'.
+
+    Description
+    -----------
+    Function to measure on this machine what the building blocks of a power analysis cost, so the wall time and memory of a power analysis
+    can be predicted before it is started (see function predict_row() in PowerAnalysis.py). The participants are drawn from the parameter
+    distributions of the power analyses (learning rate N(0.5, 0.1), inverse temperature N(2, 1)). The estimation of one participant then costs
+    nfev x the cost of one evaluation: the number of evaluations hardly depends on ntrials, but varies between participants (restarts),
+    so it is averaged over all measurements instead of being interpolated. The memory of one participant is measured
+    with tracemalloc (numpy arrays included) in a separate pass, since tracemalloc slows the timed code down.
+    """
+    import tracemalloc
+    calibration_start = time.perf_counter()
+    tasks = [tuple(task) for task in tasks]
+    fit_tasks = [tuple(fit_setting) + task for fit_setting in fit_settings for task in tasks]
+    costs = {'simulation': {task: [] for task in tasks}, 'likelihood': {task: [] for task in tasks}, 'evaluation': {fit_task: [] for fit_task in fit_tasks},
+             'nfev': {fit_task: [] for fit_task in fit_tasks}, 'memory': {fit_task: [] for fit_task in fit_tasks}}
+    for (nstimuli, nactions), ntrials in [(task, ntrials) for task in tasks for ntrials in ntrials_values]:
+        design = create_design(ntrials = ntrials, nreversals = max(1, ntrials // 40), reward_probability = 0.8, rng = design_generator(seed),
+                               nstimuli = nstimuli, nactions = nactions)
+        rngs = lambda: [participant_generator(seed, 0, pp) for pp in range(nparticipants)]
+        # the true parameters are drawn as in correlation_repetition(): first the learning rates, then the inverse temperatures
+        participant_rngs = rngs()
+        LRs = generate_parameters(mean = 0.5, std = 0.1, rng = participant_rngs)
+        inverseTemps = generate_parameters(mean = 2.0, std = 1.0, rng = participant_rngs)
+        designs = [design] * nparticipants
+        costs['simulation'][(nstimuli, nactions)].append(time_function(lambda: simulate_designs(LRs, inverseTemps, designs, rngs(), nactions = nactions), 
+                                                                       nrepeats = 3)['best_seconds'] / nparticipants)
+        responses = simulate_designs(LRs, inverseTemps, designs, rngs(), nactions = nactions)
+        datasets = [np.array(design, dtype = np.int64) for pp in range(nparticipants)]
+        for pp in range(nparticipants): datasets[pp][:, 2] = responses[pp]
+        costs['likelihood'][(nstimuli, nactions)].append(time_function(lambda: likelihood(np.array([0.5, 2.0]), datasets[0], nactions), 
+                                                                       nrepeats = 3)['best_seconds'])
+        for estimator, initialisation in fit_settings:
+            fit_task = (estimator, initialisation, nstimuli, nactions)
+            # the first estimation also compiles (or loads) the kernels of this estimator
+            fit_participant(datasets[0], estimator = estimator, initialisation = initialisation, rng = participant_generator(seed, 1, 0), nactions = nactions)
+            t0 = time.perf_counter()
+            fit_infos = [fit_participant(datasets[pp], estimator = estimator, initialisation = initialisation,
+                                         rng = participant_generator(seed, 1, pp), nactions = nactions)[1] for pp in range(nparticipants)]
+            nfev = np.sum([fit_info['nfev'] for fit_info in fit_infos])
+            costs['evaluation'][fit_task].append((time.perf_counter() - t0) / nfev)
+            costs['nfev'][fit_task].append(nfev / nparticipants)
+            tracemalloc.start()
+            data = np.array(design, dtype = np.int64)
+            data[:, 2] = simulate_responses(simulation_LR = LRs[0], simulation_inverseTemp = inverseTemps[0], design = design,
+                                            rng = participant_generator(seed, 0, 0), nactions = nactions)
+            fit_participant(data, estimator = estimator, initialisation = initialisation, rng = participant_generator(seed, 1, 0), nactions = nactions)
+            costs['memory'][fit_task].append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    # a line through the measurements: [slope, intercept]
+    line = lambda values: np.polyfit(ntrials_values, values, 1).tolist()
+    calibration = {cost: {task: line(costs[cost][task]) for task in tasks} for cost in ['simulation', 'likelihood']}
+    for cost in ['evaluation', 'memory']: calibration[cost] = {fit_task: line(costs[cost][fit_task]) for fit_task in fit_tasks}
+    calibration['nfev'] = {fit_task: float(np.mean(costs['nfev'][fit_task])) for fit_task in fit_tasks}
+    # measured after the calibration: the memory of a worker includes the compiled kernels
+    calibration.update({'process_memory': process_memory(), 'backend': Kernels.get_backend(), 'ntrials_values': list(ntrials_values),
+                        'calibration_seconds': time.perf_counter() - calibration_start})
+    return calibration
+
+#%% Running, saving and comparing
+
+def benchmark_metadata():
+    """
+    Returns
+    -------
+    metadata : dict
+        The commit (with '-dirty' when the working tree has uncommitted changes), the date, the kernel backend
+        and the versions of python and numpy and the machine on which the benchmarks are run.
+
+    Description
+    -----------
+    Function to describe a benchmark run, so that runs on different commits (or machines) can be told apart.
+    When git is not available, the commit is 'unknown'.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = folder, capture_output = True, text = True, check = True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd = folder, capture_output = True, text = True).stdout.strip()
+        if changes != '': commit += '-dirty'
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    return {'commit': commit, 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'backend': Kernels.get_backend(),
+            'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+def run_benchmarks(ntrials_values = (120, 480, 2000), npp_values = (10, 40), estimators = ('Nelder-Mead', 'profile', 'L-BFGS-B'),
+                   nrepeats = 5, end_to_end = True, output_folder = 'Benchmarks'):
+    """
+    Parameters
+    ----------
+    ntrials_values, npp_values, estimators : tuple, optional
+        The settings of the benchmarks, see function benchmark_cases().
+    nrepeats : integer, optional
+        Number of timings of each benchmark, see function time_function(). The default is 5.
+    end_to_end : bool, optional
+        Whether a small power analysis is timed as well (with one worker process). The default is True.
+    output_folder : string, optional
+        Folder in which the results are saved. When None, the results are not saved. The default is 'Benchmarks'.
+
+    Returns
+    -------
+    results : pandas DataFrame
+        One row per benchmark: its name and settings, the median and best time per call in seconds,
+        the number of calls per timing and the number of timings. The commit and backend are added as columns.
+    output_file : string
+        Path of the json file with the metadata and the results (the csv file has the same name); None when the results are not saved.
+
+    Description
+    -----------
+    Function to run the benchmark suite. The files are named after the commit and the date,
+    e.g. Benchmarks/benchmark_1a2b3c4_20220310-101500.json.
+    """
+    metadata = benchmark_metadata()
+    print("Benchmarks on commit {} with the {} backend".format(metadata['commit'], metadata['backend']))
+    pool = None
+    if end_to_end:
+        from PowerAnalysis import create_executor
+        pool = create_executor(1)
+    records = []
+    try:
+        for case, function in benchmark_cases(ntrials_values = ntrials_values, npp_values = npp_values, estimators = estimators, pool = pool):
+            record = dict({'benchmark': None, 'ntrials': None, 'npp': None, 'estimator': None}, **case)
+            record.update(time_function(function, nrepeats = nrepeats))
+            records.append(record)
+            print("{:<36} ntrials = {:<6} npp = {:<5} {:<12} {:.6f} s".format(record['benchmark'], record['ntrials'], str(record['npp'] or ''),
+                                                                              str(record['estimator'] or ''), record['median_seconds']))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    results = pd.DataFrame(records)
+    results['commit'], results['backend'] = metadata['commit'], metadata['backend']
+    output_file = None
+    if output_folder is not None:
+        if not os.path.isdir(output_folder): os.makedirs(output_folder)
+        name = 'benchmark_{}_{}'.format(metadata['commit'], time.strftime('%Y%m%d-%H%M%S'))
+        output_file = os.path.join(output_folder, name + '.json')
+        with open(output_file, 'w') as file:
+            json.dump({'metadata': metadata, 'results': records}, file, indent = 1)
+        results.to_csv(os.path.join(output_folder, name + '.csv'), sep = ';', index = False)
+        print("Results saved in {} (and .csv)".format(output_file))
+    return results, output_file
+
+def read_benchmarks(benchmark_file):
+    """Function to read the results of a benchmark run saved by run_benchmarks() (json or csv file) as a pandas DataFrame."""
+    if benchmark_file.endswith('.csv'): return pd.read_csv(benchmark_file, delimiter = ';')
+    with open(benchmark_file) as file:
+        saved = json.load(file)
+    results = pd.DataFrame(saved['results'])
+    results['commit'], results['backend'] = saved['metadata']['commit'], saved['metadata']['backend']
+    return results
+
+def compare_benchmarks(reference_file, new_file, tolerance = 0.1):
+    """
+    Parameters
+    ----------
+    reference_file, new_file : string
+        Results of two benchmark runs (json or csv files saved by run_benchmarks()), e.g. before and after a change.
+    tolerance : float, optional
+        Relative slowdown that is accepted: a benchmark is flagged as a regression when its best time increased
+        by more than this fraction (and as an improvement when it decreased by more than this fraction). The default is 0.1.
+
+    Returns
+    -------
+    comparison : pandas DataFrame
+        For each benchmark in both runs: the best time per call in both runs, the ratio new / reference and the verdict.
+
+    Description
+    -----------
+    Function to compare two benchmark runs. The best time is compared, since it is least affected by other processes on the machine;
+    compare runs on the same machine and with the same backend.
+    """
+    keys = ['benchmark', 'ntrials', 'npp', 'estimator']
+    reference, new = read_benchmarks(reference_file), read_benchmarks(new_file)
+    for results in [reference, new]:
+        # missing settings are stored as None (json) or NaN (csv); a common placeholder makes the runs comparable
+        results[keys] = results[keys].astype(object).where(results[keys].notna(), '-').astype(str)
+        results['npp'] = results['npp'].str.replace('.0', '', regex = False)
+        results['ntrials'] = results['ntrials'].str.replace('.0', '', regex = False)
+    comparison = reference[keys + ['best_seconds']].merge(new[keys + ['best_seconds']], on = keys, suffixes = ('_reference', '_new'))
+    comparison['ratio'] = comparison['best_seconds_new'] / comparison['best_seconds_reference']
+    comparison['verdict'] = np.where(comparison['ratio'] > 1 + tolerance, 'REGRESSION',
+                                     np.where(comparison['ratio'] < 1 - tolerance, 'improvement', 'same'))
+    print("Reference: commit {} ({} backend); new: commit {} ({} backend)".format(reference['commit'].iloc[0], reference['backend'].iloc[0],
+                                                                                 new['commit'].iloc[0], new['backend'].iloc[0]))
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(comparison.round(6).to_string(index = False))
+    print("{} regressions, {} improvements (tolerance {}%)".format(np.sum(comparison['verdict'] == 'REGRESSION'),
+                                                                np.sum(comparison['verdict'] == 'improvement'), tolerance*100))
+    return comparison
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Benchmarks for the simulation and estimation hot paths of COMPASS.")
+    parser.add_argument('--quick', action = 'store_true', help = "small suite: ntrials 120 and 480, npp 10, 3 repeats")
+    parser.add_argument('--ntrials', type = int, nargs = '+', default = [120, 480, 2000], help = "numbers of trials")
+    parser.add_argument('--npp', type = int, nargs = '+', default = [10, 40], help = "numbers of participants")
+    parser.add_argument('--repeats', type = int, default = 5, help = "number of timings of each benchmark")
+    parser.add_argument('--backend', default = None, help = "kernel backend: auto, numpy or numba (default: COMPASS_BACKEND or auto)")
+    parser.add_argument('--no_end_to_end', action = 'store_true', help = "skip the small end-to-end power analysis")
+    parser.add_argument('--output_folder', default = 'Benchmarks', help = "folder for the json and csv files")
+    parser.add_argument('--compare', nargs = 2, metavar = ('REFERENCE', 'NEW'), help = "compare two saved runs instead of running the suite")
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = "relative slowdown flagged as regression in --compare")
+    arguments = parser.parse_args()
+    if arguments.compare is not None:
+        comparison = compare_benchmarks(arguments.compare[0], arguments.compare[1], tolerance = arguments.tolerance)
+        sys.exit(1 if np.any(comparison['verdict'] == 'REGRESSION') else 0)
+    # the worker process of the end-to-end benchmark uses the same backend (see function create_executor() in PowerAnalysis.py)
+    if arguments.backend is not None: Kernels.set_backend(arguments.backend)
+    if arguments.quick:
+        arguments.ntrials, arguments.npp, arguments.repeats = [120, 480], [10], 3
+    run_benchmarks(ntrials_values = tuple(arguments.ntrials), npp_values = tuple(arguments.npp), nrepeats = arguments.repeats,
+                   end_to_end = not arguments.no_end_to_end, output_folder = arguments.output_folder)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Store of the simulated datasets of a power analysis, so other estimators, criteria or cut-offs can be tried on the same datasets
+without simulating them again (see function refit_store() in PowerAnalysis.py).
+
+A store is a folder with memory-mapped numpy files:
+    data.npy: uint8 array (nreps X npp X 5 X ceil(ntrials / 8)), the five columns of the data of each participant
+        (rule, stimulus, response, correct response, feedback; see function create_design() in Functions.py), one bit per trial;
+        with more than 2 stimuli or responses the columns do not fit in one bit, then data.npy is (nreps X npp X 5 X ntrials), one byte per trial;
+    parameters.npy: float array (nreps X npp X 2), the true learning rate and inverse temperature of each participant;
+    stored.npy: bool array (nreps X npp), whether the dataset of each participant is stored;
+    store.json: the shape of the store, whether the data are stored as bits ('packed') and the simulation configuration it belongs to.
+With one bit per trial and column, 1000 repetitions of 200 participants with 10000 trials take ca. 1.25 GB.
+"""
+
+import os
+import json
+import uuid
+import numpy as np
+
+# number of columns of the data of a participant (see function create_design() in Functions.py)
+ncolumns = 5
+
+def configuration_text(configuration):
+    """Function to write a configuration as text; numpy numbers and arrays are converted to python numbers and lists (as in PowerAnalysis.cache_file())."""
+    return json.dumps(configuration, sort_keys = True, default = lambda value: value.tolist())
+
+def read_metadata(store_folder):
+    """Function to read store.json of a store; None when the store does not exist."""
+    metadata_file = os.path.join(store_folder, 'store.json')
+    if not os.path.isfile(metadata_file): return None
+    with open(metadata_file) as file: return json.load(file)
+
+def create_store(store_folder, nreps, npp, ntrials, configuration):
+    """
+    Parameters
+    ----------
+    store_folder : string
+        Folder of the store. It is created when it does not exist.
+    nreps, npp, ntrials : integer
+        Number of repetitions, participants per repetition (both groups together for the group difference criterion) and trials.
+    configuration : dict
+        Everything that determines the simulated datasets: criterion, design, parameter distributions and master seed
+        (thus not the estimation settings or the cut-off). The number of stimuli and responses ('nstimuli' and 'nactions') are 2 when absent.
+
+    Returns
+    -------
+    metadata : dict
+        The content of store.json.
+
+    Description
+    -----------
+    Function to prepare a store for the datasets of a power analysis. When the folder already holds a store with the same configuration,
+    participants and trials, this store is kept, so the datasets of an interrupted power analysis are not lost; when it has fewer repetitions
+    than nreps, it is grown (see function grow_store()). Otherwise a new, empty store is made. 
+    The files are created sparse: disk space is only used for the datasets that are written.
+    """
+    metadata = read_metadata(store_folder)
+    if (metadata is not None and metadata['configuration'] == configuration_text(configuration)
+        and metadata['npp'] == npp and metadata['ntrials'] == ntrials):
+        return metadata if metadata['nreps'] >= nreps else grow_store(store_folder, metadata, nreps)
+    os.makedirs(store_folder, exist_ok = True)
+    nreps, npp, ntrials = int(nreps), int(npp), int(ntrials)
+    # one bit per trial when all columns are 0 or 1 (2 stimuli and 2 responses), otherwise one byte per trial
+    packed = max(configuration.get('nstimuli', 2), configuration.get('nactions', 2)) <= 2
+    metadata = {'nreps': nreps, 'npp': npp, 'ntrials': ntrials, 'packed': packed, 'configuration': configuration_text(configuration),
+                # processes that still have the files of an earlier store open see from the id that the store was made again
+                'id': uuid.uuid4().hex}
+    for name, dtype, shape in [('data', np.uint8, (nreps, npp, ncolumns, int(np.ceil(ntrials / 8)) if packed else ntrials)),
+                               ('parameters', np.float64, (nreps, npp, 2)), ('stored', np.bool_, (nreps, npp))]:
+        file = os.path.join(store_folder, '{}.npy'.format(name))
+        if os.path.isfile(file): os.remove(file)
+        np.lib.format.open_memmap(file, mode = 'w+', dtype = dtype, shape = shape).flush()
+    with open(os.path.join(store_folder, 'store.json'), 'w') as file: json.dump(metadata, file)
+    return metadata
+
+def grow_store(store_folder, metadata, nreps):
+    """
+    Parameters
+    ----------
+    store_folder : string
+        Folder of the store, see function create_store().
+    metadata : dict
+        The content of store.json of this store.
+    nreps : integer
+        The new number of repetitions, larger than metadata['nreps'].
+
+    Returns
+    -------
+    metadata : dict
+        The new content of store.json.
+
+    Description
+    -----------
+    Function to add repetitions to a store, e.g. when a power analysis is done again with more repetitions. Each file is made again with nreps
+    repetitions next to the old one and replaces it when the stored datasets are copied; the new files are sparse as well.
+    The store gets a new id, so processes that still have the old files open read the new ones (see function open_store()).
+    """
+    nreps = int(nreps)
+    stored = np.load(os.path.join(store_folder, 'stored.npy'), mmap_mode = 'r')
+    stored_reps = np.flatnonzero(np.any(stored, axis = 1))
+    del stored
+    for name in ['data', 'parameters', 'stored']:
+        file = os.path.join(store_folder, '{}.npy'.format(name))
+        old = np.load(file, mmap_mode = 'r')
+        temporary_file = os.path.join(store_folder, '{}.{}.tmp.npy'.format(name, uuid.uuid4().hex))
+        new = np.lib.format.open_memmap(temporary_file, mode = 'w+', dtype = old.dtype, shape = (nreps, ) + old.shape[1:])
+        # only the repetitions with stored datasets are copied, so the disk space of the other repetitions is not used
+        for rep in stored_reps: new[rep] = old[rep]
+        new.flush()
+        del old, new
+        os.replace(temporary_file, file)
+    metadata = dict(metadata, nreps = nreps, id = uuid.uuid4().hex)
+    with open(os.path.join(store_folder, 'store.json'), 'w') as file: json.dump(metadata, file)
+    return metadata
+
+# stores that are opened in this process: {(store_folder, mode): store}
+opened_stores = {}
+
+def open_store(store_folder, mode = 'r'):
+    """
+    Parameters
+    ----------
+    store_folder : string
+        Folder of the store, see function create_store().
+    mode : string, optional
+        'r' to read the datasets, 'r+' to write them as well. The default is 'r'.
+
+    Returns
+    -------
+    store : dict
+        'metadata' (see function create_store()) and the memory-mapped arrays 'data', 'parameters' and 'stored'.
+
+    Description
+    -----------
+    Function to open a store. Each process opens a store only once; later calls reuse the memory maps, unless the store was made again since.
+    """
+    metadata = read_metadata(store_folder)
+    if metadata is None: raise FileNotFoundError("No dataset store in {}".format(store_folder))
+    store = opened_stores.get((store_folder, mode))
+    if store is None or store['metadata']['id'] != metadata['id']:
+        store = {'metadata': metadata}
+        for name in ['data', 'parameters', 'stored']:
+            store[name] = np.load(os.path.join(store_folder, '{}.npy'.format(name)), mmap_mode = mode)
+        opened_stores[(store_folder, mode)] = store
+    return store
+
+def write_dataset(store_folder, rep, pp, data, True_parameters):
+    """
+    Parameters
+    ----------
+    store_folder : string
+        Folder of the store, see function create_store().
+    rep, pp : integer
+        The repetition and participant index. In the group difference criterion the participants of group 1 have index npp_per_group, ..., 2*npp_per_group - 1.
+    data : numpy array, shape = (ntrials X 5)
+        The design of this participant with its responses in column 2; all columns are 0 or 1 when the store is packed.
+    True_parameters : numpy array, shape = (2,)
+        The true learning rate and inverse temperature of this participant.
+
+    Description
+    -----------
+    Function to add the dataset of one participant to a store. The workers write the datasets of different participants to the
+    same memory-mapped files at the same time; a dataset is only marked as stored after it is completely written.
+    """
+    store = open_store(store_folder, mode = 'r+')
+    columns = np.asarray(data[:, :ncolumns], dtype = np.uint8).T
+    # stores made before the number of stimuli and responses could be chosen are packed
+    store['data'][rep, pp] = np.packbits(columns, axis = 1) if store['metadata'].get('packed', True) else columns
+    store['parameters'][rep, pp] = True_parameters
+    store['stored'][rep, pp] = True
+
+def read_dataset(store_folder, rep, pp):
+    """
+    Parameters
+    ----------
+    store_folder : string
+        Folder of the store, see function create_store().
+    rep, pp : integer
+        The repetition and participant index.
+
+    Returns
+    -------
+    data : numpy array, shape = (ntrials X 5)
+        The design of this participant with its responses in column 2, as used by the parameter estimation (see function fit_participant() in Functions.py).
+    True_parameters : numpy array, shape = (2,)
+        The true learning rate and inverse temperature of this participant.
+    """
+    store = open_store(store_folder)
+    if not store['stored'][rep, pp]: raise KeyError("The dataset of repetition {}, participant {} is not stored in {}".format(rep, pp, store_folder))
+    if store['metadata'].get('packed', True): data = np.unpackbits(store['data'][rep, pp], axis = 1, count = store['metadata']['ntrials']).T.astype(np.int64)
+    else: data = store['data'][rep, pp].T.astype(np.int64)
+    return data, np.array(store['parameters'][rep, pp])
+
+def stored_repetitions(store_folder):
+    """Function that returns the repetitions of which the datasets of all participants are stored."""
+    return np.flatnonzero(np.all(open_store(store_folder)['stored'], axis = 1))
+
+def store_configuration(store_folder):
+    """Function that returns the simulation configuration of a store (see function create_store())."""
+    return json.loads(read_metadata(store_folder)['configuration'])
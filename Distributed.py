@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+Distributed execution of the power analysis over several machines (nodes) through a queue folder on a shared file system.
+
+The machine that runs the power analysis (the coordinator) writes the tasks in the queue folder; worker processes on any machine that
+can see this folder claim the tasks, run them and write the results back in the queue folder.
+A DirectoryPool can be passed as the argument pool of the power functions (see PowerAnalysis.py), or be used by the Input_file (column queue_folder);
+start the workers on each node with
+    python Distributed.py worker <queue_folder> --processes <number of workers on this node>
+"""
+
+import os
+import sys
+import time
+import uuid
+import pickle
+import socket
+import argparse
+import threading
+import subprocess
+import numpy as np
+import multiprocessing
+from Functions import initialise_worker, attached_designs, keep_design
+import Kernels
+
+# subfolders of the queue folder:
+    # tasks: tasks waiting for a worker; running: tasks claimed by a worker; results: finished tasks;
+    # designs: the designs used by the tasks; workers: one file per worker, touched while the worker is alive
+queue_subfolders = ['tasks', 'running', 'results', 'designs', 'workers']
+
+def prepare_queue_folder(queue_folder):
+    """Function to create the subfolders of a queue folder (when they do not exist yet)."""
+    for subfolder in queue_subfolders: os.makedirs(os.path.join(queue_folder, subfolder), exist_ok = True)
+
+def write_atomic(file, content):
+    """Function to pickle content to a file such that other processes never see a half-written file (write to a temporary file, then rename)."""
+    temporary_file = '{}.{}.tmp'.format(file, uuid.uuid4().hex)
+    with open(temporary_file, 'wb') as f: pickle.dump(content, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_file, file)
+
+def read_pickle(file):
+    with open(file, 'rb') as f: return pickle.load(f)
+
+def design_descriptors(task, names):
+    """Function to find the descriptors of shared designs (see Functions.share_design()) in a task; only names in names are considered."""
+    if isinstance(task, (tuple, list)):
+        if (len(task) == 3 and isinstance(task[0], str) and isinstance(task[1], tuple) and isinstance(task[2], str) and task[0] in names):
+            return {task[0]}
+        return set().union(*[design_descriptors(element, names) for element in task])
+    return set()
+
+class DirectoryPool:
+    """
+    Parameters
+    ----------
+    queue_folder : string
+        Folder on a file system that is shared by the coordinator and all workers.
+    nworkers : integer, optional
+        Number of workers that will work on the tasks; this is used to decide how many tasks are submitted at once and how large they are.
+        When None, the number of workers that are alive is counted again while the tasks are submitted (at least 1), so workers that are started
+        later are used as well; the participant tasks are then sent in chunks of a fixed size (chunksize). The default is None.
+    poll_interval : float, optional
+        Seconds between two checks of the queue folder for new results. The default is 0.2.
+    timeout : float, optional
+        A task is handed out again when the worker that claimed it has not shown a sign of life during timeout seconds
+        (e.g. because its node crashed). The default is 120.
+    stop_workers : bool, optional
+        Whether the workers are asked to stop when the pool is joined (after close()). The default is True.
+
+    Description
+    -----------
+    Pool of workers on one or more machines, with the part of the interface of multiprocessing.Pool that the power functions use
+    (apply_async(), close() and join()), so the power functions, the checkpoints, the cache and the adaptive stopping work unchanged.
+    Each call of apply_async() writes one task file in queue_folder/tasks. A worker (see function run_worker()) claims a task by moving it
+    to queue_folder/running (a rename is atomic, so each task is claimed by only one worker) and writes its result to queue_folder/results.
+    A thread of the coordinator picks up the results and calls the callbacks, and puts the tasks of dead workers back in queue_folder/tasks.
+    The designs in shared memory cannot be reached from other machines: they are written once to queue_folder/designs, where the workers read them.
+    When the queue folder cannot be read during timeout seconds, the tasks that are not finished fail with this error and the pool stops.
+    """
+    # number of participant tasks per task file when the number of workers is not fixed (see function schedule_participants() in PowerAnalysis.py)
+    chunksize = 10
+    # seconds during which a count of the alive workers is reused
+    count_interval = 5
+
+    def __init__(self, queue_folder, nworkers = None, poll_interval = 0.2, timeout = 120, stop_workers = True):
+        self.queue_folder, self.nworkers, self.poll_interval, self.timeout = queue_folder, nworkers, poll_interval, timeout
+        self.stop_workers = stop_workers
+        prepare_queue_folder(queue_folder)
+        # a stop signal of an earlier run should not stop the workers of this run
+        if os.path.isfile(os.path.join(queue_folder, 'stop')): os.remove(os.path.join(queue_folder, 'stop'))
+        # the tasks of this coordinator start with its id, so several coordinators can share one queue folder
+        self.coordinator_id = uuid.uuid4().hex[:12]
+        self.ntasks, self.pending, self.published_designs = 0, {}, set()
+        self.lock, self.closed, self.error = threading.Lock(), False, None
+        self.nalive, self.count_time = 1, None
+        self.collector = threading.Thread(target = self.collect_results, daemon = True)
+        self.collector.start()
+
+    def number_of_workers(self):
+        """Number of workers that is used to divide the tasks: nworkers, or otherwise the number of workers that are alive (at least 1)."""
+        if self.nworkers is not None: return self.nworkers
+        if self.count_time is None or time.time() - self.count_time > self.count_interval:
+            # when the queue folder cannot be read for a moment, the last count is used (see method collect_results())
+            try: self.nalive = max(1, len(alive_workers(self.queue_folder, self.timeout)))
+            except OSError: pass
+            self.count_time = time.time()
+        return self.nalive
+
+    def publish_designs(self, args):
+        """Function to write the shared designs that are used by a task to the queue folder, once per design."""
+        for name in design_descriptors(args, attached_designs.keys()) - self.published_designs:
+            design_file = os.path.join(self.queue_folder, 'designs', '{}.npy'.format(name))
+            temporary_file = '{}.{}.tmp.npy'.format(design_file[:-4], uuid.uuid4().hex)
+            np.save(temporary_file, attached_designs[name][1])
+            os.replace(temporary_file, design_file)
+            self.published_designs.add(name)
+
+    def apply_async(self, func, args = (), callback = None, error_callback = None):
+        if self.error is not None: raise self.error
+        if self.closed: raise ValueError("DirectoryPool not running")
+        self.publish_designs(args)
+        with self.lock:
+            # zero-padded numbers: the workers take the tasks in the order in which they were submitted
+            task_id = '{}-{:09d}'.format(self.coordinator_id, self.ntasks)
+            self.ntasks += 1
+            self.pending[task_id] = (callback, error_callback)
+        write_atomic(os.path.join(self.queue_folder, 'tasks', '{}.pkl'.format(task_id)), (func, args))
+
+    def collect_results(self):
+        """
+        Function of the coordinator thread: calls the callbacks of finished tasks and requeues the tasks of dead workers.
+        When the queue folder cannot be read (e.g. the shared file system is gone), this is tried again during timeout seconds;
+        then the error is kept in self.error and passed to the error callbacks of all unfinished tasks, so the power function that waits for them raises it.
+        """
+        results_folder = os.path.join(self.queue_folder, 'results')
+        last_check, failing_since = time.time(), None
+        while True:
+            try:
+                self.collect_finished(results_folder)
+                if time.time() - last_check > self.timeout / 4:
+                    requeue_stale_tasks(self.queue_folder, self.timeout, prefix = self.coordinator_id)
+                    last_check = time.time()
+                failing_since = None
+            except Exception as error:
+                if failing_since is None: failing_since = time.time()
+                if not isinstance(error, OSError) or time.time() - failing_since > self.timeout:
+                    self.fail(error)
+                    return
+            if self.closed and not self.pending: return
+            time.sleep(self.poll_interval)
+
+    def collect_finished(self, results_folder):
+        """Function to call the callbacks of the finished tasks of this coordinator."""
+        for file in sorted(os.listdir(results_folder)):
+            task_id = file[:-4]
+            if not file.endswith('.pkl'): continue
+            if task_id not in self.pending:
+                # a second result of a task that was handed out again while its first worker was only slow (see function requeue_stale_tasks())
+                if task_id.startswith(self.coordinator_id):
+                    try: os.remove(os.path.join(results_folder, file))
+                    except FileNotFoundError: pass
+                continue
+            try: succeeded, result = read_pickle(os.path.join(results_folder, file))
+            except Exception as error: succeeded, result = False, error
+            os.remove(os.path.join(results_folder, file))
+            with self.lock: callback, error_callback = self.pending.pop(task_id)
+            try:
+                if succeeded and callback is not None: callback(result)
+                elif not succeeded and error_callback is not None: error_callback(result)
+            except Exception as error: self.error = error
+
+    def fail(self, error):
+        """Function to stop the pool after error: all unfinished tasks fail with this error."""
+        self.error, self.closed = error, True
+        with self.lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+        for callback, error_callback in pending:
+            if error_callback is not None: error_callback(error)
+
+    def close(self):
+        """No new tasks can be submitted anymore."""
+        self.closed = True
+
+    def join(self):
+        """Wait until all submitted tasks are finished (only after close()); then ask the workers to stop when stop_workers = True."""
+        if not self.closed: raise ValueError("DirectoryPool is still running")
+        self.collector.join()
+        for name in self.published_designs:
+            design_file = os.path.join(self.queue_folder, 'designs', '{}.npy'.format(name))
+            if os.path.isfile(design_file): os.remove(design_file)
+        if self.stop_workers: open(os.path.join(self.queue_folder, 'stop'), 'w').close()
+        if self.error is not None: raise self.error
+
+    def terminate(self):
+        """Stop without waiting: the tasks of this coordinator that are not claimed yet are removed."""
+        self.closed = True
+        for file in os.listdir(os.path.join(self.queue_folder, 'tasks')):
+            if file.startswith(self.coordinator_id):
+                try: os.remove(os.path.join(self.queue_folder, 'tasks', file))
+                except FileNotFoundError: pass
+        with self.lock: self.pending.clear()
+
+def alive_workers(queue_folder, timeout = 120):
+    """Function to list the workers that have shown a sign of life during the last timeout seconds."""
+    workers_folder = os.path.join(queue_folder, 'workers')
+    now = time.time()
+    workers = []
+    for file in os.listdir(workers_folder):
+        try:
+            if now - os.path.getmtime(os.path.join(workers_folder, file)) < timeout: workers.append(file)
+        except FileNotFoundError: pass
+    return workers
+
+def requeue_stale_tasks(queue_folder, timeout = 120, prefix = ''):
+    """
+    Function to put the claimed tasks whose worker has not shown a sign of life during timeout seconds back in queue_folder/tasks.
+    A worker touches the file of the task it is working on regularly (see function run_worker()), so only tasks of dead workers are requeued.
+    """
+    running_folder = os.path.join(queue_folder, 'running')
+    now = time.time()
+    for file in os.listdir(running_folder):
+        if not file.startswith(prefix): continue
+        try:
+            if now - os.path.getmtime(os.path.join(running_folder, file)) > timeout:
+                # running file: <task_id>.<worker_id>.pkl
+                os.rename(os.path.join(running_folder, file), os.path.join(queue_folder, 'tasks', file.split('.')[0] + '.pkl'))
+                print("Task {} is handed out again: its worker did not respond during {} seconds.".format(file.split('.')[0], timeout))
+        except FileNotFoundError: pass
+
+def claim_task(queue_folder, worker_id):
+    """Function to claim the oldest waiting task; returns the path of the claimed task file, or None when no task is waiting."""
+    for file in sorted(os.listdir(os.path.join(queue_folder, 'tasks'))):
+        if not file.endswith('.pkl'): continue
+        claimed_file = os.path.join(queue_folder, 'running', '{}.{}.pkl'.format(file[:-4], worker_id))
+        try:
+            os.rename(os.path.join(queue_folder, 'tasks', file), claimed_file)
+            return claimed_file
+        # another worker was faster
+        except FileNotFoundError: continue
+    return None
+
+def load_designs(queue_folder, args):
+    """Function to make the designs of a task available to this worker: a shared design is read from the queue folder instead of shared memory."""
+    designs_folder = os.path.join(queue_folder, 'designs')
+    published = {file[:-4] for file in os.listdir(designs_folder) if file.endswith('.npy') and '.tmp' not in file}
+    for name in design_descriptors(args, published):
+        # the design is only read once by each worker; Functions.attach_design() then finds it in attached_designs,
+        # until the worker has moved on to other designs (see Functions.keep_design())
+        if name not in attached_designs:
+            design = np.load(os.path.join(designs_folder, '{}.npy'.format(name)))
+            design.flags.writeable = False
+            keep_design(name, None, design)
+
+def run_worker(queue_folder, backend = 'auto', poll_interval = 0.5, heartbeat = 10, idle_timeout = None):
+    """
+    Parameters
+    ----------
+    queue_folder : string
+        Folder on a file system that is shared with the coordinator (see DirectoryPool).
+    backend : string, optional
+        Kernel backend of this worker (see Kernels.py). The default is 'auto'.
+    poll_interval : float, optional
+        Seconds between two checks of the queue folder for new tasks. The default is 0.5.
+    heartbeat : float, optional
+        Seconds between two signs of life of this worker; should be well below the timeout of the DirectoryPool. The default is 10.
+    idle_timeout : float, optional
+        The worker stops when no task arrived during idle_timeout seconds; when None, the worker only stops when the coordinator
+        asks to stop (see DirectoryPool.join()). The default is None.
+
+    Returns
+    -------
+    ntasks : integer
+        Number of tasks that this worker finished.
+
+    Description
+    -----------
+    Function that lets this process work for the coordinators that use queue_folder. The worker is prepared once (see Functions.initialise_worker()),
+    then it repeatedly claims a task, runs it and writes the result (or the error) to queue_folder/results.
+    While the worker is alive it touches its own file in queue_folder/workers and the file of the task it is working on,
+    so a coordinator can hand out the tasks of crashed workers again.
+    """
+    prepare_queue_folder(queue_folder)
+    initialise_worker(backend)
+    worker_id = '{}-{}'.format(socket.gethostname().replace('.', '_'), os.getpid())
+    worker_file = os.path.join(queue_folder, 'workers', worker_id)
+    open(worker_file, 'w').close()
+    current_task, finished = [None], threading.Event()
+    def beat():
+        while not finished.wait(heartbeat):
+            for file in [worker_file, current_task[0]]:
+                try:
+                    if file is not None: os.utime(file)
+                except FileNotFoundError: pass
+    threading.Thread(target = beat, daemon = True).start()
+    ntasks, last_task = 0, time.time()
+    try:
+        while True:
+            claimed_file = claim_task(queue_folder, worker_id)
+            if claimed_file is None:
+                if os.path.isfile(os.path.join(queue_folder, 'stop')): break
+                if idle_timeout is not None and time.time() - last_task > idle_timeout: break
+                time.sleep(poll_interval)
+                continue
+            current_task[0] = claimed_file
+            task_id = os.path.basename(claimed_file).split('.')[0]
+            try:
+                func, args = read_pickle(claimed_file)
+                load_designs(queue_folder, args)
+                output = (True, func(*args))
+            except Exception as error: output = (False, error)
+            write_atomic(os.path.join(queue_folder, 'results', '{}.pkl'.format(task_id)), output)
+            current_task[0] = None
+            try: os.remove(claimed_file)
+            except FileNotFoundError: pass
+            ntasks, last_task = ntasks + 1, time.time()
+    finally:
+        finished.set()
+        if os.path.isfile(worker_file): os.remove(worker_file)
+    return ntasks
+
+def start_local_workers(queue_folder, nworkers = 2, backend = None, idle_timeout = None):
+    """
+    Function to start nworkers worker processes on this machine (see function run_worker()), e.g. to try out a distributed power analysis
+    with local processes standing in for the nodes. Returns the list of subprocess.Popen objects; the workers stop when the DirectoryPool is joined.
+    """
+    if backend is None: backend = Kernels.get_backend()
+    command = [sys.executable, os.path.abspath(__file__), 'worker', queue_folder, '--backend', backend]
+    if idle_timeout is not None: command += ['--idle_timeout', str(idle_timeout)]
+    return [subprocess.Popen(command, cwd = os.path.dirname(os.path.abspath(__file__))) for worker in range(nworkers)]
+
+def queue_status(queue_folder, timeout = 120):
+    """Function to count the waiting, running and finished tasks and the alive workers of a queue folder."""
+    prepare_queue_folder(queue_folder)
+    count = lambda subfolder: len([file for file in os.listdir(os.path.join(queue_folder, subfolder)) if file.endswith('.pkl')])
+    return {'waiting': count('tasks'), 'running': count('running'), 'finished': count('results'),
+            'workers': len(alive_workers(queue_folder, timeout))}
+
+#%%
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Worker processes for a distributed power analysis (see DirectoryPool).")
+    parser.add_argument('command', choices = ['worker', 'status'], help = "worker: work on the tasks in the queue folder; status: show the queue")
+    parser.add_argument('queue_folder', help = "folder on a file system that is shared with the coordinator")
+    parser.add_argument('--processes', type = int, default = 1, help = "number of worker processes on this node")
+    parser.add_argument('--backend', default = 'auto', help = "kernel backend of the workers (see Kernels.py)")
+    parser.add_argument('--idle_timeout', type = float, default = None, help = "stop when no task arrived during this many seconds")
+    parser.add_argument('--heartbeat', type = float, default = 10, help = "seconds between two signs of life of a worker")
+    arguments = parser.parse_args()
+    if arguments.command == 'status':
+        print(queue_status(arguments.queue_folder))
+    elif arguments.processes == 1:
+        ntasks = run_worker(arguments.queue_folder, backend = arguments.backend, heartbeat = arguments.heartbeat, idle_timeout = arguments.idle_timeout)
+        print("Worker stopped after {} tasks.".format(ntasks))
+    else:
+        workers = [multiprocessing.Process(target = run_worker, args = (arguments.queue_folder, arguments.backend),
+                                           kwargs = {'heartbeat': arguments.heartbeat, 'idle_timeout': arguments.idle_timeout}) for process in range(arguments.processes)]
+        for worker in workers: worker.start()
+        for worker in workers: worker.join()
@@ -5,13 +5,15 @@ Created on Wed Oct 13 17:09:53 2021
 @author: Maud
 """
 import numpy as np
-import pandas as pd 
 import os, time
+from multiprocessing import shared_memory
 from scipy import optimize
+import Kernels
+from DatasetStore import write_dataset, read_dataset, open_store, store_configuration
 from scipy import stats as stat
 
 #%% Functions that are used within other functions in this 'functions' script
-def generate_parameters(mean = 0.5, std = 0.1, npp = 1):
+def generate_parameters(mean = 0.5, std = 0.1, npp = 1, rng = None):
     """
     Parameters
     ----------
@@ -21,6 +23,10 @@ def generate_parameters(mean = 0.5, std = 0.1, npp = 1):
         The standard deviation of the normal distribution from which parameters are drawn. The default is 0.1.
     size : float, optional
         The number of parameters that are drawn from the normal distribution. The default is 1.
+    rng : numpy.random.Generator or list of numpy.random.Generator, optional
+        Random number generator that is used, or one random number generator for each participant (see function participant_generator()); 
+        with a list, one parameter is drawn with each generator and npp is not used. When None, the global numpy random state is used. 
+        The default is None.
 
     Returns
     -------
@@ -32,12 +38,15 @@ def generate_parameters(mean = 0.5, std = 0.1, npp = 1):
     Function to draw 'npp' parameters from a normal distribution with mean 'mean' and standard deviation 'std'. 
     Function is used to generate learning rate and inverse temperature parameters for each participant. 
     No parameters get a value lower than or equal to 0."""
+    if isinstance(rng, (list, tuple)): 
+        return np.concatenate([generate_parameters(mean = mean, std = std, npp = 1, rng = participant_rng) for participant_rng in rng])
+    if rng is None: rng = np.random
     # draw 'npp' values from normal distribution with mean 'mean' and standard deviation 'std'
-    parameters = np.round(np.random.normal(loc = mean, scale = std, size = npp), 3)
+    parameters = np.round(rng.normal(loc = mean, scale = std, size = npp), 3)
     # while-loop: ensure no parameters get a value smaller than or equal to 0
     while np.any(parameters <= 0): 
         parameters = np.where(parameters <= 0, 
-                              np.round(np.random.normal(loc = mean, scale = std, size = 1), 3), 
+                              np.round(rng.normal(loc = mean, scale = std, size = 1), 3), 
                               parameters)
     return parameters # shape ('npp',)
 
@@ -63,31 +72,41 @@ def softmax(values = np.array([0.5, 0.5]), inverse_temperature = 1):
     The inverse temperature parameter captures the weight given to the value difference between the two response options. With a low inverse temperature, 
     more weight is given to the option with the highest value ('exploiting the best option'). A higher inverse tempererature relies more on 'exploration in order to find better options', 
     thus increases the probability of choosing the lower value option. 
-    The softmax function is: probability(response X) = exp(value_responseX*inverse_temperature) / (exp(value_response0*inverse_temperature) + exp(value_response1*inverse_temperature)) with X = 0 or x = 1."""
-    # softmax function
-    response_probabilities = np.exp(values*inverse_temperature) / np.sum((np.exp(values[0]*inverse_temperature)+np.exp(values[1]*inverse_temperature)))
+    The softmax function is: probability(response X) = exp(value_responseX*inverse_temperature) / sum(exp(value_responseY*inverse_temperature) for each response Y), 
+    with X = 0 or x = 1 in a task with 2 responses (see argument nactions of function create_design())."""
+    # softmax function over all response options; the largest activation is subtracted first, so that exp() cannot overflow
+    activations = np.asarray(values)*inverse_temperature
+    exp_values = np.exp(activations - np.max(activations))
+    response_probabilities = exp_values / np.sum(exp_values)
     return response_probabilities
  
-def choose_response(response_probabilities = np.array([0.5, 0.5])): 
+def choose_response(response_probabilities = np.array([0.5, 0.5]), rng = None): 
     """
 
     Parameters
     ----------
     response_probabilities : numpy array, optional
-        The probabilities for choosing each of the two responses. The default is np.array([0.5, 0.5]).
+        The probabilities for choosing each of the responses. The default is np.array([0.5, 0.5]).
+    rng : numpy.random.Generator, optional
+        Random number generator that is used. When None, the global numpy random state is used. The default is None.
 
     Returns
     -------
-    response : integer (0 or 1)
-        Which of the two responses is actually chosen: response 0 or response 1. 
+    response : integer
+        Which of the responses is actually chosen: response 0 or response 1 (or response 2, ... with more than 2 responses). 
         
 
     Description
     -----------
     Function to actually choose response 0 or 1. This function randomly generates a value between 0 and 1. 
     If this value is smaller than or equal to the probability to choose response 1 (response_probabilities[1]), then response 1 is chosen. 
-    If this value is larger than the probability to choose response 1, response 0 is chosen."""
-    response = (np.random.random() <= response_probabilities[1])*1 
+    If this value is larger than the probability to choose response 1, response 0 is chosen. 
+    With more responses, response X is chosen when the value is smaller than or equal to the summed probability of responses X, X+1, ..., 
+    but larger than the summed probability of responses X+1, ... (the same rule as in Kernels.simulate_cohort())."""
+    if rng is None: rng = np.random
+    response_probabilities = np.asarray(response_probabilities)
+    tail_probabilities = np.cumsum(response_probabilities[:0:-1])[::-1]
+    response = int(np.sum(rng.random() <= tail_probabilities))
     return response
 
 def delta_rule(previous_value = 0.0, obtained_reward = 1.0, LR = 0.1): 
@@ -120,7 +139,7 @@ def delta_rule(previous_value = 0.0, obtained_reward = 1.0, LR = 0.1):
     updated_value = np.sum([previous_value, np.multiply(PE, LR)]) # V(s, a)t = V(s, a)(t-1) + PE*LR  
     return PE, updated_value 
 
-def simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 1, design = None): 
+def simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 1, design = None, rng = None, nactions = 2): 
     """
 
     Parameters
@@ -134,9 +153,14 @@ def simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 1, design =
         Its columns are: [stimulus-response mapping rule, stimulus, response, correct response, feedback congruence]. 
             The stimulus-response mapping rule column should contain a value of 0 or 1 for each trial (= rule 0 or rule 1)
             The stimulus column should contain a value of 0 or 1 for each trial (= stimulus 0 or stimulus 1)
+            (with more stimuli and responses, see function create_design(): rule 0, ..., nactions - 1 and stimulus 0, ..., nstimuli - 1)
             The response column should be empty still, data has not yet been generated.
             The correct response column should contain which response would be correct on this trial; this depends on the stimulus-response mapping rule and the stimulus for that trial. 
             The feedback congruencey column should contain a value of 0 or 1 on each trial with 0 = 'feedback is not in line with the current stimulus-response mapping rule' and 1 = 'feedback is in line with the current stimulus-response mapping rule'.
+    rng : numpy.random.Generator, optional
+        Random number generator of this participant. When None, the global numpy random state is used. The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
 
     Returns
     -------
@@ -146,50 +170,93 @@ def simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 1, design =
     Description
     -----------
     Function to simulate a response on each trial for a given participant with LR = simulation_LR and inverseTemperature = simulation_inverseTemp. 
-    The design used for data generation for this participant should also be used for parameter estimation for this participant when running the function 'likelihood_estimation'."""
+    The design used for data generation for this participant should also be used for parameter estimation for this participant when running the function 'likelihood_estimation'.
+    The simulation itself is done by simulate_responses_cohort() with a cohort of one participant."""
     
-    # responses: array that will contain the responses on each trial 
-    responses = np.array([]) 
-    ntrials = design.shape[0] 
-    # values: array containing four values, one for each stimulus-response pair!
-        # [[stimulus0 & response0, stimulus0 & response1], [stimulus1 & response0, stimulus1 & response1]]
-    values = np.array([[0.5, 0.5], [0.5, 0.5]])
+    responses = simulate_responses_cohort(simulation_LRs = np.array([simulation_LR]), 
+                                          simulation_inverseTemps = np.array([simulation_inverseTemp]), design = design, rng = rng, 
+                                          nactions = nactions)
+    return responses[0, :]
+
+def simulate_responses_cohort(simulation_LRs = np.array([0.5]), simulation_inverseTemps = np.array([1]), design = None, rng = None, nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    simulation_LRs : numpy array, shape = (npp,)
+        Value for the learning rate parameter of each participant in the cohort. The default is np.array([0.5]).
+    simulation_inverseTemps : numpy array, shape = (npp,)
+        Value for the inverse temperature parameter of each participant in the cohort. The default is np.array([1]).
+    design : numpy array, shape = (ntrials X 5)
+        Design that will be used to simulate data for all participants in the cohort. For more details on this design see function simulate_responses().
+    rng : numpy.random.Generator or list of numpy.random.Generator, optional
+        Random number generator for the whole cohort, or one random number generator for each participant (see function participant_generator()); 
+        with one generator per participant, the responses of a participant do not depend on the other participants in the cohort. 
+        When None, the global numpy random state is used. The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    responses : numpy array (with elements of type integer), shape = (npp, ntrials)
+        Array containing the responses simulated by the model; row pp contains the responses of participant pp.
     
-    # trial-loop: generate a response on each trial sequentially 
-    for trial in range(ntrials): 
-        
-    #Define the variables you'll need for this trial (take them from the design)
-        
-        stimulus = np.int(design[trial, 1]) # the stimulus that appears this trial
-        CorResp =  np.int(design[trial, 3]) # the correct response on this trial (depends on the stimulus-response mapping rule on this trial)
-        FBcon = design[trial, 4] # feedback congruence on this trial: FB is congruent with the current stimulus-response mapping rule if FBCon = 1
+    Description
+    -----------
+    Function to simulate the responses of a whole cohort of participants in one pass over the trials. 
+    Each participant has its own values for the stimulus-response pairs, but all participants are stepped through the design together: 
+    on each trial the softmax, the response choice and the delta-rule update are computed for all participants at once. 
+    The random numbers used to choose the responses are drawn before the trial-loop (one row of ntrials numbers per participant), 
+    with a single participant this gives exactly the same responses as drawing a random number on each trial. 
+    The trial-loop itself is done by the kernel Kernels.simulate_cohort() of the active backend (numpy or numba). 
+    The number of stimuli is taken from the design (the highest stimulus + 1); stimuli that do not appear have no influence on the responses."""
     
-        
-    #Simulate the response given by the hypothetical participant. Depending on the value for each response and the inverse_temperature parameter. 
-        
-        # define which weights are of importance on this trial: depends on which stimulus "appears" 
-        stimulus_weights = values[stimulus, :]
-        # compute probability of each action on this trial (using the weights for each action with the stimulus of this trial)
-        response_probabilities = softmax(values = stimulus_weights, inverse_temperature = simulation_inverseTemp)
-        # define which action is actually chosen (based on the probabilities)
-        response = choose_response(response_probabilities = response_probabilities)
-        # store the response given on this trial
-        responses = np.append(responses, response)
-    #Update the value of the response-action pair that was relevant this trial (stimulus shown & response given)
-        #define whether reward was received this trial or not: reward present when: 
-            # a) response = correct response and FB congruence = 1 (congruent)
-            # b) response != correct response and FB congruence = 0 (incongruent)
-        reward_present = ((response == CorResp and FBcon == 1) or (response != CorResp and FBcon == 0))*1
-        reward_present = np.float(reward_present)        
-        #compute the PE and the updated value for this trial (and this stimulus-response pair)
-            # to compute the PE & updated value, just work with whether reward was present or not
-        PE, updated_value = delta_rule(previous_value=values[stimulus, response], 
-                                            obtained_reward=reward_present, LR=simulation_LR)
-        #update the value of the stimulus-response pair that was used this trial 
-        values[stimulus, response] = updated_value
+    simulation_LRs = np.asarray(simulation_LRs, dtype = float).reshape(-1)
+    simulation_inverseTemps = np.asarray(simulation_inverseTemps, dtype = float).reshape(-1)
+    npp = simulation_LRs.shape[0]
+    ntrials = design.shape[0]
+    # take the relevant design columns out of the design once, instead of on each trial
+    stimuli = design[:, 1].astype(np.int64) # the stimulus that appears each trial
+    CorResp = design[:, 3].astype(np.int64) # the correct response on each trial
+    FBcon = design[:, 4].astype(np.int64) # feedback congruence on each trial
+    if isinstance(rng, (list, tuple)): random_numbers = np.array([participant_rng.random(ntrials) for participant_rng in rng]).reshape(npp, ntrials)
+    else: random_numbers = (np.random if rng is None else rng).random((npp, ntrials))
+    
+    # trial-loop: generate a response on each trial for all participants at once (see Kernels.py)
+    responses = Kernels.simulate_cohort(simulation_LRs, simulation_inverseTemps, stimuli, CorResp, FBcon, random_numbers, 
+                                        int(stimuli.max()) + 1, nactions)
     return responses
 
-def likelihood(parameter_set, data):
+def simulate_designs(simulation_LRs, simulation_inverseTemps, designs, rng = None, nactions = 2): 
+    """
+    Parameters
+    ----------
+    simulation_LRs, simulation_inverseTemps : numpy array, shape = (npp,)
+        The learning rate and inverse temperature of each participant.
+    designs : list
+        The design of each participant (see function create_design()).
+    rng : list of numpy.random.Generator, optional
+        The random number generator of each participant (see function simulate_responses_cohort()). The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    responses : numpy array, shape = (npp X ntrials)
+        The simulated responses of each participant.
+
+    Description
+    -----------
+    Function to simulate the responses of a group of participants. When all participants have the same design, 
+    the whole group is simulated at once with simulate_responses_cohort(); otherwise each participant is simulated on its own design.
+    """
+    if all(design is designs[0] for design in designs): 
+        return simulate_responses_cohort(simulation_LRs = simulation_LRs, simulation_inverseTemps = simulation_inverseTemps, design = designs[0], rng = rng, 
+                                         nactions = nactions)
+    return np.array([simulate_responses(simulation_LR = simulation_LRs[pp], simulation_inverseTemp = simulation_inverseTemps[pp], 
+                                        design = designs[pp], rng = None if rng is None else rng[pp], nactions = nactions) for pp in range(len(designs))])
+
+def likelihood(parameter_set, data, nactions = 2):
     """
 
     Parameters
@@ -206,6 +273,8 @@ def likelihood(parameter_set, data):
             The correct response column should contain which response would be correct on this trial; this depends on the stimulus-response mapping rule and the stimulus for that trial. 
             The feedback congruencey column should contain a value of 0 or 1 on each trial with 0 = 'feedback is not in line with the current stimulus-response mapping rule' and 1 = 'feedback is in line with the current stimulus-response mapping rule'.
         Importantly, columns 0, 1, 3 and 4 should be exactly the same as the design matrix used to simulate the responses for this hypothetical participant. 
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
 
     Returns
     -------
@@ -223,11 +292,10 @@ def likelihood(parameter_set, data):
         This probability depends on the LR since this defines the value_responseX and on the inverse_temperature since this is part of the softmax function. 
     Over trials: summed log likelihood = sum(log(L(parameter set | current response))) with the best fitting parameter set yielding the highest summed logL. 
     The function returns -summed_LogL because the optimization function that will be used to find the most likely parameters given the data searches for the minimum value for this likelihood function. 
+    The log-normaliser log(exp(value_response0*inverse_temperature) + exp(value_response1*inverse_temperature)) is calculated with the numerically stable log-sum-exp.
+    With more than 2 responses, the sums in the softmax and the log-normaliser run over all nactions responses.
     """
 #Prepare the likelihood estimation process: make sure all relevant variables are defined 
-    # the start values for each stimulus-response pair: these are the same as in the simulate_responses function
-    values = np.array([[0.5, 0.5], [0.5, 0.5]])
-    ntrials = data.shape[0] # deduce number of trials within the experiment from the length of the design matrix
     # Define the response accuracy on each trial: (responses == correct_responses)*1
         # remember: correct_responses depends on the stimulus-response mapping rule and does not necessarily mean reward is delivered
         # 0 = incorrect response, 1 = correct response
@@ -236,48 +304,431 @@ def likelihood(parameter_set, data):
         # if FBCon = 1: reward is received on trials where a correct response was given
         # if FBCon = 0: reward is received on trials where an incorrect resposne was given
         # 0 = no reward received, 1 = reward received
-    actual_rewards = (Accuracy == data[:, 4])*1
-    actual_responses = data[:, 2] # the participants' responses (obtained with the simulate_responses function)
-    stimuli = data[:, 1] # the stimuli that were shown each trial 
+    actual_rewards = (Accuracy == data[:, 4])*1.0
+    actual_responses = data[:, 2].astype(np.int64) # the participants' responses (obtained with the simulate_responses function)
+    stimuli = data[:, 1].astype(np.int64) # the stimuli that were shown each trial 
     
 #Start the likelihood estimation process: summed_logL = log(L(parameter set|data))
     # log(L(parameter set|data)) = sum( log( L(parameter set|response) ) for trial in trials)
-    summed_logL = 0 # this is calculated by summing over trials the log( L(parameter set|response on that trial) ) 
-    
-    # trial-loop: calculate log(L(parameter set|response)) on each trial
-    for trial in range(ntrials): 
-    #Define the variables that are important for the likelihood estimation process 
-        stimulus = int(stimuli[trial]) #the stimulus shown on this trial
-        response = actual_responses[trial].astype(int) #the response given on this trial
-        reward_this_trial = actual_rewards[trial] #the reward presence or absence on this trial
-        
-    #Calculate the loglikelihood: log(L(parameter set|response)) = log(P(response|parameter set))
-        #select the correct response_values given the stimulus on this trial
-        stimulus_weights = values[stimulus, :] 
-        #log(P(response|parameter set)) = log(exp(value_responseX*inverse_temperature) / (exp(value_response0*inverse_temperature) + exp(value_response1*inverse_temperature)) with X = current response (0 or 1))
-            # which can be simplified to: value_responseX*inverse_temperature - log(exp(value_response0*inverse_temperature) + exp(value_response1*inverse_temperature)) with X = current response 
-            # used mathematical rule: log( exp(x) / (exp(x)+exp(y)) ) = x - log(exp(x)+exp(y))
-        #first calculate the probability of each response given the parameter set
-        loglikelihoods = stimulus_weights*parameter_set[1] - np.log(np.sum((np.exp(stimulus_weights[0]*parameter_set[1])+np.exp(stimulus_weights[1]*parameter_set[1]))))
-        #then select the probability of the actual response given the parameter set
-        current_loglikelihood = loglikelihoods[response]
-        
-    #Add L(parameter set|current response) to the total log likelihood 
-        summed_logL = summed_logL + current_loglikelihood
-        #Values are updated with current_learning_rate
+    # the trial-loop is done by the kernel Kernels.loglikelihood() of the active backend (numpy or numba), for one parameter set and one dataset
+    summed_logL = Kernels.loglikelihood(np.array([parameter_set[0]], dtype = float), np.array([parameter_set[1]], dtype = float), 
+                                        stimuli[np.newaxis, :], actual_responses[np.newaxis, :], actual_rewards[np.newaxis, :], 
+                                        int(stimuli.max()) + 1, nactions)[0, 0]
+    return -summed_logL
+
+def likelihood_gradient(parameter_set, data, nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    parameter_set : numpy array, shape = (2,)
+        Contains the current estimates for each parameter: parameter_set[0] = learning rate, parameter_set[1] = inverse_temperature
+    data : numpy array, shape = (ntrials X 5)
+        Data that will be used to estimate the likelihood of the data given the current parameter set. For more details on the data see function likelihood().
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    -summed_logL : float
+        The negative summed log likelihood of the data given the current parameter set (same value as returned by likelihood()).
+    -gradient : numpy array, shape = (2,)
+        The derivatives of -summed_logL with respect to the learning rate and the inverse temperature.
+
+    Description
+    -----------
+    Function to calculate the likelihood of the parameter set together with its exact gradient, for gradient-based optimization. 
+    The derivative with respect to the learning rate is calculated by forward-mode sensitivity of the delta-rule: 
+    next to each value Q, its derivative dQ/dLR is tracked over trials. Since Q(t+1) = Q(t) + LR * (reward - Q(t)): 
+        dQ(t+1)/dLR = (1 - LR) * dQ(t)/dLR + (reward - Q(t))
+    On each trial, with p the softmax probabilities and X the current response: 
+        dlog(P(responseX))/dinverse_temperature = value_responseX - sum(p * values)
+        dlog(P(responseX))/dLR = inverse_temperature * (dvalue_responseX/dLR - sum(p * dvalues/dLR))
+    The trial-loop is done by the kernel Kernels.loglikelihood_gradient() of the active backend (numpy or numba), for one parameter set and one dataset.
+    """
+    actual_rewards = (((data[:, 2] == data[:, 3]) == data[:, 4])*1.0)
+    actual_responses = data[:, 2].astype(np.int64)
+    stimuli = data[:, 1].astype(np.int64)
+    summed_logL, LR_derivative, inverseTemp_derivative = Kernels.loglikelihood_gradient(np.array([parameter_set[0]], dtype = float), 
+                                                                                        np.array([parameter_set[1]], dtype = float), 
+                                                                                        stimuli[np.newaxis, :], actual_responses[np.newaxis, :], 
+                                                                                        actual_rewards[np.newaxis, :], int(stimuli.max()) + 1, nactions)
+    return -summed_logL[0, 0], -np.array([LR_derivative[0, 0], inverseTemp_derivative[0, 0]])
+
+def likelihood_gradient_log_inverseTemp(parameter_set, data, nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    parameter_set : numpy array, shape = (2,)
+        parameter_set[0] = learning rate, parameter_set[1] = log(inverse_temperature)
+    data : numpy array, shape = (ntrials X 5)
+        Data of one participant. For more details on the data see function likelihood().
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    -summed_logL : float
+        The negative summed log likelihood of the data given the parameter set.
+    -gradient : numpy array, shape = (2,)
+        The derivatives of -summed_logL with respect to the learning rate and log(inverse_temperature).
+
+    Description
+    -----------
+    Function likelihood_gradient() with the inverse temperature on a log scale, used by the L-BFGS-B estimator: 
+    on this scale both parameters change the likelihood by a similar amount. By the chain rule 
+        d(-summed_logL)/dlog(inverse_temperature) = inverse_temperature * d(-summed_logL)/dinverse_temperature
+    """
+    inverseTemp = np.exp(parameter_set[1])
+    negative_logL, negative_gradient = likelihood_gradient(np.array([parameter_set[0], inverseTemp]), data, nactions)
+    return negative_logL, np.array([negative_gradient[0], negative_gradient[1]*inverseTemp])
+
+def likelihood_batch(parameter_sets, datasets, nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    parameter_sets : numpy array, shape = (nsets X 2)
+        Stack of parameter sets for which the likelihood will be calculated. 
+        Column 0 contains the learning rates, column 1 the inverse temperatures. A single parameter set of shape (2,) is also accepted.
+    datasets : numpy array, shape = (ndatasets X ntrials X 5)
+        Stack of datasets for which the likelihood will be calculated. Each dataset has the same structure as the data in the function likelihood(). 
+        A single dataset of shape (ntrials X 5) is also accepted. 
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    -summed_logL : numpy array, shape = (nsets X ndatasets)
+        The negative summed log likelihood of each dataset given each parameter set: 
+        element [i, j] is equal to likelihood(parameter_sets[i], datasets[j]).
+
+    Description
+    -----------
+    Function to calculate the likelihood of many parameter sets given many datasets in one pass over the trials. 
+    The values of all stimulus-response pairs are tracked for each combination of parameter set and dataset at once, 
+    so the trial-loop is executed only once regardless of the number of parameter sets and datasets. 
+    The log-normaliser of the softmax is calculated with the numerically stable log-sum-exp: 
+        log(sum(exp(x))) = max(x) + log(sum(exp(x - max(x))))
+    which does not overflow for large inverse temperatures. 
+    This function is used when the likelihood has to be evaluated many times for the same data (e.g. multi-start fitting, grid initialisation or likelihood profiles). 
+    The trial-loop itself is done by the kernel Kernels.loglikelihood() of the active backend (numpy or numba).
+    """
+    parameter_sets = np.atleast_2d(np.asarray(parameter_sets, dtype = float))
+    datasets = np.asarray(datasets)
+    if datasets.ndim == 2: datasets = datasets[np.newaxis, :, :]
+    # the stimuli, responses and rewards on each trial for each dataset, shape (ndatasets, ntrials)
+    stimuli = datasets[:, :, 1].astype(np.int64)
+    actual_responses = datasets[:, :, 2].astype(np.int64)
+    # reward was received when the accuracy of the response is in line with the feedback congruence (see function likelihood)
+    actual_rewards = ((datasets[:, :, 2] == datasets[:, :, 3]) == datasets[:, :, 4])*1.0
     
-    #Update the value for the relevant stimulus-response pair using the delta rule 
-        # (since this influences the probability of the responses on the next trials)
-        PE, updated_value = delta_rule(previous_value = values[stimulus, response], 
-                                                obtained_reward = reward_this_trial, 
-                                                LR = parameter_set[0]) 
-        values[stimulus, response] = updated_value
+    # trial-loop: calculate log(L(parameter set|response)) on each trial for all parameter sets and datasets at once (see Kernels.py)
+    summed_logL = Kernels.loglikelihood(np.ascontiguousarray(parameter_sets[:, 0]), np.ascontiguousarray(parameter_sets[:, 1]), 
+                                        stimuli, actual_responses, actual_rewards, int(stimuli.max()) + 1, nactions)
     return -summed_logL
 
+def profile_likelihood(LRs, data, inverseTemp_bounds = (0.1, 1000), nactions = 2, tolerance = 1e-8, max_iterations = 100): 
+    """
+
+    Parameters
+    ----------
+    LRs : numpy array, shape = (nLRs,)
+        The learning rates for which the inverse temperature is profiled out.
+    data : numpy array, shape = (ntrials X 5)
+        Data of one participant. For more details on the data see function likelihood().
+    inverseTemp_bounds : tuple, optional
+        Lower and upper bound for the inverse temperature. The default is (0.1, 1000), the bounds used in the parameter estimation.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+    tolerance : float, optional
+        Relative change of the inverse temperature at which the search stops. The default is 1e-8.
+    max_iterations : integer, optional
+        Maximal number of Newton iterations. The default is 100.
+
+    Returns
+    -------
+    inverseTemps : numpy array, shape = (nLRs,)
+        The inverse temperature with the highest likelihood for each learning rate.
+    -summed_logL : numpy array, shape = (nLRs,)
+        The negative summed log likelihood of the data at these inverse temperatures (the profile likelihood of each learning rate).
+
+    Description
+    -----------
+    Function to find the best fitting inverse temperature for fixed learning rates. 
+    The values only depend on the learning rate, the responses and the rewards, 
+    and with the values fixed the summed log likelihood is a concave function of the inverse temperature: 
+        first derivative = sum over trials (value_response - expected value under the softmax)
+        second derivative = - sum over trials (variance of the values under the softmax) <= 0
+    so there is a single optimum. It is found with Newton's method, safeguarded by a bracket that always contains the optimum 
+    (when a Newton step leaves the bracket the geometric midpoint of the bracket is used instead). 
+    When the optimum lies outside the bounds, the closest bound is returned. 
+    The value trajectories and the Newton search are done by the kernel Kernels.profile_loglikelihood() of the active backend (numpy or numba).
+    """
+    stimuli = data[:, 1].astype(np.int64)
+    actual_responses = data[:, 2].astype(np.int64)
+    actual_rewards = ((data[:, 2] == data[:, 3]) == data[:, 4])*1.0
+    inverseTemps, summed_logL = Kernels.profile_loglikelihood(np.asarray(LRs, dtype = float).reshape(-1), stimuli, actual_responses, actual_rewards, 
+                                                              int(stimuli.max()) + 1, nactions, inverseTemp_bounds[0], inverseTemp_bounds[1], 
+                                                              tolerance, max_iterations)
+    return inverseTemps, -summed_logL
+
+def profile_estimation(data, LR_bounds = (0, 2), inverseTemp_bounds = (0.1, 1000), nLR_grid = 21, nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    data : numpy array, shape = (ntrials X 5)
+        Data of one participant. For more details on the data see function likelihood().
+    LR_bounds : tuple, optional
+        Lower and upper bound for the learning rate. The default is (0, 2).
+    inverseTemp_bounds : tuple, optional
+        Lower and upper bound for the inverse temperature. The default is (0.1, 1000).
+    nLR_grid : integer, optional
+        Number of equally spaced learning rates that are evaluated before the search. The default is 21.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    estimated_parameters : numpy array, shape = (2,)
+        The estimated learning rate and inverse temperature.
+    optimization_output : scipy.optimize.OptimizeResult
+        Output of the learning rate search; nfev is the total number of profile likelihood evaluations (grid included).
+
+    Description
+    -----------
+    Function to estimate the parameters by profiling out the inverse temperature. 
+    For each learning rate that is evaluated, the best fitting inverse temperature is calculated exactly with profile_likelihood(); 
+    the remaining search is a one-dimensional search over the learning rate only. 
+    First the profile likelihood is calculated for a grid of learning rates in one pass over the trials, 
+    next a bounded Brent search is done between the neighbours of the best grid point.
+    """
+    LR_grid = np.linspace(LR_bounds[0], LR_bounds[1], nLR_grid)
+    _, grid_profile = profile_likelihood(LR_grid, data, inverseTemp_bounds, nactions)
+    best = int(np.argmin(grid_profile))
+    search_bounds = (LR_grid[max(best - 1, 0)], LR_grid[min(best + 1, nLR_grid - 1)])
+    
+    optimization_output = optimize.minimize_scalar(lambda LR: profile_likelihood(LR, data, inverseTemp_bounds, nactions)[1][0], 
+                                                   bounds = search_bounds, method = 'bounded', options = {'xatol':0.001})
+    estimated_LR = optimization_output['x']
+    estimated_inverseTemp, _ = profile_likelihood(estimated_LR, data, inverseTemp_bounds, nactions)
+    optimization_output['nfev'] += nLR_grid
+    return np.array([estimated_LR, estimated_inverseTemp[0]]), optimization_output
+
+def grid_initialisation(data, LR_grid = np.linspace(0.1, 1.9, 10), inverseTemp_grid = np.geomspace(0.1, 1000, 11), nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    data : numpy array, shape = (ntrials X 5)
+        Data of one participant. For more details on the data see function likelihood().
+    LR_grid : numpy array, optional
+        The learning rates in the grid. The default is 10 equally spaced values within [0.1, 1.9].
+    inverseTemp_grid : numpy array, optional
+        The inverse temperatures in the grid. The default is 11 logarithmically spaced values within [0.1, 1000].
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    start_params : numpy array, shape = (2,)
+        The parameter set in the grid with the highest likelihood given the data.
+    grid_likelihoods : numpy array, shape = (nLRs X ninverseTemps)
+        The negative summed log likelihood of the data for each parameter set in the grid.
+
+    Description
+    -----------
+    Function to calculate the likelihood of a coarse grid of parameter sets for one participant, used as start point of the optimization. 
+    The value trajectories do not depend on the inverse temperature, so they are calculated only once for each learning rate in the grid; 
+    the likelihood of each inverse temperature is then calculated from these trajectories. 
+    This is done by the kernel Kernels.grid_loglikelihood() of the active backend (numpy or numba).
+    """
+    stimuli = data[:, 1].astype(np.int64)
+    actual_responses = data[:, 2].astype(np.int64)
+    actual_rewards = ((data[:, 2] == data[:, 3]) == data[:, 4])*1.0
+    grid_likelihoods = -Kernels.grid_loglikelihood(np.asarray(LR_grid, dtype = float), np.asarray(inverseTemp_grid, dtype = float), stimuli, 
+                                                   actual_responses, actual_rewards, int(stimuli.max()) + 1, nactions)
+    best_LR, best_inverseTemp = np.unravel_index(np.argmin(grid_likelihoods), grid_likelihoods.shape)
+    start_params = np.array([LR_grid[best_LR], inverseTemp_grid[best_inverseTemp]])
+    return start_params, grid_likelihoods
+
+def fit_participant(data, estimator = 'Nelder-Mead', initialisation = 'random', rng = None, nactions = 2): 
+    """
+
+    Parameters
+    ----------
+    data : numpy array, shape = (ntrials X 5)
+        Data of one participant. For more details on the data see function likelihood().
+    estimator : string, optional
+        Estimation method that will be used: 
+            'Nelder-Mead': 2-D bounded Nelder-Mead search over the learning rate and the inverse temperature, 
+                           restarted from a new random start point (max. 5 times) as long as the learning rate estimate is < 0.01.
+            'profile': 1-D search over the learning rate with the inverse temperature profiled out (see function profile_estimation()).
+            'L-BFGS-B': gradient-based bounded search over the learning rate and log(inverse temperature), using the exact gradient 
+                        (see function likelihood_gradient_log_inverseTemp()). The first start point is the best point of the profile likelihood 
+                        of 21 learning rates within [0, 2] (see function profile_likelihood()): from a random start point the search often 
+                        stops at the learning rate = 0 bound, where the likelihood does not depend on the inverse temperature. 
+                        Restarts use random start points, as with 'Nelder-Mead'.
+        The default is 'Nelder-Mead'.
+    initialisation : string, optional
+        Start point of the first optimization (not used with estimators 'profile' and 'L-BFGS-B'): 
+            'random': random learning rate within [0, 1] and inverse temperature within [0.1, 10].
+            'grid': the best parameter set of a coarse grid (see function grid_initialisation()). Restarts still use random start points.
+        The default is 'random'.
+    rng : numpy.random.Generator, optional
+        Random number generator for the random start points. When None, the global numpy random state is used. The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    estimated_parameters : numpy array, shape = (2,)
+        The estimated learning rate and inverse temperature.
+    fit_info : dict
+        Information on the estimation: 'nfev' (total number of likelihood evaluations, each parameter set of the start grid included; with estimator = 'profile' each learning rate counts as one evaluation), 'nit' (total number of iterations), 
+        'noptimizations' (number of optimizations that were started, thus 1 + the number of restarts), 'success' (whether the last optimization converged)
+        and 'status' (the termination status of the last optimization as reported by scipy, e.g. 1 or 2 when the maximal number of evaluations or iterations was reached).
+
+    Description
+    -----------
+    Function to estimate the parameters of one hypothetical participant given its data. 
+    The estimate has failed when the learning rate estimate is still < 0.01 after the estimation.
+    """
+    if rng is None: rng = np.random
+    fit_info = {'nfev':0, 'nit':0, 'noptimizations':0, 'success':False, 'status':0}
+    if estimator == 'profile': 
+        estimated_parameters, optimization_output = profile_estimation(data, nactions = nactions)
+        fit_info['nfev'], fit_info['nit'] = optimization_output['nfev'], optimization_output['nit']
+        fit_info['noptimizations'], fit_info['success'] = 1, bool(optimization_output['success'])
+        fit_info['status'] = int(optimization_output['status'])
+        return estimated_parameters, fit_info
+    
+    estimated_LR = 0
+    while estimated_LR < 0.01 and fit_info['noptimizations'] < 5:
+        if estimator == 'L-BFGS-B' and fit_info['noptimizations'] == 0: 
+            LR_grid = np.linspace(0, 2, 21)
+            grid_inverseTemps, grid_profile = profile_likelihood(LR_grid, data, nactions = nactions)
+            best = int(np.argmin(grid_profile))
+            start_params = np.array([LR_grid[best], grid_inverseTemps[best]])
+            # each learning rate in the grid is one likelihood evaluation
+            fit_info['nfev'] += LR_grid.size
+        elif initialisation == 'grid' and fit_info['noptimizations'] == 0: 
+            start_params, grid_likelihoods = grid_initialisation(data, nactions = nactions)
+            # each parameter set in the grid is one likelihood evaluation
+            fit_info['nfev'] += grid_likelihoods.size
+        else: start_params = np.concatenate([rng.random(1), rng.uniform(0.1, 10, 1)])
+        if estimator == 'L-BFGS-B': 
+            optimization_output = optimize.minimize(likelihood_gradient_log_inverseTemp, [start_params[0], np.log(start_params[1])], 
+                                            args = (data, nactions), jac = True, method = 'L-BFGS-B', 
+                                            bounds = optimize.Bounds([0, np.log(0.1)], [2, np.log(1000)]), options = {'maxfun':1000})
+            optimization_output['x'] = np.array([optimization_output['x'][0], np.exp(optimization_output['x'][1])])
+        else: 
+            optimization_output = optimize.minimize(likelihood, start_params, args = (data, nactions), 
+                                            method = 'Nelder-Mead', bounds = optimize.Bounds([0, 0.1], [2, 1000]), 
+                                            options = {'maxfev':1000, 'xatol':0.001, 'return_all':0})
+        estimated_parameters = optimization_output['x']
+        estimated_LR = estimated_parameters[0]
+        fit_info['nfev'] += optimization_output['nfev']
+        fit_info['nit'] += optimization_output['nit']
+        fit_info['noptimizations'] += 1
+        fit_info['success'] = bool(optimization_output['success'])
+        fit_info['status'] = int(optimization_output['status'])
+    return estimated_parameters, fit_info
+
 
 #%% Functions used in the PowerAnalysis script
 
-def create_design(ntrials = 480, nreversals = 1, reward_probability = 0.8):
+def design_generator(seed, rep = None, pp = None): 
+    """
+    Parameters
+    ----------
+    seed : integer
+        Master seed of the power analysis.
+    rep, pp : integer, optional
+        The repetition and participant index of a design that belongs to one participant (design_randomisation = 'participant'). 
+        The defaults are None.
+
+    Returns
+    -------
+    rng : numpy.random.Generator
+        Random number generator for the design (see functions create_design() and create_design_bank()).
+
+    Description
+    -----------
+    All random numbers of a power analysis come from independent streams derived from one master seed: 
+    stream (0,) for the design (or the bank with one design per repetition), streams (0, rep, pp) for the design of each participant, 
+    streams (1, rep, pp) for the participants (see function participant_generator()) 
+    and stream (2,) for resampling (see function power_curve() in PowerAnalysis.py). 
+    Stream (1, rep, pp) is the same as np.random.SeedSequence(seed).spawn(2)[1].spawn(nreps)[rep].spawn(npp)[pp].
+    """
+    spawn_key = (0, ) if rep is None else (0, int(rep), int(pp))
+    return np.random.default_rng(np.random.SeedSequence(int(seed), spawn_key = spawn_key))
+
+def participant_generator(seed, rep, pp): 
+    """
+    Parameters
+    ----------
+    seed : integer
+        Master seed of the power analysis.
+    rep, pp : integer
+        The repetition and participant index. In the group difference criterion the participants of group 1 have index npp_per_group, ..., 2*npp_per_group - 1.
+
+    Returns
+    -------
+    rng : numpy.random.Generator
+        Random number generator of this participant in this repetition.
+
+    Description
+    -----------
+    Each hypothetical participant has its own stream of random numbers (see function design_generator()), 
+    which is used for its true parameters, its simulated responses and the random start points of its parameter estimation, in that order. 
+    The results of a participant thus only depend on the master seed, the repetition and the participant index: 
+    they are identical whether the participants are simulated per repetition or per participant, and whatever the number of workers.
+    """
+    return np.random.default_rng(np.random.SeedSequence(int(seed), spawn_key = (1, int(rep), int(pp))))
+
+def refit_generator(seed, rep, pp): 
+    """
+    Random number generator for the start points of the parameter estimation of a stored dataset (see function refit_repetition()): 
+    a separate stream of the master seed, so fitting the stored datasets again does not depend on the order in which they are fitted.
+    """
+    return np.random.default_rng(np.random.SeedSequence(int(seed), spawn_key = (3, int(rep), int(pp))))
+
+# columns of the instrumentation of each participant (see function participant_telemetry())
+telemetry_columns = ['rep', 'pp', 'True_LR', 'True_inverseTemp', 'LRestimation', 'inverseTempestimation',
+                     'simulation_seconds', 'estimation_seconds', 'nfev', 'nit', 'noptimizations', 'success', 'status']
+
+def participant_telemetry(rep, pp, True_parameters, estimated_parameters, simulation_seconds, estimation_seconds, fit_info):
+    """
+    Parameters
+    ----------
+    rep, pp : integer
+        The repetition and participant index.
+    True_parameters, estimated_parameters : numpy array, shape = (2,)
+        The true and recovered learning rate and inverse temperature of this participant.
+    simulation_seconds, estimation_seconds : float
+        Time spent on the data simulation and on the parameter estimation of this participant.
+        When a group of participants is simulated at once, each participant gets an equal share of the simulation time.
+    fit_info : dict
+        Information on the estimation, see function fit_participant().
+
+    Returns
+    -------
+    telemetry : numpy array, shape = (13,)
+        The instrumentation of this participant, in the order of telemetry_columns.
+
+    Description
+    -----------
+    Function to store the instrumentation of one participant as one row of numbers, so the rows of all participants
+    can be sent back from the workers and collected cheaply (see the argument instrument of correlation_repetition()).
+    """
+    return np.array([rep, pp, True_parameters[0], True_parameters[1], estimated_parameters[0], estimated_parameters[1],
+                     simulation_seconds, estimation_seconds, fit_info['nfev'], fit_info['nit'], fit_info['noptimizations'],
+                     fit_info['success'], fit_info['status']], dtype = float)
+
+def create_design(ntrials = 480, nreversals = 1, reward_probability = 0.8, rng = None, nstimuli = 2, nactions = 2):
     """
     Parameters
     ----------
@@ -288,6 +739,13 @@ def create_design(ntrials = 480, nreversals = 1, reward_probability = 0.8):
         The default is 1.
     reward_probability : float (element within [0, 1]), optional
         The probability that reward will be congruent with the current stimulus-response mapping rule. The default is 0.8.
+    rng : numpy.random.Generator, optional
+        Random number generator for the stimulus and feedback sequences (see function design_generator()). 
+        When None, the global numpy random state is used. The default is None.
+    nstimuli : integer, optional
+        The number of stimuli in the experiment. The default is 2.
+    nactions : integer, optional
+        The number of responses (and of stimulus-response mapping rules) in the experiment. The default is 2.
 
     Returns
     -------
@@ -316,51 +774,178 @@ def create_design(ntrials = 480, nreversals = 1, reward_probability = 0.8):
             - depends on the stimulus-response mapping rule for this trial
         Feedback congruence: whether feedback is congruent or incongruent with the current stimulus-response action mapping rule
             - depends on the reward_probability defined by the used: if reward_probability = 0.80, then the feedback will be congruent in 80% of the trials
+    With nstimuli stimuli and nactions responses (e.g. multi-armed reversal tasks), each stimulus appears in 1/nstimuli of the trials 
+    and the rules follow each other in the order 0, 1, ..., nactions - 1, 0, ...; the correct response is (stimulus + 1 - rule) modulo nactions 
+    (see Kernels.correct_responses()), which gives the two rules above with 2 stimuli and 2 responses.
+    """
+    if rng is None: rng = np.random
+# Start from the template: the rule of each trial and the stimuli and feedback congruences in sorted order
+    design = design_template(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, nstimuli = nstimuli, 
+                             nactions = nactions)
+
+# Column 1: define which stimulus is shown each trial 
+    
+    # each stimulus appears in 50% of the trials (1/nstimuli of the trials), in a random sequence
+    rng.shuffle(design[:, 1])
+    
+# Column 3: define the correct response at each trial
+
+    #correct response depends on the stimulus-response mapping rule (see Kernels.correct_responses())
+    design[:, 3] = Kernels.correct_responses(design[:, 0], design[:, 1], nactions)
+    
+# Column 4: define the feedback congruence at each trial
     
+    # feedback is congruent in i% of the trials with i = reward_probability*100, in a random sequence
+    rng.shuffle(design[:, 4])
+    return design
+
+def design_template(ntrials = 480, nreversals = 1, reward_probability = 0.8, nstimuli = 2, nactions = 2): 
     """
-# Create the template for the design: a pandas dataframe of shape (ntrials X 5)
+    Parameters
+    ----------
+    ntrials, nreversals, reward_probability, nstimuli, nactions : see function create_design().
+
+    Returns
+    -------
+    design : numpy array, shape = (ntrials X 5)
+        A design (see function create_design()) in which the stimuli and the feedback congruences are not shuffled yet: 
+        the first half of the trials has stimulus0 (with more stimuli: the first 1/nstimuli of the trials, the next 1/nstimuli stimulus1, ...) 
+        and the first reward_probability*ntrials trials have congruent feedback. 
+        The correct responses are not filled in.
 
-    design_df = pd.DataFrame(index = range(ntrials), 
-                             columns = ['rule', 'stimulus', 'response', 'CorResp', 'FBCon'], dtype = int)
+    Description
+    -----------
+    Function to define the parts of the design that are the same for all designs with these settings: 
+    the stimulus-response mapping rule of each trial and how often each stimulus and each feedback congruence appears. 
+    A design is obtained by shuffling column 1 and column 4 (see functions create_design() and create_design_bank()).
+    """
+    design = np.zeros((ntrials, 5), dtype = np.int64)
 # Column 0: define the stimulus-response mapping rule for each trial
 
     # complicated functions: with ntrials%(nreversals+1) !=0, we want the number of trials before a reversal to be roughly the same (with max. 1 trial difference)
     nchanges = nreversals+1
     nrule_repetitions = int(ntrials/nchanges)
     rest = ntrials%nchanges
-    x1 = np.tile(np.repeat([0, 1], nrule_repetitions), int(np.ceil((nchanges-rest)/2)))[:nrule_repetitions*(nchanges-rest)]
-    if x1[-1] == 1: x2 = np.tile(np.repeat([0, 1], nrule_repetitions+1), int(np.ceil(rest/2)))[:(nrule_repetitions+1)*rest]
-    else: x2 = np.tile(np.repeat([1, 0], nrule_repetitions+1), int(np.ceil(rest/2)))[:(nrule_repetitions+1)*rest]
-    design_df['rule'] = np.concatenate([x1, x2])
+    # the last rest blocks have one trial more; block b has rule b modulo nactions (rule 0, 1, 0, 1, ... with 2 responses)
+    block_lengths = np.concatenate([np.full(nchanges-rest, nrule_repetitions), np.full(rest, nrule_repetitions+1)])
+    design[:, 0] = np.repeat(np.arange(nchanges) % nactions, block_lengths)
+# Column 1: each stimulus appears in 50% of the trials (1/nstimuli of the trials)
+    stimulus_starts = np.floor(np.arange(1, nstimuli)*ntrials/nstimuli).astype(np.int64)
+    design[:, 1] = np.searchsorted(stimulus_starts, np.arange(ntrials), side = 'right')
+# Column 4: feedback is congruent in i% of the trials with i = reward_probability*100 
+    ncongruent = int(np.round(ntrials*reward_probability, 0))
+    design[:ncongruent, 4] = 1
+    return design
 
-# Column 1: define which stimulus is shown each trial 
+def shuffle_designs(design, ndesigns = 1, rng = None, nactions = 2): 
+    """
+    Parameters
+    ----------
+    design : numpy array, shape = (ntrials X 5)
+        The design (or design template, see function design_template()) of which the stimuli and feedback congruences are shuffled.
+    ndesigns : integer, optional
+        Number of designs that are created. The default is 1.
+    rng : numpy.random.Generator, optional
+        Random number generator for the shuffles. When None, the global numpy random state is used. The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
 
-    # each stimulus appears in 50% of the trials, in a random sequence
-    stimuli = np.concatenate([np.zeros(int(np.floor(ntrials/2))), np.ones(int(np.ceil(ntrials/2)))]).astype(int)
-    np.random.shuffle(stimuli)
-    design_df['stimulus'] = stimuli
-    
-# Column 3: define the correct response at each trial
+    Returns
+    -------
+    designs : numpy array (int8), shape = (ndesigns X ntrials X 5)
+        ndesigns independent designs with the same rules, but with the stimulus sequence (column 1) and the feedback congruence 
+        sequence (column 4) shuffled independently; the correct responses (column 3) are filled in.
 
-    #correct response depends on the stimulus-response mapping rule 
-    for trial in range(design_df.shape[0]): 
-        if design_df.loc[trial, 'rule'] == 1: design_df.loc[trial, 'CorResp'] = design_df.loc[trial, 'stimulus']
-        else: design_df.loc[trial, 'CorResp'] = (not design_df.loc[trial, 'stimulus'])*1
-    
-# Column 4: define the feedback congruence at each trial
-    
-    # feedback is congruent in i% of the trials with i = reward_probability*100 
-    ncongruent = int(np.round(ntrials*reward_probability, 0))
-    FBcon_array = np.concatenate([np.ones(ncongruent), np.zeros(ntrials-ncongruent)])
-    np.random.shuffle(FBcon_array)
-    design_df['FBCon'] = FBcon_array
-    
-# Convert the design dataframe to a design array, since arrays are computationally less demanding
+    Description
+    -----------
+    Function to create many designs at once without a loop over designs or trials: each shuffle is the argsort of ntrials random numbers, 
+    and the correct responses of all designs are computed with one call to Kernels.correct_responses(). 
+    The random numbers are drawn design by design, so design i only depends on the state of rng and on i, and not on ndesigns 
+    (e.g. the first 100 designs of a bank of 1000 designs equal a bank of 100 designs). 
+    The designs are stored as int8 (5 bytes per trial) and created in blocks of ca. 4 million trials to limit the memory that is used on the way.
+    """
+    if rng is None: rng = np.random
+    design = np.asarray(design)
+    ntrials = design.shape[0]
+    designs = np.zeros((ndesigns, ntrials, 5), dtype = np.int8)
+    designs[:, :, 0] = design[:, 0]
+    block = max(1, 2**22 // ntrials)
+    for first in range(0, ndesigns, block): 
+        last = min(first + block, ndesigns)
+        # one row of random numbers for the stimuli and one for the feedback congruences of each design
+        order = np.argsort(rng.random((last - first, 2, ntrials)), axis = 2)
+        designs[first:last, :, 1] = design[:, 1][order[:, 0]]
+        designs[first:last, :, 4] = design[:, 4][order[:, 1]]
+        stimuli = designs[first:last, :, 1].astype(np.int64).ravel()
+        rules = np.tile(design[:, 0].astype(np.int64), last - first)
+        designs[first:last, :, 3] = Kernels.correct_responses(rules, stimuli, nactions).reshape(last - first, ntrials)
+    return designs
+
+def create_design_bank(ndesigns, ntrials = 480, nreversals = 1, reward_probability = 0.8, rng = None, nstimuli = 2, nactions = 2): 
+    """
+    Parameters
+    ----------
+    ndesigns : integer
+        Number of designs in the bank, e.g. one design for each repetition.
+    ntrials, nreversals, reward_probability, nstimuli, nactions : see function create_design().
+    rng : numpy.random.Generator, optional
+        Random number generator for the designs (see function design_generator()). 
+        When None, the global numpy random state is used. The default is None.
+
+    Returns
+    -------
+    design_bank : numpy array (int8), shape = (ndesigns X ntrials X 5)
+        ndesigns independent designs, design_bank[i] has the same layout as the output of create_design().
 
-    design = design_df.to_numpy(dtype = int)
+    Description
+    -----------
+    Function to create a bank of designs, so that each repetition of the power analysis can use its own design 
+    and the variability between designs is part of the power estimate (design_randomisation = 'repetition'). 
+    The bank is one compact array that is shared with the workers at once (see function share_design()); 
+    a bank of 1000 designs with 10000 trials takes 50 MB. For more details see function shuffle_designs().
+    """
+    return shuffle_designs(design_template(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, nstimuli = nstimuli, 
+                                           nactions = nactions), ndesigns = ndesigns, rng = rng, nactions = nactions)
+
+def select_design(design, rep, pp = 0, seed = None, design_randomisation = 'fixed', nactions = 2): 
+    """
+    Parameters
+    ----------
+    design : numpy array, shape = (ntrials X 5) or (nreps X ntrials X 5), or tuple
+        The design, or the bank with one design per repetition (see function create_design_bank()). 
+        Can also be the descriptor of a design in shared memory (see function share_design()).
+    rep, pp : integer
+        The repetition and participant index.
+    seed : integer, optional
+        Master seed of the power analysis (see function design_generator()). 
+        When None, the global numpy random state is used. The default is None.
+    design_randomisation : string, optional
+        'fixed' (one design for the whole power analysis), 'repetition' (one design per repetition, design is a bank) 
+        or 'participant' (each participant gets its own design). The default is 'fixed'.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()). The default is 2.
+
+    Returns
+    -------
+    design : numpy array, shape = (ntrials X 5)
+        The design of this participant in this repetition.
+
+    Description
+    -----------
+    Function to pick the design of one participant within a worker process. With design_randomisation = 'participant' 
+    the stimuli and feedback congruences of the design are shuffled with the own stream of this participant (see function design_generator()), 
+    so the design only depends on the master seed, the repetition and the participant index, whatever the scheduling.
+    """
+    design = attach_design(design)
+    # a bank holds one design per repetition
+    if design.ndim == 3: design = design[rep]
+    if design_randomisation == 'participant': 
+        design = shuffle_designs(design, rng = None if seed is None else design_generator(seed, rep, pp), nactions = nactions)[0]
     return design
 
-def correlation_repetition(inverseTemp_distribution, LR_distribution, npp, ntrials, start_design, rep, nreps, ncpu):
+def correlation_repetition(inverseTemp_distribution, LR_distribution, npp, ntrials, start_design, rep, estimator = 'Nelder-Mead', 
+                           initialisation = 'random', seed = None, design_randomisation = 'fixed', instrument = False, dataset_store = None, 
+                           nactions = 2):
     """
 
     Parameters
@@ -375,11 +960,33 @@ def correlation_repetition(inverseTemp_distribution, LR_distribution, npp, ntria
         Number of participants that will be used in the parameter recovery analysis.
     ntrials : integer
         Number of trials that will be used to do the parameter recovery analysis for each participant.
-    start_design : numpy array, shape = (ntrials X 5)
+    start_design : numpy array, shape = (ntrials X 5) or (nreps X ntrials X 5), or tuple
         Design that will be used to simulate data for this repetition and to estimate the parameters as well.
-        For more details on this design see function create_design()
+        For more details on this design see function create_design(). A bank of designs (see function create_design_bank()) holds one design per repetition. 
+        Can also be the descriptor of a design in shared memory (see function share_design()); the design is not changed by this function.
     rep : integer
         Which repetition of the power estimation process is being executed. 
+    estimator : string, optional
+        Estimation method that will be used for each participant: 'Nelder-Mead', 'profile' or 'L-BFGS-B'. 
+        For more details see function fit_participant().
+    initialisation : string, optional
+        Start point of the optimization for each participant: 'random' or 'grid'. For more details see function fit_participant().
+    seed : integer, optional
+        Master seed of the power analysis: each participant of this repetition then gets its own random number generator 
+        (see function participant_generator()), so the repetition can be reproduced (e.g. when a power analysis is resumed). 
+        When None, the global numpy random state is used. The default is None.
+    design_randomisation : string, optional
+        'fixed', 'repetition' or 'participant': whether all participants of this repetition use the same design (start_design, or row rep of the bank) 
+        or each participant gets its own shuffle of it. For more details see function select_design(). The default is 'fixed'.
+    instrument : bool, optional
+        Whether the time spent on the data simulation and parameter estimation and the optimizer information of each participant
+        are returned as well (see function participant_telemetry()). The default is False.
+    dataset_store : string, optional
+        Folder of a dataset store (see DatasetStore.py) to which the data and true parameters of each participant are written, 
+        so the datasets can be fitted again later without simulating them (see function refit_repetition()). 
+        When None, the datasets are not kept. The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()); the number of stimuli follows from the design. The default is 2.
 
     Returns
     -------
@@ -389,6 +996,16 @@ def correlation_repetition(inverseTemp_distribution, LR_distribution, npp, ntria
         If the estimation failed each of these five times, the estimation for this participant has failed. 
     Statistic : float
         The correlation found between the true and recovered parameters this repetition.
+    mean_nfev : float
+        Mean number of likelihood evaluations per participant this repetition (restarts included).
+    mean_nit : float
+        Mean number of optimizer iterations per participant this repetition (restarts included).
+    True_parameters : numpy array, shape = (npp X 2)
+        The true learning rate (column 0) and inverse temperature (column 1) of each participant.
+    estimated_parameters : numpy array, shape = (npp X 2)
+        The recovered learning rate (column 0) and inverse temperature (column 1) of each participant.
+    telemetry : numpy array, shape = (npp X 13)
+        Only returned when instrument = True: the instrumentation of each participant, with the columns in telemetry_columns.
     
     Description
     -----------
@@ -415,64 +1032,62 @@ def correlation_repetition(inverseTemp_distribution, LR_distribution, npp, ntria
     If this function is repeated a number of times and the value of the Statistic is stored each time, we can evaluate later on the power or probability to meet the proposed parameter recovery criterion (the correlation criterion) in a single study. 
     The function also tracks for how many hypothetical participants the parameter estimation processes failed. A parameter estimation process fails when the recovered parameter set yields a learning rate estimate < 0.1 five times in a row.
     """
-    if rep == 0: 
-        t0 = time.time()
-    nfailed_estimates = 0 # keep track of number of failed estimates per repetition
-    failed_estimates = np.array([], dtype = int) # keep track of which pp param. estimation failed for 
-        # so we can delete these pp. in the correlation or group difference estimation
+    # the design of each participant in this repetition (see function select_design())
+    if design_randomisation == 'participant': designs = [select_design(start_design, rep, pp, seed, design_randomisation, nactions) for pp in range(npp)]
+    else: designs = [select_design(start_design, rep)] * npp
+    # with a seed, each participant has its own random number generator
+    rngs = [participant_generator(seed, rep, pp) for pp in range(npp)] if seed is not None else None
     
     ####PART 1: parameter generation for all participants####
     # Define the True params that will be used for each pp in this rep
-    True_LRs =  generate_parameters(mean = LR_distribution[0], std = LR_distribution[1], npp = npp)
-    True_inverseTemps = generate_parameters(mean = inverseTemp_distribution[0], std = inverseTemp_distribution[1], npp = npp)
+    True_LRs =  generate_parameters(mean = LR_distribution[0], std = LR_distribution[1], npp = npp, rng = rngs)
+    True_inverseTemps = generate_parameters(mean = inverseTemp_distribution[0], std = inverseTemp_distribution[1], npp = npp, rng = rngs)
     
-    # loop over all pp. to do the data generation and parameter estimation 
-    # create array that will contain the final LRestimate for each participant this repetition
-    LRestimations = np.empty(npp) 
-    for pp in range(npp): 
-        ####Part 2: Data simulation for this participant####
-        # generate the responses for this participant 
-        responses = simulate_responses(simulation_LR=True_LRs[pp], simulation_inverseTemp=True_inverseTemps[pp], 
-                                design=start_design)
-        # fill in the responses of this participant into the start design, in order to use this later in param. estimation
-        start_design[:, 2] = responses
-        
+    ####Part 2: Data simulation for all participants####
+    # generate the responses of all participants in one pass over the trials, shape = (npp, ntrials)
+    simulation_start = time.perf_counter()
+    responses = simulate_designs(True_LRs, True_inverseTemps, designs, rngs, nactions = nactions)
+    simulation_seconds = time.perf_counter() - simulation_start
+
+    # loop over all pp. to do the parameter estimation 
+    # create array that will contain the final parameter estimates for each participant this repetition
+    estimations = np.empty((npp, 2)) 
+    LRestimations = estimations[:, 0]
+    # keep track of which pp param. estimation failed for, so we can delete these pp. in the correlation estimation
+    failed = np.zeros(npp, dtype = bool)
+    # keep track of the number of likelihood evaluations and iterations used by the optimizer for each participant
+    nfev, nit = np.zeros(npp), np.zeros(npp)
+    # the instrumentation of each participant (only filled in when instrument = True)
+    telemetry = np.zeros((npp, len(telemetry_columns)))
+    for pp in range(npp):
+        # the data of this participant: its design with its responses in column 2, in order to use this later in param. estimation
+        data = np.array(designs[pp], dtype = np.int64)
+        data[:, 2] = responses[pp, :]
+        if dataset_store is not None: write_dataset(dataset_store, rep, pp, data, [True_LRs[pp], True_inverseTemps[pp]])
+
         ####Part 3: parameter estimation for this participant####
-        number_of_optimalizations = 0
-        estimated_LR = 0
-        while estimated_LR < 0.01 and number_of_optimalizations < 5:
-            start_params = np.concatenate([np.random.rand(1), np.random.uniform(0.1, 10, 1)])
-            x_bounds = optimize.Bounds([0, 0.1], [2, 1000])
-            optimization_output = optimize.minimize(likelihood, start_params, args =(tuple([start_design])), 
-                                            method = 'Nelder-Mead', bounds = x_bounds, 
-                                            options = {'maxfev':1000, 'xatol':0.001, 'return_all':1})
-            estimated_parameters = optimization_output['x']
-            estimated_LR = estimated_parameters[0]
-            number_of_optimalizations += 1
-        if estimated_LR < 0.01: # if the final LR estimate is implausible: 
-            nfailed_estimates += 1 # increase the number of failed estimates this repetition with 1
-            # store the pp for which the estimation was failed, in order to delete this pp. later on 
-            failed_estimates = np.append(failed_estimates, pp)
-            
-        LRestimations[pp] = estimated_LR
-
-    proportion_failed_estimates = np.round(nfailed_estimates / npp, 3)
+        estimation_start = time.perf_counter()
+        estimated_parameters, fit_info = fit_participant(data, estimator = estimator, initialisation = initialisation,
+                                                         rng = None if rngs is None else rngs[pp], nactions = nactions)
+        if instrument:
+            telemetry[pp] = participant_telemetry(rep, pp, [True_LRs[pp], True_inverseTemps[pp]], estimated_parameters, simulation_seconds / npp,
+                                                  time.perf_counter() - estimation_start, fit_info)
+        estimated_LR = estimated_parameters[0]
+        nfev[pp], nit[pp] = fit_info['nfev'], fit_info['nit']
+        # if the final LR estimate is implausible: store the pp for which the estimation was failed, in order to delete this pp. later on 
+        failed[pp] = estimated_LR < 0.01
+        estimations[pp] = estimated_parameters
+
     ####Part 4: correlation between true & estimated learning rates####
     # if the estimation failed for a certain participant, delete this participant from the correlation estimation for this repetition
-    if nfailed_estimates == 0: 
-        Statistic = np.round(np.corrcoef(True_LRs, LRestimations)[0, 1], 2)
-    else: 
-        Statistic = np.round(np.corrcoef(np.delete(True_LRs, failed_estimates), 
-                                       np.delete(LRestimations, failed_estimates))[0, 1], 2)
-    if rep == 0: 
-        t1 = time.time() - t0
-        estimated_seconds = t1 * np.ceil(nreps / ncpu)
-        estimated_time = np.ceil(estimated_seconds / 60)
-        print("The power analysis will take ca. {} minutes".format(estimated_time))
-    return proportion_failed_estimates, Statistic
+    proportion_failed_estimates, Statistic = correlation_statistic(True_LRs, LRestimations, failed)
+    output = (proportion_failed_estimates, Statistic, np.mean(nfev), np.mean(nit), np.column_stack([True_LRs, True_inverseTemps]), estimations)
+    return output + (telemetry, ) if instrument else output
 
 def groupdifference_repetition(inverseTemp_distribution, LR_distributions, npp_per_group, 
-                               ntrials, start_design, rep, nreps, ncpu, standard_power = False): 
+                               ntrials, start_design, rep, standard_power = False, estimator = 'Nelder-Mead', 
+                               initialisation = 'random', seed = None, design_randomisation = 'fixed', instrument = False, 
+                               dataset_store = None, nactions = 2): 
     """
 
     Parameters
@@ -488,11 +1103,33 @@ def groupdifference_repetition(inverseTemp_distribution, LR_distributions, npp_p
         Number of participants that will be used in the parameter recovery analysis.
     ntrials : integer
         Number of trials that will be used to do the parameter recovery analysis for each participant.
-    start_design : numpy array, shape = (ntrials X 5)
+    start_design : numpy array, shape = (ntrials X 5) or (nreps X ntrials X 5), or tuple
         Design that will be used to simulate data for this repetition and to estimate the parameters as well.
-        For more details on this design see function create_design()
+        For more details on this design see function create_design(). A bank of designs (see function create_design_bank()) holds one design per repetition. 
+        Can also be the descriptor of a design in shared memory (see function share_design()); the design is not changed by this function.
     rep : integer
         Which repetition of the power estimation process is being executed. 
+    estimator : string, optional
+        Estimation method that will be used for each participant: 'Nelder-Mead', 'profile' or 'L-BFGS-B'. 
+        For more details see function fit_participant().
+    initialisation : string, optional
+        Start point of the optimization for each participant: 'random' or 'grid'. For more details see function fit_participant().
+    seed : integer, optional
+        Master seed of the power analysis: each participant of this repetition then gets its own random number generator 
+        (see function participant_generator()), so the repetition can be reproduced (e.g. when a power analysis is resumed). 
+        When None, the global numpy random state is used. The default is None.
+    design_randomisation : string, optional
+        'fixed', 'repetition' or 'participant': whether all participants of this repetition use the same design (start_design, or row rep of the bank) 
+        or each participant gets its own shuffle of it. For more details see function select_design(). The default is 'fixed'.
+    instrument : bool, optional
+        Whether the time spent on the data simulation and parameter estimation and the optimizer information of each participant
+        are returned as well (see function participant_telemetry()). The default is False.
+    dataset_store : string, optional
+        Folder of a dataset store (see DatasetStore.py) to which the data and true parameters of each participant are written, 
+        so the datasets can be fitted again later without simulating them (see function refit_repetition()). 
+        When None, the datasets are not kept. The default is None.
+    nactions : integer, optional
+        Number of responses of the task (see function create_design()); the number of stimuli follows from the design. The default is 2.
 
     Returns
     -------
@@ -503,6 +1140,18 @@ def groupdifference_repetition(inverseTemp_distribution, LR_distributions, npp_p
     pValue : float
         Probability to find these recovered learning rate values within the two groups when the two groups would be drawn from the same distribution.
         This probaility is calculated using a two-sample t-test comparing the recovered learning rates for group 0 and group 1. 
+    mean_nfev : float
+        Mean number of likelihood evaluations per participant this repetition (restarts included); 0 when standard_power = True.
+    mean_nit : float
+        Mean number of optimizer iterations per participant this repetition (restarts included); 0 when standard_power = True.
+    True_parameters : numpy array, shape = (2*npp_per_group X 2)
+        The true learning rate (column 0) and inverse temperature (column 1) of each participant; the participants of group 0 come first.
+    estimated_parameters : numpy array, shape = (2*npp_per_group X 2)
+        The recovered learning rate (column 0) and inverse temperature (column 1) of each participant, in the same order. 
+        When standard_power = True these are the true parameters.
+    telemetry : numpy array, shape = (2*npp_per_group X 13)
+        Only returned when instrument = True: the instrumentation of each participant, with the columns in telemetry_columns.
+        When standard_power = True no data are simulated and estimated, so the times and optimizer information are 0.
 
 
     Description
@@ -538,71 +1187,388 @@ def groupdifference_repetition(inverseTemp_distribution, LR_distributions, npp_p
     This function will be repeated nrep times, each time resulting in a specific Statistic and pValue. 
     The functions also returns the percentage of failed LR estimates for this repetition.
     """
-    if rep == 0: 
-        t0 = time.time()
-    nfailed_estimates = 0 # keep track of number of failed estimates per repetition
-    failed_estimates_g0 = np.array([], dtype = int)
-    failed_estimates_g1 = np.array([], dtype = int) # keep track of which pp param. estimation failed for 
-        # so we can delete these pp. in the correlation or group difference estimation
-    # create array that will contain the final LRestimate for each participant this repetition
-    LRestimations = np.empty([2, npp_per_group]) 
+    # with a seed, each participant has its own random number generator (participants of group 1 come after those of group 0)
+    rngs = [participant_generator(seed, rep, pp) for pp in range(2*npp_per_group)] if seed is not None else None
+    # keep track of which pp param. estimation failed for, so we can delete these pp. in the group difference estimation
+    failed = np.zeros([2, npp_per_group], dtype = bool)
+    # create arrays that will contain the true and final estimated parameters for each participant this repetition
+    True_parameters, estimations = np.empty([2, npp_per_group, 2]), np.empty([2, npp_per_group, 2])
+    LRestimations = estimations[:, :, 0]
+    # keep track of the number of likelihood evaluations and iterations used by the optimizer for each participant
+    nfev, nit = np.zeros([2, npp_per_group]), np.zeros([2, npp_per_group])
+    # the instrumentation of each participant (only filled in when instrument = True)
+    telemetry = np.zeros([2, npp_per_group, len(telemetry_columns)])
     for group in range(2):
         ####PART 1: parameter generation for all participants####
         # Define the True params that will be used for each pp in this rep
-        True_LRs =  generate_parameters(mean = LR_distributions[group, 0], std = LR_distributions[group, 1], npp = npp_per_group)
-        True_inverseTemps = generate_parameters(mean = inverseTemp_distribution[0], std = inverseTemp_distribution[1], npp = npp_per_group)
+        group_rngs = None if rngs is None else rngs[group*npp_per_group:(group+1)*npp_per_group]
+        True_LRs =  generate_parameters(mean = LR_distributions[group, 0], std = LR_distributions[group, 1], npp = npp_per_group, rng = group_rngs)
+        True_inverseTemps = generate_parameters(mean = inverseTemp_distribution[0], std = inverseTemp_distribution[1], npp = npp_per_group, 
+                                                rng = group_rngs)
+        True_parameters[group, :, 0], True_parameters[group, :, 1] = True_LRs, True_inverseTemps
         
         # loop over all pp. to do the data generation and parameter estimation 
         if standard_power == True: 
-            LRestimations[group, :] = True_LRs
+            estimations[group] = True_parameters[group]
         else: 
+            ####Part 2: Data simulation for all participants in this group####
+            # the design of each participant in this group (see function select_design())
+            if design_randomisation == 'participant': 
+                designs = [select_design(start_design, rep, group*npp_per_group + pp, seed, design_randomisation, nactions) 
+                           for pp in range(npp_per_group)]
+            else: designs = [select_design(start_design, rep)] * npp_per_group
+            # generate the responses of all participants in this group in one pass over the trials, shape = (npp_per_group, ntrials)
+            simulation_start = time.perf_counter()
+            responses = simulate_designs(True_LRs, True_inverseTemps, designs, group_rngs, nactions = nactions)
+            simulation_seconds = time.perf_counter() - simulation_start
             for pp in range(npp_per_group): 
-                ####Part 2: Data simulation for this participant####
-                # generate the responses for this participant 
-                responses = simulate_responses(simulation_LR=True_LRs[pp], simulation_inverseTemp=True_inverseTemps[pp], 
-                                        design=start_design)
-                # fill in the responses of this participant into the start design, in order to use this later in param. estimation
-                start_design[:, 2] = responses
-                
+                # the data of this participant: its design with its responses in column 2, in order to use this later in param. estimation
+                data = np.array(designs[pp], dtype = np.int64)
+                data[:, 2] = responses[pp, :]
+                if dataset_store is not None: write_dataset(dataset_store, rep, group*npp_per_group + pp, data, True_parameters[group, pp])
+
                 ####Part 3: parameter estimation for this participant####
-                # use gradient descent to find the optimal parameters for this participant
-                number_of_optimalizations = 0
-                estimated_LR = 0
-                while estimated_LR < 0.01 and number_of_optimalizations < 5:
-                    start_params = np.concatenate([np.random.rand(1), np.random.uniform(0.1, 10, 1)])
-                    x_bounds = optimize.Bounds([0, 0.1], [2, 1000])
-                    optimization_output = optimize.minimize(likelihood, start_params, args =(tuple([start_design])), 
-                                                    method = 'Nelder-Mead', bounds = x_bounds, 
-                                                    options = {'maxfev':1000, 'xatol':0.001, 'return_all':0})
-                    estimated_parameters = optimization_output['x']
-                    estimated_LR = estimated_parameters[0]
-                    number_of_optimalizations += 1
-                    
-                if estimated_LR < 0.01: # if the final LR estimate is implausible:  
-                    # increase the number of failed estimates this repetition with 1
-                    nfailed_estimates += 1
-                    # store the pp for which the estimation was failed, in order to delete this pp. later on 
-                    if group == 0: failed_estimates_g0 = np.append(failed_estimates_g0, pp)
-                    else: failed_estimates_g1 = np.append(failed_estimates_g1, pp)
-                    
-                LRestimations[group, pp] = estimated_LR
+                estimation_start = time.perf_counter()
+                estimated_parameters, fit_info = fit_participant(data, estimator = estimator, initialisation = initialisation,
+                                                                 rng = None if group_rngs is None else group_rngs[pp], nactions = nactions)
+                if instrument:
+                    telemetry[group, pp] = participant_telemetry(rep, group*npp_per_group + pp, True_parameters[group, pp], estimated_parameters,
+                                                                 simulation_seconds / npp_per_group, time.perf_counter() - estimation_start, fit_info)
+                estimated_LR = estimated_parameters[0]
+                nfev[group, pp], nit[group, pp] = fit_info['nfev'], fit_info['nit']
+                # if the final LR estimate is implausible: store the pp for which the estimation was failed, in order to delete this pp. later on 
+                failed[group, pp] = estimated_LR < 0.01
+                estimations[group, pp] = estimated_parameters
         
-    # keep track of the proportion of estimates that failed this repetition 
-    propfailed_estimates = np.round(nfailed_estimates / (npp_per_group*2), 3)
-    
-    # first delete the participants for which the estimates failed
-    LRestimations_g0 = np.delete(LRestimations[0, :], failed_estimates_g0)
-    LRestimations_g1 = np.delete(LRestimations[1, :], failed_estimates_g1)
-    Statistic, pValue = stat.ttest_ind(LRestimations_g0, LRestimations_g1, alternative = 'less')
-    if rep == 0: 
-        t1 = time.time() - t0
-        estimated_seconds = t1 * nreps / ncpu
-        estimated_time = np.ceil(estimated_seconds / 60)
-        print("The power analysis will take ca. {} minutes".format(estimated_time))
-    return propfailed_estimates, pValue
+    # keep track of the proportion of estimates that failed this repetition and delete the participants for which the estimates failed
+    propfailed_estimates, pValue = groupdifference_statistic(LRestimations, failed)
+    output = (propfailed_estimates, pValue, np.mean(nfev), np.mean(nit), True_parameters.reshape(-1, 2), estimations.reshape(-1, 2))
+    if not instrument: return output
+    if standard_power:
+        # no estimation: only the indices and the (true) parameters are filled in
+        telemetry[:, :, 0], telemetry[:, :, 1] = rep, np.arange(2*npp_per_group).reshape(2, npp_per_group)
+        telemetry[:, :, 2:4], telemetry[:, :, 4:6] = True_parameters, estimations
+    return output + (telemetry.reshape(-1, len(telemetry_columns)), )
+
+def correlation_statistic(True_LRs, LRestimations, failed): 
+    """
+    Parameters
+    ----------
+    True_LRs : numpy array, shape = (npp,)
+        The true learning rates of the participants.
+    LRestimations : numpy array, shape = (npp,)
+        The recovered learning rates of the participants.
+    failed : numpy array (bool), shape = (npp,)
+        Whether the parameter estimation failed for each participant.
+
+    Returns
+    -------
+    proportion_failed_estimates : float, within range [0, 1]
+        Proportion of participants for which the parameter estimation failed.
+    Statistic : float
+        The correlation between the true and recovered learning rates of the participants for which the estimation did not fail.
+
+    Description
+    -----------
+    Function to calculate the statistic of the correlation criterion from the (true and recovered) learning rates of one repetition.
+    """
+    proportion_failed_estimates = np.round(np.mean(failed), 3)
+    Statistic = np.round(np.corrcoef(True_LRs[~failed], LRestimations[~failed])[0, 1], 2)
+    return proportion_failed_estimates, Statistic
+
+def groupdifference_statistic(LRestimations, failed): 
+    """
+    Parameters
+    ----------
+    LRestimations : numpy array, shape = (2 X npp_per_group)
+        The recovered learning rates of the participants in group 0 (row 0) and group 1 (row 1).
+    failed : numpy array (bool), shape = (2 X npp_per_group)
+        Whether the parameter estimation failed for each participant.
+
+    Returns
+    -------
+    proportion_failed_estimates : float, within range [0, 1]
+        Proportion of participants for which the parameter estimation failed.
+    pValue : float
+        The p-value of the one-sided two-sample t-test comparing the recovered learning rates of group 0 and group 1 
+        (participants for which the estimation failed are deleted).
+
+    Description
+    -----------
+    Function to calculate the statistic of the group difference criterion from the recovered learning rates of one repetition.
+    """
+    proportion_failed_estimates = np.round(np.mean(failed), 3)
+    Statistic, pValue = stat.ttest_ind(LRestimations[0, ~failed[0]], LRestimations[1, ~failed[1]], alternative = 'less')
+    return proportion_failed_estimates, pValue
+
+def participant_task(task): 
+    """
+    Parameters
+    ----------
+    task : tuple
+        (rep, pp, LR_distribution, inverseTemp_distribution, start_design, estimator, initialisation, seed, design_randomisation, instrument, dataset_store, 
+        nactions): the repetition and participant index, the mean and standard deviation of the distributions from which the true parameters of this participant
+        are drawn, the design, the estimation settings (see function fit_participant()), the master seed, the design randomisation
+        (see function select_design()), whether the participant is instrumented (see function participant_telemetry()), 
+        the dataset store to which the data of the participant are written (None: not kept, see DatasetStore.py) 
+        and the number of responses of the task (see function create_design()).
+        The design can also be the descriptor of a design in shared memory (see function share_design()).
+
+    Returns
+    -------
+    rep, pp : integer
+        The repetition and participant index of the task.
+    True_parameters : numpy array, shape = (2,)
+        The true learning rate and inverse temperature of this participant.
+    estimated_parameters : numpy array, shape = (2,)
+        The recovered learning rate and inverse temperature of this participant.
+    nfev, nit : integer
+        Number of likelihood evaluations and optimizer iterations used for this participant.
+    telemetry : numpy array, shape = (13,)
+        The instrumentation of this participant (see function participant_telemetry()); None when instrument = False.
+
+    Description
+    -----------
+    Function to draw the true parameters of one hypothetical participant, to simulate its data and to estimate its parameters. 
+    Used when the power analysis is scheduled per participant instead of per repetition (see PowerAnalysis.py); 
+    the statistic of each repetition is calculated afterwards with correlation_statistic() or groupdifference_statistic(). 
+    The participant uses its own random number generator (see function participant_generator()), so it gets exactly the same 
+    true parameters, responses and estimates as in correlation_repetition() or groupdifference_repetition() with the same seed.
+    """
+    (rep, pp, LR_distribution, inverseTemp_distribution, start_design, estimator, initialisation, seed, design_randomisation, instrument, dataset_store, 
+     nactions) = task
+    rng = participant_generator(seed, rep, pp)
+    True_LR = generate_parameters(mean = LR_distribution[0], std = LR_distribution[1], rng = rng)[0]
+    True_inverseTemp = generate_parameters(mean = inverseTemp_distribution[0], std = inverseTemp_distribution[1], rng = rng)[0]
+    data = np.array(select_design(start_design, rep, pp, seed, design_randomisation, nactions), dtype = np.int64)
+    simulation_start = time.perf_counter()
+    data[:, 2] = simulate_responses(simulation_LR = True_LR, simulation_inverseTemp = True_inverseTemp, design = data, rng = rng, nactions = nactions)
+    if dataset_store is not None: write_dataset(dataset_store, rep, pp, data, [True_LR, True_inverseTemp])
+    estimation_start = time.perf_counter()
+    estimated_parameters, fit_info = fit_participant(data, estimator = estimator, initialisation = initialisation, rng = rng, nactions = nactions)
+    telemetry = None
+    if instrument:
+        telemetry = participant_telemetry(rep, pp, [True_LR, True_inverseTemp], estimated_parameters, estimation_start - simulation_start,
+                                          time.perf_counter() - estimation_start, fit_info)
+    return rep, pp, np.array([True_LR, True_inverseTemp]), estimated_parameters, fit_info['nfev'], fit_info['nit'], telemetry
+
+def repetition_task(task): 
+    """
+    Parameters
+    ----------
+    task : tuple
+        (rep, repetition_function, arguments): the repetition index, the function that executes one repetition 
+        (correlation_repetition or groupdifference_repetition) and the arguments for this function.
+
+    Returns
+    -------
+    rep : integer
+        The repetition index of the task.
+    output : tuple
+        The output of repetition_function(*arguments).
+
+    Description
+    -----------
+    Function to execute one repetition in a worker process. The repetition index is returned with the output, 
+    so the results can be collected in the order in which they are finished (e.g. to write them to a checkpoint file immediately).
+    """
+    rep, repetition_function, arguments = task
+    return rep, repetition_function(*arguments)
+
+def refit_repetition(dataset_store, rep, estimator = 'Nelder-Mead', initialisation = 'random', seed = None): 
+    """
+    Parameters
+    ----------
+    dataset_store : string
+        Folder of a dataset store (see DatasetStore.py) in which all participants of this repetition are stored.
+    rep : integer
+        The repetition that is fitted.
+    estimator, initialisation : string, optional
+        Estimation settings, see function fit_participant(). The defaults are 'Nelder-Mead' and 'random'.
+    seed : integer, optional
+        Master seed for the random start points of the estimation (see function refit_generator()). 
+        When None, the global numpy random state is used. The default is None.
+
+    Returns
+    -------
+    The same as correlation_repetition() or groupdifference_repetition() (depending on the criterion of the store), without telemetry.
+
+    Description
+    -----------
+    Function to execute the parameter estimation of one repetition again on the stored datasets instead of on newly simulated data, 
+    e.g. to compare estimators on exactly the same datasets. The statistic is calculated with the criterion (and number of responses) of the store. 
+    With estimator = 'profile' or initialisation = 'grid' the estimates are the same as in the original power analysis; 
+    with random start points they can differ slightly, since the start points are drawn from another random stream.
+    """
+    configuration = store_configuration(dataset_store)
+    npp = open_store(dataset_store)['metadata']['npp']
+    True_parameters, estimations = np.empty((npp, 2)), np.empty((npp, 2))
+    nfev, nit = np.zeros(npp), np.zeros(npp)
+    for pp in range(npp): 
+        data, True_parameters[pp] = read_dataset(dataset_store, rep, pp)
+        estimations[pp], fit_info = fit_participant(data, estimator = estimator, initialisation = initialisation, 
+                                                    rng = None if seed is None else refit_generator(seed, rep, pp), 
+                                                    nactions = configuration.get('nactions', 2))
+        nfev[pp], nit[pp] = fit_info['nfev'], fit_info['nit']
+    failed = estimations[:, 0] < 0.01
+    if configuration['criterion'] == 'correlation': 
+        propfailed_estimates, Statistic = correlation_statistic(True_parameters[:, 0], estimations[:, 0], failed)
+    else: 
+        propfailed_estimates, Statistic = groupdifference_statistic(estimations[:, 0].reshape(2, -1), failed.reshape(2, -1))
+    return propfailed_estimates, Statistic, np.mean(nfev), np.mean(nit), True_parameters, estimations
+
+def task_chunk(chunk): 
+    """
+    Parameters
+    ----------
+    chunk : tuple
+        (task_function, tasks): a function that executes one task (e.g. participant_task or repetition_task) and a list of tasks.
+
+    Returns
+    -------
+    outputs : list
+        The output of task_function for each task in the chunk.
+
+    Description
+    -----------
+    Function to execute a chunk of tasks in a worker process at once, so that small tasks can be sent to the workers in groups 
+    (see function submit_tasks() in PowerAnalysis.py).
+    """
+    task_function, tasks = chunk
+    return [task_function(task) for task in tasks]
+
+# designs in shared memory that are attached in this process: {name: (shared memory block, read-only design)}, the most recently used last
+attached_designs = {}
+# the designs that were put in shared memory by this process (see function share_design()); they stay attached until release_design()
+created_designs = set()
+# number of designs that a worker keeps attached: the pool is reused for all rows of the Input_file, so the designs of finished rows are closed
+max_attached_designs = 2
+
+def share_design(design): 
+    """
+    Parameters
+    ----------
+    design : numpy array
+        Design (or any other array) that will be shared with the worker processes.
+
+    Returns
+    -------
+    shared_block : multiprocessing.shared_memory.SharedMemory
+        The shared memory block that contains the design. Release it with release_design() when all workers are done.
+    design_descriptor : tuple
+        (name, shape, dtype) of the shared design. This small tuple is sent to the workers instead of the design itself.
+
+    Description
+    -----------
+    Function to copy a design once into shared memory, so that the workers can use it without receiving a copy with every task. 
+    The workers attach to the design with attach_design().
+    """
+    shared_block = shared_memory.SharedMemory(create = True, size = max(design.nbytes, 1))
+    shared_design = np.ndarray(design.shape, dtype = design.dtype, buffer = shared_block.buf)
+    shared_design[:] = design
+    shared_design.flags.writeable = False
+    # this process can use the shared design as well (e.g. to send it to workers on other machines, see Distributed.py)
+    attached_designs[shared_block.name] = (shared_block, shared_design)
+    created_designs.add(shared_block.name)
+    return shared_block, (shared_block.name, design.shape, design.dtype.str)
+
+def keep_design(name, shared_block, design): 
+    """
+    Parameters
+    ----------
+    name : string
+        Name of the design (see function share_design()).
+    shared_block : multiprocessing.shared_memory.SharedMemory or None
+        The shared memory block of the design; None when the design is not in shared memory (e.g. read from a file, see Distributed.py).
+    design : numpy array
+        The read-only design.
+
+    Returns
+    -------
+    None.
+
+    Description
+    -----------
+    Function to add a design to attached_designs. Only the max_attached_designs most recently used designs that were attached by this process 
+    are kept: the older ones are closed, so a worker that does the rows of an Input_file one after another does not keep the designs 
+    of all earlier rows (up to 50 MB for a bank of designs) mapped. The designs that this process put in shared memory itself are not closed here.
+    """
+    attached_designs[name] = (shared_block, design)
+    attached = [attached_name for attached_name in attached_designs if attached_name not in created_designs]
+    for old_name in attached[:max(len(attached) - max_attached_designs, 0)]: 
+        old_block = attached_designs.pop(old_name)[0]
+        if old_block is None: continue
+        # the design array refers to the memory block: the block can only be closed when no other array refers to it anymore
+        try: old_block.close()
+        except BufferError: pass
+
+def attach_design(design): 
+    """
+    Parameters
+    ----------
+    design : numpy array or tuple
+        A design, or the descriptor of a design in shared memory returned by share_design().
+
+    Returns
+    -------
+    design : numpy array
+        The design itself. A design in shared memory is returned as a read-only array, 
+        so the responses of each participant should be filled in in a copy of the design.
+
+    Description
+    -----------
+    Function to get the design within a worker process. Each process attaches to a shared design only once; 
+    later tasks with the same design reuse the attached array. Designs that have not been used for a while are closed (see function keep_design()).
+    """
+    if isinstance(design, np.ndarray): return design
+    name, shape, dtype = design
+    if name in attached_designs: 
+        # most recently used last
+        attached_designs[name] = attached_designs.pop(name)
+    else: 
+        shared_block = shared_memory.SharedMemory(name = name)
+        shared_design = np.ndarray(shape, dtype = dtype, buffer = shared_block.buf)
+        shared_design.flags.writeable = False
+        keep_design(name, shared_block, shared_design)
+    return attached_designs[name][1]
+
+def release_design(shared_block): 
+    """Function to free the shared memory of a design created with share_design(), once no task uses it anymore."""
+    attached_designs.pop(shared_block.name, None)
+    created_designs.discard(shared_block.name)
+    shared_block.close()
+    shared_block.unlink()
+
+def initialise_worker(backend = 'auto'): 
+    """
+    Parameters
+    ----------
+    backend : string, optional
+        The kernel backend that will be used by this worker process: 'auto', 'numpy' or 'numba' (see Kernels.py). The default is 'auto'.
+
+    Returns
+    -------
+    None.
+
+    Description
+    -----------
+    Function that is executed once in each worker process when the pool is created (see create_executor() in PowerAnalysis.py). 
+    It selects the kernel backend and runs each kernel once on a small design, so that the kernels are compiled (numba) or loaded 
+    before the first real task arrives and the first task of each worker is not slower than the others.
+    """
+    Kernels.set_backend(backend)
+    warmup_data = np.array([[0, 0, 0, 1, 1], [0, 1, 1, 0, 1], [1, 0, 0, 0, 0], [1, 1, 1, 1, 1], [0, 0, 1, 1, 1]])
+    Kernels.correct_responses(warmup_data[:, 0].astype(np.int64), warmup_data[:, 1].astype(np.int64))
+    Kernels.simulate_cohort(np.array([0.5]), np.array([1.0]), warmup_data[:, 1].astype(np.int64), warmup_data[:, 3].astype(np.int64), 
+                            warmup_data[:, 4].astype(np.int64), np.full((1, 5), 0.5))
+    likelihood(np.array([0.5, 1.0]), warmup_data)
 
 #%%
-def check_input_parameters(ntrials, nreversals, npp, reward_probability, full_speed, criterion, significance_cutoff, cohens_d, nreps, plot_folder):
+def check_input_parameters(ntrials, nreversals, npp, reward_probability, full_speed, criterion, significance_cutoff, cohens_d, nreps, plot_folder, 
+                           estimator = 'Nelder-Mead', initialisation = 'random', scheduling = 'repetition', seed = None, checkpoint = 0, 
+                           precision = None, target_power = None, search = 'npp', curve = None, 
+                           cache_folder = None, cache_size = None, cache_age = None, design_randomisation = 'fixed', instrument = 0,
+                           queue_folder = None, surrogate = None, dataset_store = None, nstimuli = 2, nactions = 2):
     variables_are_fine = 1
     if ntrials < 5: 
         print("ntrials = {}; but minimal number of trials = 5.".format(ntrials))
@@ -613,6 +1579,13 @@ def check_input_parameters(ntrials, nreversals, npp, reward_probability, full_sp
     if npp < 5: 
         print("npp = {}, but minimal number of participants = 5.".format(npp))
         variables_are_fine = 0
+    # the designs are stored as int8 (see function shuffle_designs())
+    if nstimuli < 1 or nstimuli > 127 or nstimuli != int(nstimuli) or nstimuli > ntrials: 
+        print("nstimuli = {}; but nstimuli should be an integer within [1, 127] and <= ntrials.".format(nstimuli))
+        variables_are_fine = 0
+    if nactions < 2 or nactions > 127 or nactions != int(nactions): 
+        print("nactions = {}; but nactions should be an integer within [2, 127].".format(nactions))
+        variables_are_fine = 0
     if reward_probability < 0 or reward_probability > 1: 
         print("reward_probability = {}; but should be element of [0, 1].".format(reward_probability))
     if full_speed != 0 and full_speed != 1: 
@@ -630,6 +1603,71 @@ def check_input_parameters(ntrials, nreversals, npp, reward_probability, full_sp
     if nreps < 1 or nreps != int(nreps): 
         print("nreps = {}; but nreps should be of type integer and should be > 0".format(nreps))
         variables_are_fine = 0
+    if estimator not in ['Nelder-Mead', 'profile', 'L-BFGS-B']: 
+        print("estimator = {}, but should be Nelder-Mead, profile or L-BFGS-B".format(estimator))
+        variables_are_fine = 0
+    if initialisation != 'random' and initialisation != 'grid': 
+        print("initialisation = {}, but should be random or grid".format(initialisation))
+        variables_are_fine = 0
+    if scheduling != 'repetition' and scheduling != 'participant': 
+        print("scheduling = {}, but should be repetition or participant".format(scheduling))
+        variables_are_fine = 0
+    if seed is not None and (seed < 0 or seed != int(seed)): 
+        print("seed = {}, but should be an integer >= 0".format(seed))
+        variables_are_fine = 0
+    if checkpoint != 0 and checkpoint != 1: 
+        print("checkpoint = {}, but should be either 0 or 1".format(checkpoint))
+        variables_are_fine = 0
+    if precision is not None and (precision <= 0 or precision >= 0.5): 
+        print("precision = {}, but should be element of (0, 0.5)".format(precision))
+        variables_are_fine = 0
+    if target_power is not None and (target_power <= 0 or target_power >= 1): 
+        print("target_power = {}, but should be element of (0, 1)".format(target_power))
+        variables_are_fine = 0
+    if search != 'npp' and search != 'ntrials': 
+        print("search = {}, but should be npp or ntrials".format(search))
+        variables_are_fine = 0
+    if curve is not None: 
+        # a single number can be read as a float (e.g. 20.0) when the curve column has empty cells in other rows
+        try: curve_values = [float(value) for value in str(curve).split()]
+        except ValueError: curve_values = []
+        if len(curve_values) == 0 or not all(value.is_integer() and value >= 5 for value in curve_values): 
+            print("curve = {}, but should be numbers of participants >= 5 separated by spaces".format(curve))
+            variables_are_fine = 0
+    if design_randomisation not in ['fixed', 'repetition', 'participant']: 
+        print("design_randomisation = {}, but should be fixed, repetition or participant".format(design_randomisation))
+        variables_are_fine = 0
+    if instrument != 0 and instrument != 1:
+        print("instrument = {}, but should be either 0 or 1".format(instrument))
+        variables_are_fine = 0
+    if surrogate is not None: 
+        grid_values = str(surrogate).split('/')
+        try: 
+            grid_values = [np.array(values.split(), dtype = float) for values in grid_values]
+            grid_fine = len(grid_values) in [2, 3] and all(len(values) > 0 and np.all(values > 0) for values in grid_values)
+        except ValueError: grid_fine = False
+        if not grid_fine or (len(grid_values) == 3 and criterion != 'group_difference'): 
+            print("surrogate = {}, but should be npp values / ntrials values (/ cohens_d values for the group difference criterion), e.g. 10 20 40 / 100 200 400".format(surrogate))
+            variables_are_fine = 0
+    if dataset_store is not None and type(dataset_store) != str: 
+        print("dataset_store = {}, but should be a path".format(dataset_store))
+        variables_are_fine = 0
+    if queue_folder is not None and type(queue_folder) != str: 
+        print("queue_folder = {}, but should be a path".format(queue_folder))
+        variables_are_fine = 0
+    if dataset_store is not None and queue_folder is not None: 
+        # the workers on the other machines would write to the same memory-mapped files over the shared file system
+        print("dataset_store and queue_folder are both given, but a dataset store can only be used with the workers on this computer")
+        variables_are_fine = 0
+    if cache_folder is not None and type(cache_folder) != str: 
+        print("cache_folder = {}, but should be a path".format(cache_folder))
+        variables_are_fine = 0
+    if cache_size is not None and cache_size <= 0: 
+        print("cache_size = {}, but should be > 0 (MB)".format(cache_size))
+        variables_are_fine = 0
+    if cache_age is not None and cache_age <= 0: 
+        print("cache_age = {}, but should be > 0 (days)".format(cache_age))
+        variables_are_fine = 0
     if type(plot_folder) != str: 
         print("output_folder does not exist")
         variables_are_fine = 0
@@ -0,0 +1,724 @@
+# -*- coding: utf-8 -*-
+"""
+Kernels for the trial-loops of the RW model: data simulation, likelihood estimation and design creation.
+The model has nstimuli stimuli and nactions responses; the values of all stimulus-response pairs are kept in one preallocated
+(nstimuli X nactions) array per participant, parameter set or dataset. On each trial only the row of the stimulus that appears is used
+and updated, so the cost of a trial does not depend on the number of stimuli and only grows with the number of responses.
+
+Each kernel exists in two backends with exactly the same arguments and results:
+    'numpy': pure NumPy, always available. The trial-loop is vectorized over participants, parameter sets and datasets.
+    'numba': the same trial-loops written out element by element and compiled with numba.njit (only when numba is installed).
+The backend is selected with set_backend() or with the environment variable COMPASS_BACKEND ('auto', 'numpy' or 'numba').
+With 'auto' (the default) numba is used when it is installed; otherwise the numpy backend is used.
+"""
+import os
+import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#%% numpy backend
+
+def simulate_cohort_numpy(LRs, inverseTemps, stimuli, CorResp, FBcon, random_numbers, nstimuli, nactions):
+    """
+    Parameters
+    ----------
+    LRs : numpy array, shape = (npp,)
+        The learning rate of each participant.
+    inverseTemps : numpy array, shape = (npp,)
+        The inverse temperature of each participant.
+    stimuli : numpy array (integer), shape = (ntrials,)
+        The stimulus that appears on each trial.
+    CorResp : numpy array (integer), shape = (ntrials,)
+        The correct response on each trial.
+    FBcon : numpy array (integer), shape = (ntrials,)
+        The feedback congruence on each trial.
+    random_numbers : numpy array, shape = (npp, ntrials)
+        Random numbers within [0, 1[ used to choose the response of each participant on each trial.
+    nstimuli, nactions : integer
+        The number of stimuli and responses of the task.
+
+    Returns
+    -------
+    responses : numpy array (integer), shape = (npp, ntrials)
+        The simulated responses of each participant on each trial.
+
+    Description
+    -----------
+    Kernel of the function simulate_responses_cohort() in Functions.py; all participants are stepped through the design together.
+    Response a is chosen when the random number is smaller than or equal to the summed probability of responses a, ..., nactions - 1, 
+    but not to that of responses a + 1, ..., nactions - 1 (with 2 responses: response 1 when the random number <= the probability of response 1).
+    """
+    npp, ntrials = random_numbers.shape
+    responses = np.empty((npp, ntrials), dtype = np.int64)
+    values = np.full((npp, nstimuli, nactions), 0.5)
+    participants = np.arange(npp)
+    for trial in range(ntrials):
+        stimulus = stimuli[trial]
+        # softmax over the responses for each participant (same computation as the softmax function, vectorized over participants);
+        # the largest activation is subtracted before the exponential, so that large inverse temperatures do not overflow
+        activations = values[:, stimulus, :]*inverseTemps[:, np.newaxis]
+        exp_values = np.exp(activations - np.max(activations, axis = 1, keepdims = True))
+        response_probabilities = exp_values / np.sum(exp_values, axis = 1, keepdims = True)
+        # summed probability of responses a, ..., nactions - 1 for a = 1, ..., nactions - 1 (as in choose_response)
+        tail_probabilities = np.cumsum(response_probabilities[:, :0:-1], axis = 1)[:, ::-1]
+        response = np.sum(random_numbers[:, trial, np.newaxis] <= tail_probabilities, axis = 1)
+        responses[:, trial] = response
+        # reward is present when the accuracy of the response is in line with the feedback congruence
+        reward_present = ((response == CorResp[trial]) == FBcon[trial])*1.0
+        # delta-rule update of the stimulus-response pair that was used this trial by each participant
+        previous_values = values[participants, stimulus, response]
+        values[participants, stimulus, response] = previous_values + (reward_present - previous_values)*LRs
+    return responses
+
+def loglikelihood_numpy(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions):
+    """
+    Parameters
+    ----------
+    LRs : numpy array, shape = (nsets,)
+        The learning rate of each parameter set.
+    inverseTemps : numpy array, shape = (nsets,)
+        The inverse temperature of each parameter set.
+    stimuli : numpy array (integer), shape = (ndatasets, ntrials)
+        The stimulus that appeared on each trial of each dataset.
+    responses : numpy array (integer), shape = (ndatasets, ntrials)
+        The response given on each trial of each dataset.
+    rewards : numpy array, shape = (ndatasets, ntrials)
+        Whether reward was received on each trial of each dataset (0.0 or 1.0).
+    nstimuli, nactions : integer
+        The number of stimuli and responses of the task.
+
+    Returns
+    -------
+    summed_logL : numpy array, shape = (nsets, ndatasets)
+        The summed log likelihood of each dataset given each parameter set.
+
+    Description
+    -----------
+    Kernel of the functions likelihood() and likelihood_batch() in Functions.py; the trial-loop is vectorized over parameter sets and datasets.
+    The log-normaliser of the softmax is calculated with the numerically stable log-sum-exp, vectorized over the responses.
+    With a single parameter set and a single dataset there is nothing to vectorize over, then the element-wise loop (uncompiled) has less overhead.
+    """
+    nsets = LRs.shape[0]
+    ndatasets, ntrials = stimuli.shape
+    if nsets*ndatasets == 1: return loglikelihood_loops(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions)
+    values = np.full((nsets, ndatasets, nstimuli, nactions), 0.5)
+    summed_logL = np.zeros((nsets, ndatasets))
+    datasets_index = np.arange(ndatasets)
+    for trial in range(ntrials):
+        stimulus = stimuli[:, trial]
+        response = responses[:, trial]
+        # the values of all responses given the stimulus of this trial, shape (nsets, ndatasets, nactions)
+        stimulus_weights = values[:, datasets_index, stimulus, :]
+        activations = stimulus_weights*inverseTemps[:, np.newaxis, np.newaxis]
+        # log-sum-exp over the responses
+        max_activations = np.max(activations, axis = 2)
+        log_normaliser = max_activations + np.log(np.sum(np.exp(activations - max_activations[:, :, np.newaxis]), axis = 2))
+        summed_logL += activations[:, datasets_index, response] - log_normaliser
+        # delta-rule update of the stimulus-response pair that was used this trial
+        previous_values = stimulus_weights[:, datasets_index, response]
+        values[:, datasets_index, stimulus, response] = previous_values + (rewards[:, trial] - previous_values)*LRs[:, np.newaxis]
+    return summed_logL
+
+def loglikelihood_gradient_numpy(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions):
+    """
+    Parameters
+    ----------
+    LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions : 
+        Same as in loglikelihood_numpy().
+
+    Returns
+    -------
+    summed_logL : numpy array, shape = (nsets, ndatasets)
+        The summed log likelihood of each dataset given each parameter set.
+    LR_derivatives : numpy array, shape = (nsets, ndatasets)
+        The derivative of the summed log likelihood with respect to the learning rate.
+    inverseTemp_derivatives : numpy array, shape = (nsets, ndatasets)
+        The derivative of the summed log likelihood with respect to the inverse temperature.
+
+    Description
+    -----------
+    Kernel of the function likelihood_gradient() in Functions.py; the trial-loop is vectorized over parameter sets and datasets.
+    Next to each value Q its derivative dQ/dLR is tracked over trials (forward-mode sensitivity of the delta-rule): 
+        dQ(t+1)/dLR = (1 - LR) * dQ(t)/dLR + (reward - Q(t))
+    With a single parameter set and a single dataset the element-wise loop (uncompiled) has less overhead.
+    """
+    nsets = LRs.shape[0]
+    ndatasets, ntrials = stimuli.shape
+    if nsets*ndatasets == 1: return loglikelihood_gradient_loops(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions)
+    values = np.full((nsets, ndatasets, nstimuli, nactions), 0.5)
+    value_derivatives = np.zeros((nsets, ndatasets, nstimuli, nactions))
+    summed_logL, LR_derivatives, inverseTemp_derivatives = np.zeros((nsets, ndatasets)), np.zeros((nsets, ndatasets)), np.zeros((nsets, ndatasets))
+    datasets_index = np.arange(ndatasets)
+    for trial in range(ntrials):
+        stimulus = stimuli[:, trial]
+        response = responses[:, trial]
+        stimulus_weights = values[:, datasets_index, stimulus, :]
+        weight_derivatives = value_derivatives[:, datasets_index, stimulus, :]
+        activations = stimulus_weights*inverseTemps[:, np.newaxis, np.newaxis]
+        # softmax probabilities and log-normaliser with the log-sum-exp over the responses
+        max_activations = np.max(activations, axis = 2)
+        exp_activations = np.exp(activations - max_activations[:, :, np.newaxis])
+        exp_sums = np.sum(exp_activations, axis = 2)
+        probabilities = exp_activations / exp_sums[:, :, np.newaxis]
+        summed_logL += activations[:, datasets_index, response] - (max_activations + np.log(exp_sums))
+        inverseTemp_derivatives += stimulus_weights[:, datasets_index, response] - np.sum(probabilities*stimulus_weights, axis = 2)
+        LR_derivatives += inverseTemps[:, np.newaxis]*(weight_derivatives[:, datasets_index, response] - np.sum(probabilities*weight_derivatives, axis = 2))
+        # update the derivative (with the value before the update) and the value of the stimulus-response pair that was used
+        previous_values = stimulus_weights[:, datasets_index, response]
+        prediction_errors = rewards[:, trial] - previous_values
+        value_derivatives[:, datasets_index, stimulus, response] = (1 - LRs[:, np.newaxis])*weight_derivatives[:, datasets_index, response] + prediction_errors
+        values[:, datasets_index, stimulus, response] = previous_values + prediction_errors*LRs[:, np.newaxis]
+    return summed_logL, LR_derivatives, inverseTemp_derivatives
+
+def profile_loglikelihood_numpy(LRs, stimuli, responses, rewards, nstimuli, nactions, lower_bound, upper_bound, tolerance, max_iterations):
+    """
+    Parameters
+    ----------
+    LRs : numpy array, shape = (nLRs,)
+        The learning rates for which the inverse temperature is profiled out.
+    stimuli, responses : numpy array (integer), shape = (ntrials,)
+        The stimulus that appeared and the response given on each trial of one dataset.
+    rewards : numpy array, shape = (ntrials,)
+        Whether reward was received on each trial (0.0 or 1.0).
+    nstimuli, nactions : integer
+        The number of stimuli and responses of the task.
+    lower_bound, upper_bound : float
+        Bounds of the inverse temperature.
+    tolerance : float
+        Relative change of the inverse temperature at which the Newton search stops.
+    max_iterations : integer
+        Maximal number of Newton iterations.
+
+    Returns
+    -------
+    inverseTemps : numpy array, shape = (nLRs,)
+        The inverse temperature with the highest likelihood for each learning rate.
+    summed_logL : numpy array, shape = (nLRs,)
+        The summed log likelihood at these inverse temperatures (the profile log likelihood of each learning rate).
+
+    Description
+    -----------
+    Kernel of the function profile_likelihood() in Functions.py. The value trajectory of each learning rate is calculated once; 
+    with the values fixed the log likelihood is concave in the inverse temperature, and its optimum is found with Newton's method 
+    inside a bracket that always contains the optimum (the geometric midpoint of the bracket when a Newton step leaves it). 
+    The trial-loop and the Newton search are vectorized over the learning rates.
+    """
+    nLRs, ntrials = LRs.shape[0], stimuli.shape[0]
+    values = np.full((nLRs, nstimuli, nactions), 0.5)
+    stimulus_weights = np.empty((nLRs, ntrials, nactions))
+    for trial in range(ntrials):
+        stimulus, response = stimuli[trial], responses[trial]
+        stimulus_weights[:, trial, :] = values[:, stimulus, :]
+        values[:, stimulus, response] = values[:, stimulus, response] + (rewards[trial] - values[:, stimulus, response])*LRs
+    chosen_weights = stimulus_weights[:, np.arange(ntrials), responses]
+
+    def derivatives(inverseTemps):
+        activations = stimulus_weights*inverseTemps[:, np.newaxis, np.newaxis]
+        probabilities = np.exp(activations - np.max(activations, axis = 2, keepdims = True))
+        probabilities = probabilities / np.sum(probabilities, axis = 2, keepdims = True)
+        expected_weights = np.sum(probabilities*stimulus_weights, axis = 2)
+        weights_variance = np.sum(probabilities*stimulus_weights**2, axis = 2) - expected_weights**2
+        return np.sum(chosen_weights - expected_weights, axis = 1), -np.sum(weights_variance, axis = 1)
+
+    lower, upper = np.full(nLRs, float(lower_bound)), np.full(nLRs, float(upper_bound))
+    gradient, hessian = derivatives(lower)
+    gradient_upper, _ = derivatives(upper)
+    # the optimum lies at a bound when the gradient does not change sign within the bounds
+    at_lower = gradient <= 0
+    at_upper = ~at_lower & (gradient_upper >= 0)
+    # the search starts at the lower bound, where the derivatives are already known
+    inverseTemps = np.where(at_upper, upper, lower)
+    searching = ~(at_lower | at_upper)
+    for iteration in range(max_iterations):
+        if not np.any(searching): break
+        # shrink the bracket: the optimum lies right of points with a positive gradient
+        lower = np.where(searching & (gradient > 0), inverseTemps, lower)
+        upper = np.where(searching & (gradient < 0), inverseTemps, upper)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            newton_step = inverseTemps - gradient / hessian
+        inside_bracket = (newton_step > lower) & (newton_step < upper) & (hessian < 0)
+        new_inverseTemps = np.where(inside_bracket, newton_step, np.sqrt(lower*upper))
+        converged = (np.abs(new_inverseTemps - inverseTemps) <= tolerance*inverseTemps) | (gradient == 0)
+        inverseTemps = np.where(searching, new_inverseTemps, inverseTemps)
+        searching = searching & ~converged
+        if np.any(searching): gradient, hessian = derivatives(inverseTemps)
+
+    activations = stimulus_weights*inverseTemps[:, np.newaxis, np.newaxis]
+    max_activations = np.max(activations, axis = 2)
+    log_normaliser = max_activations + np.log(np.sum(np.exp(activations - max_activations[:, :, np.newaxis]), axis = 2))
+    return inverseTemps, np.sum(chosen_weights*inverseTemps[:, np.newaxis] - log_normaliser, axis = 1)
+
+def grid_loglikelihood_numpy(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions):
+    """
+    Parameters
+    ----------
+    LRs : numpy array, shape = (nLRs,)
+        The learning rates of the grid.
+    inverseTemps : numpy array, shape = (ninverseTemps,)
+        The inverse temperatures of the grid.
+    stimuli, responses : numpy array (integer), shape = (ntrials,)
+        The stimulus that appeared and the response given on each trial of one dataset.
+    rewards : numpy array, shape = (ntrials,)
+        Whether reward was received on each trial (0.0 or 1.0).
+    nstimuli, nactions : integer
+        The number of stimuli and responses of the task.
+
+    Returns
+    -------
+    summed_logL : numpy array, shape = (nLRs, ninverseTemps)
+        The summed log likelihood of the dataset for each combination of a learning rate and an inverse temperature.
+
+    Description
+    -----------
+    Kernel of the function grid_initialisation() in Functions.py. The values do not depend on the inverse temperature, 
+    so the value trajectory of each learning rate is calculated once and used for all inverse temperatures. 
+    The trial-loop is vectorized over the learning rates, the likelihood of the trajectories over the learning rates and trials.
+    """
+    nLRs, ntrials = LRs.shape[0], stimuli.shape[0]
+    values = np.full((nLRs, nstimuli, nactions), 0.5)
+    stimulus_weights = np.empty((nLRs, ntrials, nactions))
+    for trial in range(ntrials):
+        stimulus, response = stimuli[trial], responses[trial]
+        stimulus_weights[:, trial, :] = values[:, stimulus, :]
+        values[:, stimulus, response] = values[:, stimulus, response] + (rewards[trial] - values[:, stimulus, response])*LRs
+    chosen_weights = stimulus_weights[:, np.arange(ntrials), responses]
+    summed_logL = np.empty((nLRs, inverseTemps.shape[0]))
+    for index, inverseTemp in enumerate(inverseTemps):
+        activations = stimulus_weights*inverseTemp
+        max_activations = np.max(activations, axis = 2)
+        log_normaliser = max_activations + np.log(np.sum(np.exp(activations - max_activations[:, :, np.newaxis]), axis = 2))
+        summed_logL[:, index] = np.sum(chosen_weights*inverseTemp - log_normaliser, axis = 1)
+    return summed_logL
+
+def correct_responses_numpy(rules, stimuli, nactions):
+    """
+    Parameters
+    ----------
+    rules : numpy array (integer), shape = (ntrials,)
+        The stimulus-response mapping rule on each trial.
+    stimuli : numpy array (integer), shape = (ntrials,)
+        The stimulus that appears on each trial.
+    nactions : integer
+        The number of responses of the task.
+
+    Returns
+    -------
+    CorResp : numpy array (integer), shape = (ntrials,)
+        The correct response on each trial: (stimulus + 1 - rule) modulo nactions, each rule thus shifts the stimulus-response mapping by one response.
+        With 2 stimuli and 2 responses: rule 1 = stimulus0-response0 & stimulus1-response1, rule 0 = stimulus0-response1 & stimulus1-response0.
+
+    Description
+    -----------
+    Kernel of the function create_design() in Functions.py.
+    """
+    return ((stimuli + 1 - rules + nactions) % nactions).astype(np.int64)
+
+#%% numba backend: the same kernels with the loops written out element by element
+
+def simulate_cohort_loops(LRs, inverseTemps, stimuli, CorResp, FBcon, random_numbers, nstimuli, nactions):
+    npp, ntrials = random_numbers.shape
+    responses = np.empty((npp, ntrials), dtype = np.int64)
+    # state of one participant, reused for all participants
+    values = np.empty((nstimuli, nactions))
+    response_probabilities = np.empty(nactions)
+    for pp in range(npp):
+        values[:, :] = 0.5
+        LR, inverseTemp = LRs[pp], inverseTemps[pp]
+        for trial in range(ntrials):
+            stimulus = stimuli[trial]
+            if nactions == 2:
+                # 2 responses: the same rule written out with scalars, which is faster
+                activation0 = values[stimulus, 0]*inverseTemp
+                activation1 = values[stimulus, 1]*inverseTemp
+                max_activation = max(activation0, activation1)
+                exp_value0 = np.exp(activation0 - max_activation)
+                exp_value1 = np.exp(activation1 - max_activation)
+                response = 1 if random_numbers[pp, trial] <= exp_value1 / (exp_value0 + exp_value1) else 0
+            else:
+                max_activation = values[stimulus, 0]*inverseTemp
+                for action in range(1, nactions):
+                    max_activation = max(max_activation, values[stimulus, action]*inverseTemp)
+                exp_sum = 0.0
+                for action in range(nactions):
+                    response_probabilities[action] = np.exp(values[stimulus, action]*inverseTemp - max_activation)
+                    exp_sum += response_probabilities[action]
+                response, tail_probability = 0, 0.0
+                for action in range(nactions - 1, 0, -1):
+                    tail_probability += response_probabilities[action] / exp_sum
+                    if random_numbers[pp, trial] <= tail_probability:
+                        response = action
+                        break
+            responses[pp, trial] = response
+            reward_present = 1.0 if (response == CorResp[trial]) == (FBcon[trial] == 1) else 0.0
+            previous_value = values[stimulus, response]
+            values[stimulus, response] = previous_value + (reward_present - previous_value)*LR
+    return responses
+
+def loglikelihood_loops(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions):
+    nsets = LRs.shape[0]
+    ndatasets, ntrials = stimuli.shape
+    summed_logL = np.zeros((nsets, ndatasets))
+    # state of one parameter set and dataset, reused for all of them
+    values = np.empty((nstimuli, nactions))
+    activations = np.empty(nactions)
+    for parameter_set in range(nsets):
+        LR, inverseTemp = LRs[parameter_set], inverseTemps[parameter_set]
+        for dataset in range(ndatasets):
+            values[:, :] = 0.5
+            logL = 0.0
+            for trial in range(ntrials):
+                stimulus, response = stimuli[dataset, trial], responses[dataset, trial]
+                if nactions == 2:
+                    # 2 responses: the same log-sum-exp written out with scalars, which is faster
+                    activation0 = values[stimulus, 0]*inverseTemp
+                    activation1 = values[stimulus, 1]*inverseTemp
+                    max_activation = max(activation0, activation1)
+                    log_normaliser = max_activation + np.log(np.exp(activation0 - max_activation) + np.exp(activation1 - max_activation))
+                    logL += (activation1 if response == 1 else activation0) - log_normaliser
+                else:
+                    for action in range(nactions):
+                        activations[action] = values[stimulus, action]*inverseTemp
+                    max_activation = activations[0]
+                    for action in range(1, nactions):
+                        max_activation = max(max_activation, activations[action])
+                    exp_sum = 0.0
+                    for action in range(nactions):
+                        exp_sum += np.exp(activations[action] - max_activation)
+                    logL += activations[response] - (max_activation + np.log(exp_sum))
+                previous_value = values[stimulus, response]
+                values[stimulus, response] = previous_value + (rewards[dataset, trial] - previous_value)*LR
+            summed_logL[parameter_set, dataset] = logL
+    return summed_logL
+
+def loglikelihood_gradient_loops(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions):
+    nsets = LRs.shape[0]
+    ndatasets, ntrials = stimuli.shape
+    summed_logL, LR_derivatives, inverseTemp_derivatives = np.zeros((nsets, ndatasets)), np.zeros((nsets, ndatasets)), np.zeros((nsets, ndatasets))
+    # state of one parameter set and dataset, reused for all of them
+    values = np.empty((nstimuli, nactions))
+    value_derivatives = np.empty((nstimuli, nactions))
+    exp_activations = np.empty(nactions)
+    for parameter_set in range(nsets):
+        LR, inverseTemp = LRs[parameter_set], inverseTemps[parameter_set]
+        for dataset in range(ndatasets):
+            values[:, :] = 0.5
+            value_derivatives[:, :] = 0.0
+            logL, LR_derivative, inverseTemp_derivative = 0.0, 0.0, 0.0
+            for trial in range(ntrials):
+                stimulus, response = stimuli[dataset, trial], responses[dataset, trial]
+                if nactions == 2:
+                    # 2 responses: probability of response 1 from the difference of both activations, one exponential per trial
+                    activation_difference = (values[stimulus, 1] - values[stimulus, 0])*inverseTemp
+                    exp_difference = np.exp(-abs(activation_difference))
+                    if activation_difference >= 0:
+                        probability1 = 1.0 / (1.0 + exp_difference)
+                        log_normaliser = values[stimulus, 1]*inverseTemp + np.log1p(exp_difference)
+                    else:
+                        probability1 = exp_difference / (1.0 + exp_difference)
+                        log_normaliser = values[stimulus, 0]*inverseTemp + np.log1p(exp_difference)
+                    expected_weight = values[stimulus, 0] + probability1*(values[stimulus, 1] - values[stimulus, 0])
+                    expected_derivative = value_derivatives[stimulus, 0] + probability1*(value_derivatives[stimulus, 1] - value_derivatives[stimulus, 0])
+                else:
+                    max_activation = values[stimulus, 0]*inverseTemp
+                    for action in range(1, nactions):
+                        max_activation = max(max_activation, values[stimulus, action]*inverseTemp)
+                    exp_sum = 0.0
+                    for action in range(nactions):
+                        exp_activations[action] = np.exp(values[stimulus, action]*inverseTemp - max_activation)
+                        exp_sum += exp_activations[action]
+                    log_normaliser = max_activation + np.log(exp_sum)
+                    expected_weight, expected_derivative = 0.0, 0.0
+                    for action in range(nactions):
+                        expected_weight += exp_activations[action]*values[stimulus, action] / exp_sum
+                        expected_derivative += exp_activations[action]*value_derivatives[stimulus, action] / exp_sum
+                logL += values[stimulus, response]*inverseTemp - log_normaliser
+                inverseTemp_derivative += values[stimulus, response] - expected_weight
+                LR_derivative += inverseTemp*(value_derivatives[stimulus, response] - expected_derivative)
+                # update the derivative (with the value before the update) and the value of the stimulus-response pair that was used
+                prediction_error = rewards[dataset, trial] - values[stimulus, response]
+                value_derivatives[stimulus, response] = (1 - LR)*value_derivatives[stimulus, response] + prediction_error
+                values[stimulus, response] = values[stimulus, response] + prediction_error*LR
+            summed_logL[parameter_set, dataset] = logL
+            LR_derivatives[parameter_set, dataset] = LR_derivative
+            inverseTemp_derivatives[parameter_set, dataset] = inverseTemp_derivative
+    return summed_logL, LR_derivatives, inverseTemp_derivatives
+
+def profile_derivatives_loops(inverseTemp, stimulus_weights, responses):
+    """First and second derivative of the summed log likelihood to the inverse temperature for one value trajectory (see profile_loglikelihood_loops())."""
+    ntrials, nactions = stimulus_weights.shape
+    gradient, hessian = 0.0, 0.0
+    for trial in range(ntrials):
+        if nactions == 2:
+            # 2 responses: only the value difference matters, one exponential per trial
+            difference = stimulus_weights[trial, 1] - stimulus_weights[trial, 0]
+            if difference == 0: continue
+            probability1 = 1.0 / (1.0 + np.exp(-difference*inverseTemp))
+            gradient += (difference if responses[trial] == 1 else 0.0) - probability1*difference
+            hessian -= probability1*(1.0 - probability1)*difference**2
+        else:
+            max_activation = stimulus_weights[trial, 0]*inverseTemp
+            for action in range(1, nactions):
+                max_activation = max(max_activation, stimulus_weights[trial, action]*inverseTemp)
+            exp_sum, expected_weight, expected_square = 0.0, 0.0, 0.0
+            for action in range(nactions):
+                exp_activation = np.exp(stimulus_weights[trial, action]*inverseTemp - max_activation)
+                exp_sum += exp_activation
+                expected_weight += exp_activation*stimulus_weights[trial, action]
+                expected_square += exp_activation*stimulus_weights[trial, action]**2
+            expected_weight, expected_square = expected_weight / exp_sum, expected_square / exp_sum
+            gradient += stimulus_weights[trial, responses[trial]] - expected_weight
+            hessian -= expected_square - expected_weight**2
+    return gradient, hessian
+
+def profile_loglikelihood_loops(LRs, stimuli, responses, rewards, nstimuli, nactions, lower_bound, upper_bound, tolerance, max_iterations):
+    nLRs, ntrials = LRs.shape[0], stimuli.shape[0]
+    inverseTemps, summed_logL = np.empty(nLRs), np.empty(nLRs)
+    # state of one learning rate, reused for all of them
+    values = np.empty((nstimuli, nactions))
+    stimulus_weights = np.empty((ntrials, nactions))
+    for index in range(nLRs):
+        values[:, :] = 0.5
+        for trial in range(ntrials):
+            stimulus, response = stimuli[trial], responses[trial]
+            for action in range(nactions):
+                stimulus_weights[trial, action] = values[stimulus, action]
+            values[stimulus, response] = values[stimulus, response] + (rewards[trial] - values[stimulus, response])*LRs[index]
+        lower, upper = lower_bound, upper_bound
+        gradient, hessian = profile_derivatives_loops(lower, stimulus_weights, responses)
+        if gradient <= 0: inverseTemp = lower
+        elif profile_derivatives_loops(upper, stimulus_weights, responses)[0] >= 0: inverseTemp = upper
+        else:
+            # the search starts at the lower bound, where the derivatives are already known
+            inverseTemp = lower
+            for iteration in range(max_iterations):
+                if gradient > 0: lower = inverseTemp
+                if gradient < 0: upper = inverseTemp
+                new_inverseTemp = np.sqrt(lower*upper)
+                if hessian < 0:
+                    newton_step = inverseTemp - gradient / hessian
+                    if newton_step > lower and newton_step < upper: new_inverseTemp = newton_step
+                converged = abs(new_inverseTemp - inverseTemp) <= tolerance*inverseTemp or gradient == 0
+                inverseTemp = new_inverseTemp
+                if converged: break
+                gradient, hessian = profile_derivatives_loops(inverseTemp, stimulus_weights, responses)
+        inverseTemps[index] = inverseTemp
+        logL = 0.0
+        for trial in range(ntrials):
+            max_activation = stimulus_weights[trial, 0]*inverseTemp
+            for action in range(1, nactions):
+                max_activation = max(max_activation, stimulus_weights[trial, action]*inverseTemp)
+            exp_sum = 0.0
+            for action in range(nactions):
+                exp_sum += np.exp(stimulus_weights[trial, action]*inverseTemp - max_activation)
+            logL += stimulus_weights[trial, responses[trial]]*inverseTemp - (max_activation + np.log(exp_sum))
+        summed_logL[index] = logL
+    return inverseTemps, summed_logL
+
+def grid_loglikelihood_loops(LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions):
+    nLRs, ntrials = LRs.shape[0], stimuli.shape[0]
+    summed_logL = np.empty((nLRs, inverseTemps.shape[0]))
+    # state of one learning rate, reused for all of them
+    values = np.empty((nstimuli, nactions))
+    stimulus_weights = np.empty((ntrials, nactions))
+    advantages = np.empty(ntrials)
+    for LR_index in range(nLRs):
+        values[:, :] = 0.5
+        for trial in range(ntrials):
+            stimulus, response = stimuli[trial], responses[trial]
+            for action in range(nactions):
+                stimulus_weights[trial, action] = values[stimulus, action]
+            values[stimulus, response] = values[stimulus, response] + (rewards[trial] - values[stimulus, response])*LRs[LR_index]
+        if nactions == 2:
+            # 2 responses: log(P(response)) = -log(1 + exp(-inverseTemp * advantage)), with the advantage of the chosen over the other response;
+            # trials without advantage contribute log(0.5) for any inverse temperature
+            nadvantages, nequal = 0, 0
+            for trial in range(ntrials):
+                advantage = stimulus_weights[trial, responses[trial]] - stimulus_weights[trial, 1 - responses[trial]]
+                if advantage == 0: nequal += 1
+                else:
+                    advantages[nadvantages] = advantage
+                    nadvantages += 1
+            for inverseTemp_index in range(inverseTemps.shape[0]):
+                logL = -nequal*np.log(2.0)
+                for trial in range(nadvantages):
+                    activation_advantage = advantages[trial]*inverseTemps[inverseTemp_index]
+                    if activation_advantage >= 0: logL -= np.log1p(np.exp(-activation_advantage))
+                    else: logL += activation_advantage - np.log1p(np.exp(activation_advantage))
+                summed_logL[LR_index, inverseTemp_index] = logL
+        else:
+            for inverseTemp_index in range(inverseTemps.shape[0]):
+                inverseTemp = inverseTemps[inverseTemp_index]
+                logL = 0.0
+                for trial in range(ntrials):
+                    max_activation = stimulus_weights[trial, 0]*inverseTemp
+                    for action in range(1, nactions):
+                        max_activation = max(max_activation, stimulus_weights[trial, action]*inverseTemp)
+                    exp_sum = 0.0
+                    for action in range(nactions):
+                        exp_sum += np.exp(stimulus_weights[trial, action]*inverseTemp - max_activation)
+                    logL += stimulus_weights[trial, responses[trial]]*inverseTemp - (max_activation + np.log(exp_sum))
+                summed_logL[LR_index, inverseTemp_index] = logL
+    return summed_logL
+
+def correct_responses_loops(rules, stimuli, nactions):
+    CorResp = np.empty(stimuli.shape[0], dtype = np.int64)
+    for trial in range(stimuli.shape[0]):
+        CorResp[trial] = (stimuli[trial] + 1 - rules[trial] + nactions) % nactions
+    return CorResp
+
+#%% backend selection
+
+backends = {'numpy': {'simulate_cohort': simulate_cohort_numpy, 'loglikelihood': loglikelihood_numpy,
+                      'loglikelihood_gradient': loglikelihood_gradient_numpy, 'profile_loglikelihood': profile_loglikelihood_numpy, 
+                      'grid_loglikelihood': grid_loglikelihood_numpy, 'correct_responses': correct_responses_numpy}}
+if numba is not None:
+    # the helper is compiled first, so the profile kernel calls the compiled version
+    profile_derivatives_loops = numba.njit(cache = True)(profile_derivatives_loops)
+    backends['numba'] = {'simulate_cohort': numba.njit(cache = True)(simulate_cohort_loops),
+                         'loglikelihood': numba.njit(cache = True)(loglikelihood_loops),
+                         'loglikelihood_gradient': numba.njit(cache = True)(loglikelihood_gradient_loops),
+                         'profile_loglikelihood': numba.njit(cache = True)(profile_loglikelihood_loops),
+                         'grid_loglikelihood': numba.njit(cache = True)(grid_loglikelihood_loops),
+                         'correct_responses': numba.njit(cache = True)(correct_responses_loops)}
+active_backend = {'name': None, 'kernels': None}
+
+def set_backend(backend = 'auto'):
+    """
+    Parameters
+    ----------
+    backend : string, optional
+        'auto', 'numpy' or 'numba'. With 'auto' numba is used when it is installed. The default is 'auto'.
+
+    Returns
+    -------
+    name : string
+        The backend that is used from now on.
+
+    Description
+    -----------
+    Function to select the backend of the kernels. When numba is requested but not installed, the numpy backend is used.
+    The choice is also stored in the environment variable COMPASS_BACKEND, so that worker processes use the same backend.
+    """
+    if backend == 'auto': backend = 'numba' if 'numba' in backends else 'numpy'
+    if backend not in backends:
+        if backend == 'numba': print("backend = numba, but numba is not installed; the numpy backend is used.")
+        else: print("backend = {}, but should be auto, numpy or numba; the numpy backend is used.".format(backend))
+        backend = 'numpy'
+    active_backend['name'], active_backend['kernels'] = backend, backends[backend]
+    os.environ['COMPASS_BACKEND'] = backend
+    return backend
+
+def get_backend():
+    """Returns the name of the backend that is currently used."""
+    return active_backend['name']
+
+def simulate_cohort(LRs, inverseTemps, stimuli, CorResp, FBcon, random_numbers, nstimuli = 2, nactions = 2):
+    """Simulate the responses of a cohort with the active backend; see simulate_cohort_numpy()."""
+    return active_backend['kernels']['simulate_cohort'](LRs, inverseTemps, stimuli, CorResp, FBcon, random_numbers, nstimuli, nactions)
+
+def loglikelihood(LRs, inverseTemps, stimuli, responses, rewards, nstimuli = 2, nactions = 2):
+    """Summed log likelihood of each dataset given each parameter set with the active backend; see loglikelihood_numpy()."""
+    return active_backend['kernels']['loglikelihood'](LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions)
+
+def loglikelihood_gradient(LRs, inverseTemps, stimuli, responses, rewards, nstimuli = 2, nactions = 2):
+    """Summed log likelihood and its derivatives to the learning rate and the inverse temperature with the active backend; see loglikelihood_gradient_numpy()."""
+    return active_backend['kernels']['loglikelihood_gradient'](LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions)
+
+def profile_loglikelihood(LRs, stimuli, responses, rewards, nstimuli = 2, nactions = 2, lower_bound = 0.1, upper_bound = 1000.0, 
+                          tolerance = 1e-8, max_iterations = 100):
+    """Best inverse temperature and profile log likelihood of each learning rate with the active backend; see profile_loglikelihood_numpy()."""
+    return active_backend['kernels']['profile_loglikelihood'](LRs, stimuli, responses, rewards, nstimuli, nactions, float(lower_bound), 
+                                                              float(upper_bound), float(tolerance), int(max_iterations))
+
+def grid_loglikelihood(LRs, inverseTemps, stimuli, responses, rewards, nstimuli = 2, nactions = 2):
+    """Summed log likelihood of one dataset for each combination of a learning rate and an inverse temperature with the active backend; see grid_loglikelihood_numpy()."""
+    return active_backend['kernels']['grid_loglikelihood'](LRs, inverseTemps, stimuli, responses, rewards, nstimuli, nactions)
+
+def correct_responses(rules, stimuli, nactions = 2):
+    """Correct response on each trial with the active backend; see correct_responses_numpy()."""
+    return active_backend['kernels']['correct_responses'](rules, stimuli, nactions)
+
+set_backend(os.environ.get('COMPASS_BACKEND', 'auto'))
+
+#%% consistency check of the backends
+
+def check_backends(seed = 0, npp = 10, ntrials = 300, nsets = 7, rtol = 1e-10, tasks = ((2, 2), (4, 3))):
+    """
+    Parameters
+    ----------
+    seed : integer, optional
+        Seed used to create the inputs of the kernels. The default is 0.
+    npp : integer, optional
+        Number of participants (and datasets) used in the check. The default is 10.
+    ntrials : integer, optional
+        Number of trials used in the check. The default is 300.
+    nsets : integer, optional
+        Number of parameter sets used in the likelihood check. The default is 7.
+    rtol : float, optional
+        Relative tolerance for the log likelihoods. The default is 1e-10.
+    tasks : tuple of (nstimuli, nactions), optional
+        The tasks for which the kernels are checked. The default is ((2, 2), (4, 3)).
+
+    Returns
+    -------
+    backends_agree : bool
+        True when each available backend gives the same results as the numpy backend.
+
+    Description
+    -----------
+    Function to check that all available backends give the same results for the same inputs:
+    the simulated responses and the correct responses should be identical, the log likelihoods and their derivatives equal up to rtol 
+    (the best inverse temperatures of the profile likelihood up to the tolerance of its Newton search).
+    Large inverse temperatures are included to check the log-sum-exp of the likelihoods and the softmax of the simulation.
+    """
+    backends_agree = True
+    for nstimuli, nactions in tasks:
+        rng = np.random.RandomState(seed)
+        rules = np.repeat(np.arange(3) % nactions, ntrials // 3 + 1)[:ntrials].astype(np.int64)
+        stimuli = rng.randint(0, nstimuli, ntrials).astype(np.int64)
+        FBcon = (rng.random_sample(ntrials) < 0.8).astype(np.int64)
+        LRs, inverseTemps = rng.uniform(0.01, 1, npp), np.concatenate([rng.uniform(0.1, 10, npp - 1), [900.0]])
+        random_numbers = rng.random_sample((npp, ntrials))
+        set_LRs, set_inverseTemps = rng.uniform(0, 2, nsets), np.concatenate([rng.uniform(0.1, 10, nsets - 1), [1000.0]])
+
+        reference = backends['numpy']
+        CorResp = reference['correct_responses'](rules, stimuli, nactions)
+        # an overflow in the softmax raises an error here instead of silently giving nan probabilities
+        with np.errstate(over = 'raise', invalid = 'raise'):
+            responses = reference['simulate_cohort'](LRs, inverseTemps, stimuli, CorResp, FBcon, random_numbers, nstimuli, nactions)
+        rewards = ((responses == CorResp) == FBcon)*1.0
+        stacked_stimuli = np.tile(stimuli, (npp, 1))
+        logL = reference['loglikelihood'](set_LRs, set_inverseTemps, stacked_stimuli, responses, rewards, nstimuli, nactions)
+        gradient = reference['loglikelihood_gradient'](set_LRs, set_inverseTemps, stacked_stimuli, responses, rewards, nstimuli, nactions)
+        profile_arguments = (set_LRs, stimuli, responses[0], rewards[0], nstimuli, nactions, 0.1, 1000.0, 1e-8, 100)
+        profile_inverseTemps, profile_logL = reference['profile_loglikelihood'](*profile_arguments)
+        grid_arguments = (set_LRs, set_inverseTemps, stimuli, responses[0], rewards[0], nstimuli, nactions)
+        grid_logL = reference['grid_loglikelihood'](*grid_arguments)
+
+        for name, kernels in backends.items():
+            if name == 'numpy': continue
+            checks = {'correct_responses': np.array_equal(kernels['correct_responses'](rules, stimuli, nactions), CorResp),
+                      'simulate_cohort': np.array_equal(kernels['simulate_cohort'](LRs, inverseTemps, stimuli, CorResp, FBcon, random_numbers, 
+                                                                                   nstimuli, nactions), responses),
+                      'loglikelihood': np.allclose(kernels['loglikelihood'](set_LRs, set_inverseTemps, stacked_stimuli, responses, rewards, 
+                                                                            nstimuli, nactions), logL, rtol = rtol, atol = 0)}
+            # the derivatives are sums of terms with both signs, so they are compared with a small absolute tolerance as well
+            kernel_gradient = kernels['loglikelihood_gradient'](set_LRs, set_inverseTemps, stacked_stimuli, responses, rewards, nstimuli, nactions)
+            checks['loglikelihood_gradient'] = all(np.allclose(kernel_output, output, rtol = rtol, atol = 1e-8) 
+                                                   for kernel_output, output in zip(kernel_gradient, gradient))
+            # the Newton search stops within a relative tolerance of 1e-8, so the inverse temperatures can differ by that much
+            kernel_inverseTemps, kernel_logL = kernels['profile_loglikelihood'](*profile_arguments)
+            checks['profile_loglikelihood'] = (np.allclose(kernel_inverseTemps, profile_inverseTemps, rtol = 1e-6, atol = 0) 
+                                               and np.allclose(kernel_logL, profile_logL, rtol = rtol, atol = 0))
+            checks['grid_loglikelihood'] = np.allclose(kernels['grid_loglikelihood'](*grid_arguments), grid_logL, rtol = rtol, atol = 0)
+            for kernel, agrees in checks.items():
+                print("{} backend, {} ({} stimuli, {} responses): {}".format(name, kernel, nstimuli, nactions, 
+                                                                            'ok' if agrees else 'DIFFERENT from numpy backend'))
+                backends_agree = backends_agree and agrees
+    return backends_agree
+
+if __name__ == '__main__':
+    print("Available backends: {}; active backend: {}".format(list(backends.keys()), get_backend()))
+    check_backends()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Plots of the power analyses, made from the results that PowerAnalysis.py saves for each row of the Input_file
+(Row_line{row}.json with the settings and power estimate of the row, and the csv files with the results).
+The plots can thus be made after the power analysis, on another computer, or in a background process while the next rows are computed:
+    python Plotting.py <output_folder>                 plots of all rows in the output folder
+    python Plotting.py <output_folder> --rows 0 2      plots of rows 0 and 2
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+# no display is needed: the plots are only saved to files
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+def read_row(output_folder, row):
+    """Function to read the settings and power estimate of a row, saved by function save_row() in PowerAnalysis.py."""
+    with open(os.path.join(output_folder, 'Row_line{}.json'.format(row))) as file: return json.load(file)
+
+def plot_row(output_folder, row):
+    """
+    Parameters
+    ----------
+    output_folder : string
+        The output folder of the row (column output_folder of the Input_file).
+    row : integer
+        The row of the Input_file.
+
+    Returns
+    -------
+    plot_file : string
+        The saved plot: Distributionplot_line{row}.jpg, Powercurveplot_line{row}.jpg, Samplesizeplot_line{row}.jpg or Powersurfaceplot_line{row}.jpg,
+        depending on the mode of the row.
+    """
+    s = read_row(output_folder, row)
+    criterion, significance_cutoff = s['criterion'], s['significance_cutoff']
+    if s['mode'] == 'curve':
+        curve_output = pd.read_csv(os.path.join(output_folder, 'Powercurve_line{}.csv'.format(row)), sep = ';')
+        fig, axes = plt.subplots(nrows = 1, ncols = 1)
+        axes.plot(curve_output['npp'], curve_output['power'], 'o-', color = 'k')
+        axes.set_xlabel('npp')
+        axes.set_ylabel('power')
+        axes.set_ylim(0, 1)
+        fig.suptitle("Power curve ({}, {} trials)".format(criterion, s['ntrials']), fontweight = 'bold')
+        fig.tight_layout()
+        plot_file = 'Powercurveplot_line{}.jpg'.format(row)
+    elif s['mode'] == 'surrogate':
+        surface = pd.read_csv(os.path.join(output_folder, 'Powersurface_line{}.csv'.format(row)), sep = ';')
+        target_power = s['target_power']
+        # one panel for each effect size
+        cohens_d_values = np.unique(surface['cohens_d']) if 'cohens_d' in surface.columns else [None]
+        fig, axes = plt.subplots(nrows = 1, ncols = len(cohens_d_values), figsize = (1 + 5 * len(cohens_d_values), 4), squeeze = False,
+                                 layout = 'constrained')
+        for panel, cohens_d in zip(axes[0], cohens_d_values):
+            panel_surface = surface if cohens_d is None else surface.loc[surface['cohens_d'] == cohens_d]
+            power_grid = panel_surface.pivot(index = 'ntrials', columns = 'npp', values = 'power')
+            contours = panel.contourf(power_grid.columns, power_grid.index, power_grid.values, levels = np.linspace(0, 1, 11), cmap = 'viridis')
+            if power_grid.values.min() < target_power < power_grid.values.max():
+                panel.contour(power_grid.columns, power_grid.index, power_grid.values, levels = [target_power], colors = 'r', linestyles = 'dashed')
+            simulated = panel_surface.loc[panel_surface['nreps_used'] > 0]
+            panel.plot(simulated['npp'], simulated['ntrials'], 'o', color = 'w', markeredgecolor = 'k', label = 'simulated', clip_on = False)
+            panel.set_xscale('log')
+            panel.set_yscale('log')
+            # the values of the grid as ticks
+            panel.set_xticks(power_grid.columns, labels = power_grid.columns)
+            panel.set_yticks(power_grid.index, labels = power_grid.index)
+            panel.minorticks_off()
+            panel.set_xlabel('npp')
+            panel.set_ylabel('ntrials')
+            if cohens_d is not None: panel.set_title("cohens_d = {}".format(cohens_d))
+        fig.colorbar(contours, ax = axes[0].tolist(), label = 'power')
+        fig.suptitle("Power surface ({}; red: {}%)".format(criterion, target_power*100), fontweight = 'bold')
+        plot_file = 'Powersurfaceplot_line{}.jpg'.format(row)
+    elif s['mode'] == 'search':
+        search_output = pd.read_csv(os.path.join(output_folder, 'Samplesize_line{}.csv'.format(row)), sep = ';')
+        search, target_power = s['search'], s['target_power']
+        fig, axes = plt.subplots(nrows = 1, ncols = 1)
+        axes.plot(search_output[search], search_output['power'], 'o-', color = 'k')
+        axes.axhline(y = target_power, lw = 2, linestyle = "dashed", color = 'r', label = 'target_power')
+        axes.set_xlabel(search)
+        axes.set_ylabel('power')
+        fig.suptitle("Minimal {} for a power of {}%: {}".format(search, target_power*100, s['minimal_size']), fontweight = 'bold')
+        fig.legend(loc = 'center right')
+        fig.tight_layout()
+        plot_file = 'Samplesizeplot_line{}.jpg'.format(row)
+    else:
+        output = pd.read_csv(os.path.join(output_folder, 'Output_line{}.csv'.format(row)), sep = ';')
+        power_estimate = s['power_estimate']
+        fig, axes = plt.subplots(nrows = 1, ncols = 1)
+        if criterion == "correlation":
+            sns.kdeplot(output["correlations"], label = "correlations", ax = axes)
+            fig.suptitle("P(correlation >= {} with {} pp, {} trials)".format(significance_cutoff, s['npp'], s['ntrials']), fontweight = 'bold')
+            axes.set_title("Power = {}% based on {} reps".format(np.round(power_estimate*100, 2), output.shape[0]))
+        else:
+            sns.kdeplot(output["p_values"], label = "p_values", ax = axes)
+            fig.suptitle("P(p-value <= {}) with {} pp, {} trials".format(significance_cutoff, s['npp'], s['ntrials']), fontweight = 'bold')
+            axes.set_title("Power = {}% based on {} reps with ES = {}".format(np.round(power_estimate*100, 2), output.shape[0], s['cohens_d']))
+        axes.axvline(x = significance_cutoff, lw = 2, linestyle ="dashed", color ='k', label ='significance_cutoff')
+        fig.legend(loc = 'center right')
+        fig.tight_layout()
+        plot_file = 'Distributionplot_line{}.jpg'.format(row)
+    fig.savefig(os.path.join(output_folder, plot_file))
+    plt.close(fig)
+    return plot_file
+
+def saved_rows(output_folder):
+    """Function that returns the rows of which the results are saved in output_folder."""
+    return sorted(int(name[len('Row_line'):-len('.json')]) for name in os.listdir(output_folder)
+                  if name.startswith('Row_line') and name.endswith('.json'))
+
+#%%
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Plots of the power analyses of which the results are saved in an output folder.")
+    parser.add_argument('output_folder', help = "the output folder of the rows (column output_folder of the Input_file)")
+    parser.add_argument('--rows', type = int, nargs = '+', default = None, help = "the rows that are plotted (default: all saved rows)")
+    arguments = parser.parse_args()
+    for row in (saved_rows(arguments.output_folder) if arguments.rows is None else arguments.rows):
+        print("Plot of row {} saved in {}.".format(row, os.path.join(arguments.output_folder, plot_row(arguments.output_folder, row))))
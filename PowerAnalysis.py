@@ -5,18 +5,752 @@ Created on Tue Dec 14 11:04:23 2021
 @author: maudb
 """
 
+import os
+import sys
+import glob
+import queue
+import heapq
+import argparse
+import threading
+import subprocess
+import json
+import hashlib
 import numpy as np
-import pandas as pd 
-from multiprocessing import Pool, cpu_count
-from Functions import create_design, correlation_repetition, groupdifference_repetition, check_input_parameters
-from scipy import optimize
-from statsmodels.stats.power import tt_ind_solve_power
+# pandas is imported in the functions that make tables, so worker processes that import this module (e.g. with the spawn start method) do not load it
+from multiprocessing import Pool, cpu_count, resource_tracker
+from Functions import (create_design, correlation_repetition, groupdifference_repetition, check_input_parameters, 
+                       participant_task, repetition_task, task_chunk, correlation_statistic, groupdifference_statistic, 
+                       initialise_worker, share_design, release_design, design_generator, create_design_bank,
+                       telemetry_columns, refit_repetition)
+from DatasetStore import create_store, stored_repetitions, store_configuration
+from Distributed import DirectoryPool
+import Kernels
+from scipy import optimize, special
+from scipy import stats as stat
 from datetime import datetime
-import seaborn as sns
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+
+def number_of_workers(high_performance = False): 
+    """Number of worker processes: all cores minus two (at least one) when high_performance is True, otherwise one."""
+    if high_performance == True: return max(1, cpu_count() - 2)
+    else: return 1
+
+def create_executor(n_cpu = 1): 
+    """
+    Parameters
+    ----------
+    n_cpu : integer, optional
+        Number of worker processes. The default is 1.
+
+    Returns
+    -------
+    pool : multiprocessing.Pool
+        Pool of worker processes that can be passed to the power functions (argument pool).
+
+    Description
+    -----------
+    Function to create a long-lived pool of worker processes. Each worker is prepared once by initialise_worker() (see Functions.py): 
+    it uses the same kernel backend as the main process and the kernels are compiled/loaded before the first task arrives. 
+    The pool can be reused for all rows of the Input_file and both criteria; close it with pool.close() and pool.join() when all work is done.
+    """
+    # start the resource tracker before the workers are created, so that the workers share it with the main process: 
+    # the shared designs (see function share_design()) are then only cleaned up by the main process
+    resource_tracker.ensure_running()
+    return Pool(processes = n_cpu, initializer = initialise_worker, initargs = (Kernels.get_backend(), ))
+
+# columns of a checkpoint file; the parameters of all participants of a repetition are stored in one cell, separated by spaces
+checkpoint_columns = ['rep', 'seed', 'configuration', 'propfailed_estimates', 'statistic', 'mean_nfev', 'mean_nit', 
+                      'True_LRs', 'True_inverseTemps', 'LRestimations', 'inverseTempestimations']
+
+def repetition_record(rep, seed, rep_output, configuration = ''): 
+    """
+    Parameters
+    ----------
+    rep, seed : integer
+        The repetition index and the master seed of the power analysis.
+    rep_output : tuple
+        (propfailed_estimates, statistic, mean_nfev, mean_nit, True_parameters, estimated_parameters) of this repetition,
+        see function correlation_repetition() or groupdifference_repetition(), optionally followed by the instrumentation of its participants.
+    configuration : string, optional
+        Key of the configuration of the power analysis (see function configuration_key()), so a checkpoint file can only be resumed 
+        by the same power analysis (see function read_checkpoint()). The default is ''.
+
+    Returns
+    -------
+    record : dict
+        The output of this repetition with the keys in checkpoint_columns, and the key 'telemetry' when the repetition was instrumented
+        (the instrumentation is not written to the checkpoint file).
+    """
+    propfailed_estimates, statistic, mean_nfev, mean_nit, True_parameters, estimated_parameters = rep_output[:6]
+    record = {'rep': int(rep), 'seed': int(seed), 'configuration': configuration, 'propfailed_estimates': float(propfailed_estimates), 'statistic': float(statistic),
+              'mean_nfev': float(mean_nfev), 'mean_nit': float(mean_nit),
+              'True_LRs': np.asarray(True_parameters)[:, 0], 'True_inverseTemps': np.asarray(True_parameters)[:, 1],
+              'LRestimations': np.asarray(estimated_parameters)[:, 0], 'inverseTempestimations': np.asarray(estimated_parameters)[:, 1]}
+    if len(rep_output) > 6 and rep_output[6] is not None: record['telemetry'] = np.asarray(rep_output[6])
+    return record
+
+def write_checkpoint(checkpoint_file, record): 
+    """
+    Parameters
+    ----------
+    checkpoint_file : string
+        Path of the checkpoint file (csv, delimiter ';'). The header is written when the file does not exist yet.
+    record : dict
+        The output of one repetition, see function repetition_record().
+
+    Returns
+    -------
+    None.
+
+    Description
+    -----------
+    Function to append the output of one finished repetition to the checkpoint file. The line is flushed to disk immediately, 
+    so at most the repetitions that were running are lost when the power analysis is interrupted.
+    """
+    new_file = not os.path.isfile(checkpoint_file)
+    cells = [' '.join(repr(value) for value in record[column].tolist()) if isinstance(record[column], np.ndarray) 
+             else str(record[column]) for column in checkpoint_columns]
+    with open(checkpoint_file, 'a') as file: 
+        if new_file: file.write(';'.join(checkpoint_columns) + '\n')
+        file.write(';'.join(cells) + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+
+def read_checkpoint(checkpoint_file, configuration = None): 
+    """
+    Parameters
+    ----------
+    checkpoint_file : string
+        Path of the checkpoint file written by write_checkpoint().
+    configuration : string, optional
+        Key of the configuration of the power analysis that resumes from this file (see function configuration_key()). 
+        When not None, a ValueError is raised when the file holds repetitions of another configuration. The default is None.
+
+    Returns
+    -------
+    records : dict
+        {rep: record} for each repetition in the checkpoint file (empty when the file does not exist).
+
+    Description
+    -----------
+    Function to read the finished repetitions of an interrupted power analysis. 
+    A line that was only partly written when the power analysis was interrupted is removed from the file, so new lines can be appended. 
+    Each repetition holds the key of its configuration (settings, master seed, estimator, code version and backend), 
+    so the repetitions of a power analysis are never mixed with those of another one, e.g. when a row of the Input_file was changed 
+    or when no seed is given (see function checkpoint_seed()).
+    """
+    records = {}
+    if not os.path.isfile(checkpoint_file): return records
+    with open(checkpoint_file) as file: content = file.read()
+    if not content.endswith('\n'): 
+        # interrupted while writing the last line: only keep the complete lines
+        content = content[:content.rfind('\n') + 1]
+        with open(checkpoint_file, 'w') as file: file.write(content)
+    lines = content.splitlines()
+    # the columns of the file itself: files of earlier versions have no configuration column
+    columns = lines[0].split(';') if len(lines) > 0 else checkpoint_columns
+    for line in lines[1:]: 
+        cells = line.split(';')
+        if len(cells) != len(columns): continue
+        record = dict({'configuration': None}, **dict(zip(columns, cells)))
+        for column in ['rep', 'seed']: record[column] = int(record[column])
+        for column in ['propfailed_estimates', 'statistic', 'mean_nfev', 'mean_nit']: record[column] = float(record[column])
+        for column in checkpoint_columns[7:]: record[column] = np.array(record[column].split(), dtype = float)
+        records[record['rep']] = record
+    if configuration is not None and (columns != checkpoint_columns or any(record['configuration'] != configuration for record in records.values())): 
+        raise ValueError("The checkpoint file {} belongs to another power analysis (other settings, seed, estimator or code version). "
+                         "Remove it, or use another checkpoint file, to start this power analysis.".format(checkpoint_file))
+    return records
+
+def checkpoint_seed(checkpoint_files): 
+    """Function that returns the master seed of the repetitions in the first of checkpoint_files that holds repetitions; None when there are none."""
+    for checkpoint_file in checkpoint_files: 
+        records = read_checkpoint(checkpoint_file)
+        if len(records) > 0: return next(iter(records.values()))['seed']
+    return None
+
+def code_version(): 
+    """Function that returns a hash of the simulation and estimation code (Functions.py and Kernels.py), used to invalidate cached results when the code changes."""
+    code_hash = hashlib.sha256()
+    for module in ['Functions.py', 'Kernels.py']: 
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as file: code_hash.update(file.read())
+    return code_hash.hexdigest()[:16]
+
+def configuration_key(configuration): 
+    """
+    Parameters
+    ----------
+    configuration : dict
+        Everything that determines the output of the repetitions, see function cache_file().
+
+    Returns
+    -------
+    key : string
+        A hash of the configuration, the code version (see function code_version()) and the kernel backend.
+    configuration_text : string
+        The configuration with the code version and the backend as json text.
+    """
+    configuration = dict(configuration, code_version = code_version(), backend = Kernels.get_backend())
+    # numpy numbers and arrays are converted to python numbers and lists, so equal configurations always give the same text
+    configuration_text = json.dumps(configuration, sort_keys = True, default = lambda value: value.tolist())
+    return hashlib.sha256(configuration_text.encode()).hexdigest()[:24], configuration_text
+
+def cache_file(cache_folder, configuration): 
+    """
+    Parameters
+    ----------
+    cache_folder : string
+        Folder that contains the cached results. It is created when it does not exist.
+    configuration : dict
+        Everything that determines the output of the repetitions: criterion, design, parameter distributions, estimation settings 
+        and master seed. Settings that only change how the repetitions are computed or summarized (scheduling, cut_off, nreps, precision) 
+        should not be included.
+
+    Returns
+    -------
+    cache_file : string
+        Path of the cache file of this configuration: a checkpoint file (see function write_checkpoint()) named after a hash of the configuration, 
+        the code version (see function code_version()) and the kernel backend.
+
+    Description
+    -----------
+    Function to find the cached repetitions of a configuration. Since the random numbers of each repetition only depend on the master seed and the 
+    repetition index (see function participant_generator() in Functions.py), repetitions of earlier runs with the same configuration are identical 
+    to the ones that would be calculated now and can be reused; e.g. going from nreps = 100 to nreps = 500 only calculates the 400 new repetitions. 
+    The configuration is also stored in a json file next to the cache file, to see which configuration a cache file belongs to.
+    """
+    key, configuration_text = configuration_key(configuration)
+    os.makedirs(cache_folder, exist_ok = True)
+    with open(os.path.join(cache_folder, key + '.json'), 'w') as file: file.write(configuration_text)
+    checkpoint_file = os.path.join(cache_folder, key + '.csv')
+    # mark the cache file as recently used, see function evict_cache()
+    if os.path.isfile(checkpoint_file): os.utime(checkpoint_file)
+    return checkpoint_file
+
+def evict_cache(cache_folder, cache_size = None, cache_age = None): 
+    """
+    Parameters
+    ----------
+    cache_folder : string
+        Folder that contains the cached results, see function cache_file().
+    cache_size : float, optional
+        Maximal size of the cache in MB. When the cache is larger, the least recently used configurations are removed. 
+        When None, the size is not limited. The default is None.
+    cache_age : float, optional
+        Configurations that are not used for more than cache_age days are removed. When None, the age is not limited. The default is None.
+
+    Returns
+    -------
+    None.
+    """
+    cache_files = [os.path.join(cache_folder, name) for name in os.listdir(cache_folder) if name.endswith('.csv')]
+    # least recently used first
+    cache_files.sort(key = os.path.getmtime)
+    total_size = sum(os.path.getsize(name) for name in cache_files) / 1e6
+    for name in cache_files[:-1]: 
+        too_old = cache_age is not None and time.time() - os.path.getmtime(name) > cache_age * 24 * 3600
+        too_large = cache_size is not None and total_size > cache_size
+        if not too_old and not too_large: continue
+        total_size -= os.path.getsize(name) / 1e6
+        for extension in ['.csv', '.json']: 
+            if os.path.isfile(os.path.splitext(name)[0] + extension): os.remove(os.path.splitext(name)[0] + extension)
+
+def pool_workers(pool, n_cpu = 1): 
+    """Function that returns the number of workers of pool at this moment: a pool of workers on several machines (see Distributed.py) knows it itself 
+    and it can change while the tasks are done (workers can join or stop); for a multiprocessing.Pool it is n_cpu."""
+    return pool.number_of_workers() if hasattr(pool, 'number_of_workers') else n_cpu
+
+def submit_tasks(pool, task_function, tasks, chunksize = 1, window = None, n_cpu = 1): 
+    """
+    Parameters
+    ----------
+    pool : multiprocessing.Pool
+        The pool of worker processes that will execute the tasks.
+    task_function : function
+        Function that executes one task, e.g. participant_task or repetition_task (see Functions.py).
+    tasks : list
+        The tasks. 
+    chunksize : integer, optional
+        Number of tasks that are sent to a worker at once (see function task_chunk()). The default is 1.
+    window : integer, optional
+        Maximal number of chunks per worker that are submitted to the pool but not finished yet. When None, all chunks are submitted at once. 
+        The default is None.
+    n_cpu : integer, optional
+        Number of workers of pool, when pool does not know it itself (see function pool_workers()). The default is 1.
+
+    Yields
+    ------
+    output : 
+        The output of task_function for each task, in the order in which the tasks are finished.
+
+    Description
+    -----------
+    Function that works like pool.imap_unordered(), but only keeps 'window' chunks per worker ahead of the results that are used. 
+    The chunks are submitted in the order of the tasks and a new chunk is submitted each time a chunk is finished; 
+    the number of workers is asked again before each submission, so workers that join later are used as well. 
+    When the results are not needed anymore (e.g. the power estimate is precise enough, see function collect_repetitions()), 
+    the generator can be closed: no new chunks are submitted and only the chunks that are still running are waited for, 
+    so the pool can be used immediately for the next power analysis.
+    """
+    chunks = [(task_function, tasks[start:start + chunksize]) for start in range(0, len(tasks), chunksize)]
+    finished = queue.Queue()
+    nsubmitted, nfinished = 0, 0
+    try: 
+        while nfinished < len(chunks): 
+            while nsubmitted < len(chunks) and (window is None or nsubmitted - nfinished < window * pool_workers(pool, n_cpu)): 
+                pool.apply_async(task_chunk, (chunks[nsubmitted], ), callback = finished.put, error_callback = finished.put)
+                nsubmitted += 1
+            outputs = finished.get()
+            nfinished += 1
+            if isinstance(outputs, BaseException): raise outputs
+            for output in outputs: yield output
+    finally: 
+        # wait for the chunks that are still running (e.g. when the generator is closed early)
+        while nfinished < nsubmitted: 
+            finished.get()
+            nfinished += 1
+
+class BatchPool: 
+    """
+    Parameters
+    ----------
+    pool : multiprocessing.Pool or DirectoryPool
+        The pool that executes the tasks.
+    n_cpu : integer, optional
+        Number of workers of a multiprocessing.Pool; a DirectoryPool knows its number of workers itself (see function pool_workers()). The default is 1.
+    chunks_per_worker : integer, optional
+        Maximal number of chunks per worker that are handed to pool at once. 2 keeps all workers busy 
+        while the waiting chunks can still be reordered. The default is 2.
+
+    Description
+    -----------
+    Pool that is shared by several power analyses that run at the same time (see function run_input_file()). 
+    Each power analysis submits its chunks through its own RowPool (see method row_pool()), which estimates the cost of each chunk. 
+    The chunks wait here and only chunks_per_worker chunks per worker are handed to pool at once (the number of workers is asked again each time,
+    so the workers of a DirectoryPool that join later are used as well): each time a chunk is finished, the most expensive waiting chunk 
+    is handed out (the oldest one when the costs are equal), so the longest tasks of all rows are done first and the short tasks fill the gaps at the end. 
+    A row that may only use a few workers (see RowPool) has at most that many chunks in the pool; its other chunks wait, also when they are more expensive.
+    """
+    def __init__(self, pool, n_cpu = 1, chunks_per_worker = 2): 
+        self.pool, self.n_cpu, self.chunks_per_worker = pool, n_cpu, chunks_per_worker
+        # heap of waiting chunks: (-cost, submission number, row pool, func, args, callback, error_callback)
+        self.waiting, self.nsubmitted, self.nrunning = [], 0, 0
+        self.lock = threading.Lock()
+
+    def number_of_workers(self): 
+        return pool_workers(self.pool, self.n_cpu)
+
+    def row_pool(self, ntrials, npp, max_workers = None): 
+        """The pool for a power analysis with ntrials trials and npp participants per repetition, which uses at most max_workers workers (see RowPool)."""
+        return RowPool(self, ntrials, npp, max_workers = max_workers)
+
+    def submit(self, cost, row_pool, func, args, callback = None, error_callback = None): 
+        with self.lock: 
+            heapq.heappush(self.waiting, (-cost, self.nsubmitted, row_pool, func, args, callback, error_callback))
+            self.nsubmitted += 1
+        self.dispatch()
+
+    def next_chunk(self): 
+        """Function that takes the most expensive waiting chunk of a row that can have one more chunk in the pool (None when there is none); call with self.lock."""
+        skipped, chunk = [], None
+        while self.waiting: 
+            candidate = heapq.heappop(self.waiting)
+            row_pool = candidate[2]
+            if row_pool.max_workers is None or row_pool.nrunning < row_pool.max_workers: 
+                chunk = candidate
+                break
+            skipped.append(candidate)
+        for candidate in skipped: heapq.heappush(self.waiting, candidate)
+        return chunk
+
+    def dispatch(self): 
+        """Function to hand the most expensive waiting chunks to the pool, as long as fewer than chunks_per_worker chunks per worker are running."""
+        while True: 
+            max_chunks = self.chunks_per_worker * self.number_of_workers()
+            with self.lock: 
+                if self.nrunning >= max_chunks: return
+                chunk = self.next_chunk()
+                if chunk is None: return
+                cost, number, row_pool, func, args, callback, error_callback = chunk
+                self.nrunning += 1
+                row_pool.nrunning += 1
+            try: self.pool.apply_async(func, args, callback = self.finished(row_pool, callback), error_callback = self.finished(row_pool, error_callback))
+            except Exception as error: 
+                # e.g. a DirectoryPool that stopped after an error: the chunk fails, so the power analysis that waits for it raises the error
+                with self.lock: 
+                    self.nrunning -= 1
+                    row_pool.nrunning -= 1
+                if error_callback is not None: error_callback(error)
+
+    def finished(self, row_pool, callback): 
+        """Callback for the pool: a chunk of row_pool is finished, so the next waiting chunk is handed out before the result is passed on."""
+        def handle(result): 
+            with self.lock: 
+                self.nrunning -= 1
+                row_pool.nrunning -= 1
+            self.dispatch()
+            if callback is not None: callback(result)
+        return handle
+
+    def close(self): 
+        self.pool.close()
+
+    def join(self): 
+        self.pool.join()
+
+class RowPool: 
+    """
+    Parameters
+    ----------
+    batch_pool : BatchPool
+        The shared pool.
+    ntrials, npp : integer
+        Number of trials and number of participants per repetition of this power analysis.
+    max_workers : integer, optional
+        Maximal number of workers that this power analysis uses at once, e.g. number_of_workers(full_speed) of its row in the Input_file. 
+        When None, all workers of the shared pool can be used. The default is None.
+
+    Description
+    -----------
+    Pool of one power analysis within a BatchPool, with the interface of multiprocessing.Pool that the power functions use (apply_async()). 
+    The cost of a chunk is estimated as the number of trials that are simulated and fitted: 
+    ntrials for each participant task and ntrials * npp for each repetition task (see function submit_tasks()). 
+    At most max_workers chunks of this power analysis are in the shared pool at once, so a row with full_speed = 0 uses one core, 
+    also when the shared pool has more workers for the other rows.
+    """
+    def __init__(self, batch_pool, ntrials, npp, max_workers = None): 
+        self.batch_pool, self.ntrials, self.npp, self.max_workers = batch_pool, ntrials, npp, max_workers
+        # number of chunks of this power analysis in the shared pool, counted by the BatchPool
+        self.nrunning = 0
+
+    def number_of_workers(self): 
+        if self.max_workers is None: return self.batch_pool.number_of_workers()
+        return min(self.max_workers, self.batch_pool.number_of_workers())
+
+    def apply_async(self, func, args = (), callback = None, error_callback = None): 
+        cost = self.ntrials * self.npp
+        if func is task_chunk: 
+            task_function, tasks = args[0]
+            cost = self.ntrials * len(tasks) * (1 if task_function is participant_task else self.npp)
+        self.batch_pool.submit(cost, self, func, args, callback = callback, error_callback = error_callback)
+
+def base_pool(pool): 
+    """Function that returns the pool that executes the tasks of pool, also when pool is a BatchPool or RowPool."""
+    if isinstance(pool, RowPool): pool = pool.batch_pool
+    if isinstance(pool, BatchPool): pool = pool.pool
+    return pool
+
+def varying_workers(pool): 
+    """Function that tells whether the number of workers of pool can change while the tasks are done: a DirectoryPool without nworkers, also within a BatchPool."""
+    pool = base_pool(pool)
+    return isinstance(pool, DirectoryPool) and pool.nworkers is None
+
+def power_interval(nsuccesses, nreps, confidence = 0.95): 
+    """
+    Parameters
+    ----------
+    nsuccesses : integer
+        Number of successful repetitions.
+    nreps : integer
+        Number of repetitions.
+    confidence : float, optional
+        Confidence level of the interval. The default is 0.95.
+
+    Returns
+    -------
+    lower, upper : float
+        The Wilson confidence interval of the power estimate nsuccesses / nreps.
+
+    Description
+    -----------
+    The Wilson interval is used instead of power +- z * standard error, since it is also valid when the power is close to 0 or 1 
+    and when nreps is small.
+    """
+    z = stat.norm.ppf(1 - (1 - confidence) / 2)
+    center = (nsuccesses + z**2 / 2) / (nreps + z**2)
+    half_width = z / (nreps + z**2) * np.sqrt(nsuccesses * (nreps - nsuccesses) / nreps + z**2 / 4)
+    return center - half_width, center + half_width
+
+def print_power_interval(power_estimate, nreps_used, nreps, precision = None): 
+    """Function to print the 95% confidence interval of the power estimate and, with a target precision, the number of repetitions that were used."""
+    lower, upper = power_interval(np.round(power_estimate * nreps_used), nreps_used)
+    print("95% confidence interval of the power: [{}%, {}%]".format(np.round(lower*100, 2), np.round(upper*100, 2)))
+    if precision is not None: 
+        print("Target precision +-{}% reached after {} of maximal {} repetitions.".format(precision*100, nreps_used, nreps) if (upper - lower) / 2 <= precision 
+              else "Target precision +-{}% not reached with the maximal {} repetitions.".format(precision*100, nreps))
+
+def print_duration(first_seconds, nwaves, maximal = False): 
+    """
+    Function to print the estimated duration of a power analysis from the duration of its first tasks: the work is done in nwaves 
+    waves of tasks that take first_seconds each. The duration is printed in minutes with one decimal, or in seconds when it is shorter 
+    than a minute (it is not rounded up to a whole minute). With maximal = True (target precision) it is the duration of the maximal number of repetitions.
+    """
+    seconds = first_seconds * nwaves
+    duration = "{} seconds".format(int(np.ceil(seconds))) if seconds < 60 else "{} minutes".format(np.round(seconds / 60, 1))
+    print("The power analysis will take {}ca. {}".format('at most ' if maximal else '', duration))
+
+def write_telemetry(telemetry_file, telemetry):
+    """
+    Function to append the instrumentation of the participants of one repetition (see function participant_telemetry() in Functions.py)
+    to a csv file (delimiter ';'); the header is written when the file does not exist yet.
+    """
+    import pandas as pd
+    new_file = not os.path.isfile(telemetry_file)
+    pd.DataFrame(telemetry, columns = telemetry_columns).to_csv(telemetry_file, sep = ';', index = False, header = new_file, mode = 'a')
+
+def instrumentation_summary(telemetry, by = 'True_inverseTemp', nbins = 5):
+    """
+    Parameters
+    ----------
+    telemetry : pandas DataFrame
+        The instrumentation of each participant, with the columns in telemetry_columns (see function participant_telemetry() in Functions.py).
+    by : string, optional
+        The column by which the participants are grouped, e.g. 'True_inverseTemp' or 'True_LR'. The default is 'True_inverseTemp'.
+    nbins : integer, optional
+        Number of groups: the participants are divided in groups of equal size (quantiles of the column by). The default is 5.
+
+    Returns
+    -------
+    summary : pandas DataFrame
+        For each group: the number of participants, the mean estimation time, number of likelihood evaluations and restarts,
+        the proportion of estimations that did not converge and the proportion of failed estimates (learning rate estimate < 0.01).
+
+    Description
+    -----------
+    Function to find regions of the parameter space in which the parameter estimation is expensive or unreliable,
+    e.g. participants with a low inverse temperature that need many likelihood evaluations and restarts.
+    """
+    import pandas as pd
+    groups = pd.qcut(telemetry[by], q = min(nbins, telemetry.shape[0]), duplicates = 'drop')
+    grouped = telemetry.groupby(groups, observed = True)
+    return pd.DataFrame({'nparticipants': grouped.size(), 'mean_estimation_seconds': grouped['estimation_seconds'].mean(),
+                         'mean_nfev': grouped['nfev'].mean(), 'mean_restarts': (grouped['noptimizations'].mean() - 1),
+                         'not_converged': 1 - grouped['success'].mean(),
+                         'failed_estimates': grouped['LRestimation'].apply(lambda LRs: np.mean(LRs < 0.01))}).rename_axis(by)
+
+def add_instrumentation(allreps_output, records, nreps_used, wall_seconds, n_cpu, instrumentation_file = None):
+    """
+    Parameters
+    ----------
+    allreps_output : pandas DataFrame
+        The output of each repetition of a power analysis (see the power functions).
+    records : dict
+        {rep: record} of the repetitions, see function repetition_record(). Repetitions that were read from a checkpoint or cache file are not instrumented.
+    nreps_used : integer
+        Number of repetitions the power estimate is based on.
+    wall_seconds : float
+        Time in which the repetitions were done.
+    n_cpu : integer
+        Number of worker processes.
+    instrumentation_file : string, optional
+        When not None, the instrumentation of each participant is saved in this csv file (delimiter ';')
+        and the summary of function instrumentation_summary() in the same file with '_summary' added to its name. The default is None.
+
+    Returns
+    -------
+    allreps_output : pandas DataFrame
+        The output of each repetition with the columns 'simulation_seconds', 'estimation_seconds' (summed over the participants),
+        'restarts' (total number of restarts) and 'not_converged' (proportion of estimations that did not converge) added.
+        The instrumentation of each participant and its summary are stored in allreps_output.attrs['telemetry'] and allreps_output.attrs['instrumentation_summary'].
+
+    Description
+    -----------
+    Function to aggregate the instrumentation of a power analysis and to print where the time went:
+    the share of the data simulation and the parameter estimation in the total worker time, and the remaining overhead
+    (setting up the repetitions, communication between the processes and idle workers), which is estimated as wall_seconds * n_cpu minus the time
+    spent on simulation and estimation.
+    """
+    import pandas as pd
+    telemetry = [records[rep]['telemetry'] for rep in range(nreps_used) if 'telemetry' in records[rep]]
+    if len(telemetry) == 0:
+        print("\nNo instrumented repetitions (all repetitions were read from the checkpoint or cache file).")
+        return allreps_output
+    telemetry = pd.DataFrame(np.concatenate(telemetry), columns = telemetry_columns)
+    for column in ['rep', 'pp', 'nfev', 'nit', 'noptimizations', 'status']: telemetry[column] = telemetry[column].astype(int)
+    per_rep = telemetry.groupby('rep')
+    allreps_output['simulation_seconds'] = per_rep['simulation_seconds'].sum()
+    allreps_output['estimation_seconds'] = per_rep['estimation_seconds'].sum()
+    allreps_output['restarts'] = per_rep['noptimizations'].sum() - per_rep.size()
+    allreps_output['not_converged'] = 1 - per_rep['success'].mean()
+    summary = instrumentation_summary(telemetry)
+    allreps_output.attrs['telemetry'], allreps_output.attrs['instrumentation_summary'] = telemetry, summary
+
+    simulation_seconds, estimation_seconds = telemetry['simulation_seconds'].sum(), telemetry['estimation_seconds'].sum()
+    overhead_seconds = max(wall_seconds * n_cpu - simulation_seconds - estimation_seconds, 0)
+    total_seconds = simulation_seconds + estimation_seconds + overhead_seconds
+    print("\nInstrumentation of {} participants in {} repetitions ({} worker(s), {} s):".format(telemetry.shape[0], telemetry['rep'].nunique(),
+                                                                                                n_cpu, np.round(wall_seconds, 2)))
+    print("Data simulation: {}%; parameter estimation: {}%; overhead (setup, communication, idle workers): {}%".format(
+          np.round(simulation_seconds / total_seconds * 100, 1), np.round(estimation_seconds / total_seconds * 100, 1),
+          np.round(overhead_seconds / total_seconds * 100, 1)))
+    print("Restarts: {}; estimations that did not converge: {}; optimizer status counts: {}".format(
+          np.sum(telemetry['noptimizations'] - 1), np.sum(telemetry['success'] == 0), telemetry['status'].value_counts().sort_index().to_dict()))
+    print("Estimation cost by true inverse temperature:")
+    print(summary.round(4).to_string())
+    if instrumentation_file is not None:
+        telemetry.to_csv(instrumentation_file, sep = ';', index = False)
+        summary.to_csv(os.path.splitext(instrumentation_file)[0] + '_summary.csv', sep = ';')
+    return allreps_output
+
+def schedule_participants(pool, n_cpu, parameter_distributions, reps, seed, start_design, estimator = 'Nelder-Mead', initialisation = 'random',
+                          window = None, design_randomisation = 'fixed', instrument = False, dataset_store = None, nactions = 2): 
+    """
+    Parameters
+    ----------
+    pool : multiprocessing.Pool
+        The pool of worker processes that will execute the tasks.
+    n_cpu : integer
+        Number of worker processes in the pool.
+    parameter_distributions : numpy array, shape = (npp X 2 X 2)
+        For each participant the mean and standard deviation of the learning rate distribution (row 0) and inverse temperature distribution (row 1) 
+        from which its true parameters are drawn, e.g. different learning rate distributions for the participants of group 0 and group 1.
+    reps : list
+        The repetitions that have to be done.
+    seed : integer
+        Master seed of the power analysis, see function participant_generator() in Functions.py.
+    start_design : numpy array, shape = (ntrials X 5) or (nreps X ntrials X 5), or tuple
+        Design (or bank of designs, see function create_design_bank()) that will be used to simulate data and to estimate the parameters. 
+        For more details see function create_design(). 
+        Preferably the descriptor of the design in shared memory (see function share_design()), then the design is not sent with each task.
+    estimator, initialisation : string, optional
+        Estimation settings, see function fit_participant(). 
+    window : integer, optional
+        Maximal number of repetitions per worker that are submitted to the pool ahead of the results, see function submit_tasks(). 
+        When None, all tasks are submitted at once. The default is None.
+    design_randomisation : string, optional
+        'fixed', 'repetition' or 'participant', see function select_design() in Functions.py. The default is 'fixed'.
+    instrument : bool, optional
+        Whether the participants are instrumented, see function participant_telemetry() in Functions.py. The default is False.
+    dataset_store : string, optional
+        Folder of the dataset store to which the data of each participant are written (see DatasetStore.py). The default is None.
+    nactions : integer, optional
+        Number of responses of the task, see function create_design() in Functions.py. The default is 2.
+
+    Yields
+    ------
+    rep : integer
+        A repetition for which all participants are done.
+    True_parameters, estimated_parameters : numpy array, shape = (npp X 2)
+        The true and recovered learning rate (column 0) and inverse temperature (column 1) of each participant in this repetition.
+    nfev, nit : numpy array, shape = (npp,)
+        Number of likelihood evaluations and optimizer iterations used for each participant in this repetition.
+    telemetry : numpy array, shape = (npp X 13)
+        The instrumentation of each participant in this repetition; None when instrument = False.
+
+    Description
+    -----------
+    Function to do the data simulation and parameter estimation with one task per participant instead of one task per repetition. 
+    All (repetition, participant) tasks are handed out to the workers in chunks of ca. ntasks / (4 * n_cpu) tasks; 
+    a worker that is done asks for the next chunk, so a slow participant (e.g. one that needs 5 restarts) only holds up its own chunk. 
+    When the number of workers can change (see function varying_workers()), the chunks have a fixed size (DirectoryPool.chunksize tasks), 
+    so workers that join later also get chunks. 
+    This keeps all workers busy, also when nreps < n_cpu. 
+    The results are collected in the order in which they are finished and put back at their (repetition, participant) position; 
+    a repetition is returned as soon as all its participants are done. 
+    Each participant uses its own random number generator, so the results are the same as with one task per repetition, whatever the number of workers.
+    """
+    npp = parameter_distributions.shape[0]
+    tasks = [(rep, pp, parameter_distributions[pp, 0], parameter_distributions[pp, 1], start_design, estimator, initialisation, seed,
+              design_randomisation, instrument, dataset_store, nactions) for rep in reps for pp in range(npp)]
+    if len(tasks) == 0: return
+    if varying_workers(pool): chunksize = DirectoryPool.chunksize
+    else: chunksize = max(1, int(np.ceil(len(tasks) / (4 * n_cpu))))
+    if window is not None: 
+        # a chunk contains at most one repetition, and the window is converted from repetitions to chunks
+        chunksize = min(chunksize, npp)
+        window = int(np.ceil(window * npp / chunksize))
+    
+    True_parameters, estimations = {rep: np.empty((npp, 2)) for rep in reps}, {rep: np.empty((npp, 2)) for rep in reps}
+    nfev, nit = {rep: np.empty(npp) for rep in reps}, {rep: np.empty(npp) for rep in reps}
+    telemetry = {rep: np.empty((npp, len(telemetry_columns))) for rep in reps} if instrument else {}
+    ntodo = {rep: npp for rep in reps}
+    t0 = time.time()
+    for ntasks_done, (rep, pp, participant_parameters, estimated_parameters, task_nfev, task_nit, task_telemetry) in enumerate(submit_tasks(pool, participant_task, tasks, 
+                                                                                                                           chunksize = chunksize, window = window, n_cpu = n_cpu)): 
+        True_parameters[rep][pp], estimations[rep][pp], nfev[rep][pp], nit[rep][pp] = participant_parameters, estimated_parameters, task_nfev, task_nit
+        if instrument: telemetry[rep][pp] = task_telemetry
+        if ntasks_done == 0: 
+            # the first result arrives when the first chunk is finished; the chunks are done in waves of n_cpu chunks
+            print_duration(time.time() - t0, np.ceil(np.ceil(len(tasks) / chunksize) / n_cpu), maximal = window is not None)
+        ntodo[rep] -= 1
+        if ntodo[rep] == 0: yield rep, True_parameters.pop(rep), estimations.pop(rep), nfev.pop(rep), nit.pop(rep), telemetry.pop(rep, None)
+
+def collect_repetitions(results, seed, nreps, records, checkpoint_file = None, successful = None, precision = None, minimal_reps = 10,
+                        telemetry_file = None, n_cpu = None, configuration = ''): 
+    """
+    Parameters
+    ----------
+    results : iterable
+        (rep, rep_output) for each repetition, in the order in which they are finished (see function repetition_record() for rep_output).
+    seed : integer
+        Master seed of the power analysis.
+    nreps : integer
+        Maximal number of repetitions.
+    records : dict
+        {rep: record} of the repetitions that are already done, e.g. read from the checkpoint file. The new repetitions are added to it.
+    checkpoint_file : string, optional
+        When not None, each repetition is appended to this file as soon as it is finished. The default is None.
+    successful : function, optional
+        Function that returns whether a repetition was successful given its statistic. Only needed when precision is not None.
+    precision : float, optional
+        Target half-width of the 95% confidence interval of the power estimate (see function power_interval()). 
+        When None, all repetitions are collected. The default is None.
+    minimal_reps : integer, optional
+        Minimal number of repetitions before the collection can stop because of the precision. The default is 10.
+    telemetry_file : string, optional
+        When not None, the instrumentation of the participants of each instrumented repetition is appended to this file
+        as soon as the repetition is finished (see function write_telemetry()). The default is None.
+    n_cpu : integer, optional
+        Number of worker processes that each do one repetition at a time (one task per repetition). When given, the duration of the 
+        power analysis is printed when the first repetition is collected (see function print_duration()). The default is None.
+    configuration : string, optional
+        Key of the configuration of the power analysis, which is written with each repetition to the checkpoint file (see function repetition_record()). 
+        The default is ''.
+
+    Returns
+    -------
+    records : dict
+        {rep: record} of all collected repetitions.
+    nreps_used : integer
+        Number of repetitions the power estimate is based on: repetitions 0, ..., nreps_used - 1.
+
+    Description
+    -----------
+    Function to collect the repetitions in the order in which they are finished. With a precision, the collection stops as soon as 
+    the confidence interval of the power estimate is narrow enough; the results that are not used anymore are closed 
+    (see function submit_tasks()). The stopping rule is only evaluated on the first n repetitions (n = 1, 2, ...) once they are all finished, 
+    so the number of repetitions used does not depend on which repetition happened to finish first and the power estimate is not biased 
+    towards fast repetitions. With the same seed, the same nreps_used is obtained.
+    """
+    nfirst, nsuccesses = 0, 0
+    results = iter(results)
+    # only the repetitions that are not read from a checkpoint are done now, in waves of n_cpu repetitions
+    nreps_todo, first_rep, collection_start = len([rep for rep in range(nreps) if rep not in records]), True, time.time()
+    while True: 
+        # check the precision for each new number of first repetitions that are all finished
+        while nfirst < nreps and nfirst in records: 
+            nfirst += 1
+            if precision is None: continue
+            nsuccesses += successful(records[nfirst - 1]['statistic'])
+            lower, upper = power_interval(nsuccesses, nfirst)
+            if nfirst >= minimal_reps and (upper - lower) / 2 <= precision: 
+                if hasattr(results, 'close'): results.close()
+                return records, nfirst
+        rep, rep_output = next(results, (None, None))
+        if rep is None: return records, nfirst
+        if n_cpu is not None and first_rep: 
+            print_duration(time.time() - collection_start, np.ceil(nreps_todo / min(n_cpu, nreps_todo)), maximal = precision is not None)
+        first_rep = False
+        records[rep] = repetition_record(rep, seed, rep_output, configuration)
+        if checkpoint_file is not None: write_checkpoint(checkpoint_file, records[rep])
+        if telemetry_file is not None and 'telemetry' in records[rep]: write_telemetry(telemetry_file, records[rep]['telemetry'])
 
 def power_estimation_correlation(npp = 30, ntrials = 480, nreversals = 12, cut_off = 0.7, high_performance = False, 
-                                 nreps = 100, reward_probability = 0.8): 
+                                 nreps = 100, reward_probability = 0.8, estimator = 'Nelder-Mead', initialisation = 'random', 
+                                 scheduling = 'repetition', pool = None, seed = None, checkpoint_file = None, precision = None, 
+                                 cache_folder = None, cache_size = None, cache_age = None, design_randomisation = 'fixed', instrument = False,
+                                 instrumentation_file = None, dataset_store = None, nstimuli = 2, nactions = 2): 
     """
 
     Parameters
@@ -35,11 +769,61 @@ def power_estimation_correlation(npp = 30, ntrials = 480, nreversals = 12, cut_o
         The number of rule-reversals that will occur in the experiment. Should be smaller than ntrials.
     reward_probability : float (element within [0, 1]), optional
         The probability that reward will be congruent with the current stimulus-response mapping rule. The default is 0.8.
+    estimator : string, optional
+        Estimation method used for each participant: 'Nelder-Mead', 'profile' or 'L-BFGS-B'. 
+        For more details see function fit_participant(). The default is 'Nelder-Mead'.
+    initialisation : string, optional
+        Start point of the optimization for each participant: 'random' or 'grid'. For more details see function fit_participant(). 
+        The default is 'random'.
+    scheduling : string, optional
+        How the work is divided over the cores: 'repetition' (one task per repetition) or 'participant' (one task per participant 
+        in each repetition, see function schedule_participants()). The default is 'repetition'.
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes created with create_executor(), with number_of_workers(high_performance) processes. 
+        The pool is not closed by this function, so it can be reused. When None, a pool is created and closed within this function. 
+        The default is None.
+    seed : integer, optional
+        Master seed from which the random numbers of the design and of each participant in each repetition are derived 
+        (see function participant_generator() in Functions.py). The default is None.
+    checkpoint_file : string, optional
+        Path of a csv file to which the output of each repetition (proportion failed estimates, statistic, true and estimated 
+        parameters, seed) is appended as soon as the repetition is finished. When the file already exists, the repetitions in it 
+        are not done again, so an interrupted power analysis can be resumed by calling this function again with the same arguments 
+        (without a seed, the seed in the file is used); a ValueError is raised when the file belongs to another power analysis (see function read_checkpoint()). 
+        When None, nothing is written to disk. The default is None.
+    precision : float, optional
+        Target half-width of the 95% confidence interval of the power estimate. When not None, nreps is the maximal number of 
+        repetitions: the power analysis stops as soon as the confidence interval is narrow enough (see function collect_repetitions()). 
+        When None, all nreps repetitions are done. The default is None.
+    cache_folder : string, optional
+        Folder with the results of earlier runs (see function cache_file()). Repetitions of an earlier run with the same configuration 
+        (and the same seed) are reused and only the missing repetitions are calculated; the new repetitions are added to the cache. 
+        The cache file also works as checkpoint file. Only used when a seed is given. When None, no cache is used. The default is None.
+    cache_size, cache_age : float, optional
+        Limits of the cache in MB and days, see function evict_cache(). The defaults are None (no limits).
+    design_randomisation : string, optional
+        'fixed' (all repetitions use the same design), 'repetition' (each repetition uses its own design from a bank of designs, 
+        see function create_design_bank() in Functions.py) or 'participant' (each participant uses its own design). 
+        With 'repetition' or 'participant' the variability between designs is part of the power estimate. The default is 'fixed'.
+    instrument : bool, optional
+        Whether the time spent on data simulation and parameter estimation, the number of likelihood evaluations and restarts
+        and the optimizer status of each participant are recorded (see function add_instrumentation()). The default is False.
+    instrumentation_file : string, optional
+        When instrument = True, csv file in which the instrumentation of each participant is saved. The default is None.
+    dataset_store : string, optional
+        Folder in which the simulated data and true parameters of each participant are kept (see DatasetStore.py), so other estimators 
+        or cut-offs can be tried later on the same datasets with function refit_store(). Repetitions that are read from a checkpoint 
+        or the cache are not simulated and thus not stored. Cannot be used with a DirectoryPool (ValueError). When None, the datasets are not kept. The default is None.
+    nstimuli, nactions : integer, optional
+        Number of stimuli and responses of the task, e.g. more responses for a multi-armed reversal task (see function create_design() in Functions.py). 
+        The defaults are 2 and 2.
 
     Returns
     -------
     allreps_output : TYPE
-        Pandas dataframe containing the proportion failed estimates on each repetition and the correlation value on each repetition.
+        Pandas dataframe containing the proportion failed estimates, the correlation value, the mean number of likelihood evaluations 
+        and optimizer iterations per participant and the seed of each repetition that was used for the power estimate.
+        With instrument = True, the columns and attributes described in function add_instrumentation() are added.
     power_estimate: float [0, 1]
         The power estimation: number of reps for which the parameter recovery was successful (correlation > significance_cutoff) divided by the total number of reps. 
     
@@ -49,27 +833,105 @@ def power_estimation_correlation(npp = 30, ntrials = 480, nreversals = 12, cut_o
     Parameter estimates are considered to be adequate if their correlation with the true parameters is minimum the cut_off.
     Power is calculated using a simulation-based approach.
     """
-    start_design = create_design(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability)
-    if high_performance == True: n_cpu = cpu_count() - 2
-    else: n_cpu = 1
-    pool = Pool(processes = n_cpu)
+    import pandas as pd
+    # a power analysis that is resumed without a seed uses the seed of its checkpoint file
+    if seed is None and checkpoint_file is not None: seed = checkpoint_seed([checkpoint_file])
+    if cache_folder is not None and seed is None: 
+        print("No seed given: the results are not cached.")
+        cache_folder = None
+    # the design and all repetitions are derived from the master seed, so the power analysis can be reproduced and resumed
+    if seed is None: seed = np.random.randint(0, 2**31 - 1)
+    if design_randomisation == 'repetition': 
+        # one design per repetition, design rep only depends on the seed and rep (see function shuffle_designs() in Functions.py)
+        start_design = create_design_bank(nreps, ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, 
+                                          rng = design_generator(seed), nstimuli = nstimuli, nactions = nactions)
+    else: 
+        # with design_randomisation = 'participant', the workers shuffle this design for each participant (see function select_design())
+        start_design = create_design(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, rng = design_generator(seed), 
+                                     nstimuli = nstimuli, nactions = nactions)
+    n_cpu = number_of_workers(high_performance)
+    own_pool = pool is None
+    if own_pool: pool = create_executor(n_cpu)
+    # a pool of workers on several machines (see Distributed.py) knows how many workers it has
+    if hasattr(pool, 'number_of_workers'): n_cpu = pool.number_of_workers()
     LR_distribution = np.array([0.5, 0.1])
     inverseTemp_distribution = np.array([2.0, 1.0])
-    out = pool.starmap(correlation_repetition, [(inverseTemp_distribution, LR_distribution, npp, ntrials, 
-                                                 start_design, rep, nreps, n_cpu) for rep in range(nreps)])
-    pool.close()
-    pool.join()
+    # everything that determines the simulated datasets
+    simulation_configuration = {'criterion': 'correlation', 'npp': npp, 'ntrials': ntrials, 'nreversals': nreversals, 
+                                'reward_probability': reward_probability, 'LR_distribution': LR_distribution, 
+                                'inverseTemp_distribution': inverseTemp_distribution, 'seed': seed, 'design_randomisation': design_randomisation}
+    # only added for other tasks than 2 stimuli X 2 responses, so the cache files and stores of the 2 X 2 task stay valid
+    if (nstimuli, nactions) != (2, 2): simulation_configuration.update(nstimuli = nstimuli, nactions = nactions)
+    estimation_configuration = dict(simulation_configuration, estimator = estimator, initialisation = initialisation)
+    if cache_folder is not None: checkpoint_file = cache_file(cache_folder, estimation_configuration)
+    if dataset_store is not None: 
+        # the workers write the datasets to memory-mapped files, which is not safe over a shared file system from several machines
+        if isinstance(base_pool(pool), DirectoryPool): raise ValueError("A dataset store cannot be used with workers on other machines (DirectoryPool)")
+        create_store(dataset_store, nreps, npp, ntrials, simulation_configuration)
+    # repetitions that are already done in an earlier (interrupted) run of the same configuration
+    configuration = configuration_key(estimation_configuration)[0]
+    records = read_checkpoint(checkpoint_file, configuration) if checkpoint_file is not None else {}
+    reps_todo = [rep for rep in range(nreps) if rep not in records]
+    if len(reps_todo) < nreps: print("{} of {} repetitions already done, read from {}.".format(nreps - len(reps_todo), nreps, checkpoint_file))
+    # with a target precision only a few repetitions per worker are submitted ahead, so little work is wasted when the power analysis stops
+    window = None if precision is None else 2
+    # put the design in shared memory: the workers attach to it instead of receiving a copy with each task
+    shared_block, design_descriptor = share_design(start_design)
+    if scheduling == 'participant': 
+        # the distributions from which the true parameters of each participant are drawn, shape (npp, 2, 2)
+        parameter_distributions = np.tile([LR_distribution, inverseTemp_distribution], (npp, 1, 1))
+        # reduce the participant results to the statistic of each repetition
+        results = ((rep, correlation_statistic(True_parameters[:, 0], estimations[:, 0], estimations[:, 0] < 0.01) 
+                    + (np.mean(nfev), np.mean(nit), True_parameters, estimations, telemetry)) 
+                   for rep, True_parameters, estimations, nfev, nit, telemetry in schedule_participants(pool, n_cpu, parameter_distributions, reps_todo, seed,
+                                                                                                        design_descriptor, estimator = estimator,
+                                                                                                        initialisation = initialisation, window = window,
+                                                                                                        design_randomisation = design_randomisation,
+                                                                                                        instrument = instrument, dataset_store = dataset_store,
+                                                                                                        nactions = nactions))
+    else: 
+        results = submit_tasks(pool, repetition_task, [(rep, correlation_repetition, (inverseTemp_distribution, LR_distribution, npp, ntrials, 
+                                                                                      design_descriptor, rep, estimator, 
+                                                                                      initialisation, seed, design_randomisation, instrument, dataset_store, 
+                                                                                      nactions)) 
+                               for rep in reps_todo], window = window, n_cpu = n_cpu)
+    # the instrumentation is written to a temporary file while the repetitions are collected, so it is not lost when the power analysis is interrupted
+    telemetry_file = None if not instrument or instrumentation_file is None else instrumentation_file + '.part'
+    collection_start = time.time()
+    # the tasks are done while the repetitions are collected; the shared design is also released when a task fails
+    try: 
+        records, nreps_used = collect_repetitions(results, seed, nreps, records, checkpoint_file = checkpoint_file,
+                                                  successful = lambda correlation: correlation >= cut_off, precision = precision,
+                                                  telemetry_file = telemetry_file, n_cpu = None if scheduling == 'participant' else n_cpu, 
+                                                  configuration = configuration)
+    finally: release_design(shared_block)
+    wall_seconds = time.time() - collection_start
+    if own_pool: 
+        pool.close()
+        pool.join()
+    if cache_folder is not None: evict_cache(cache_folder, cache_size = cache_size, cache_age = cache_age)
     
-    allreps_output = pd.DataFrame(out, columns = ['propfailed_estimates', 'correlations'])
+    allreps_output = pd.DataFrame([records[rep] for rep in range(nreps_used)], columns = ['propfailed_estimates', 'statistic', 'mean_nfev', 'mean_nit', 'seed'])
+    allreps_output = allreps_output.rename(columns = {'statistic': 'correlations'})
     mean_propfailed_estimates = np.mean(allreps_output['propfailed_estimates'])
     power_estimate = np.mean((allreps_output['correlations'] >= cut_off)*1)
     print(str("\nPower to obtain a correlation(true_param, param_estim) >= {}".format(cut_off) 
           + " with {} trials and {} participants: {}%".format(ntrials, npp, power_estimate*100)))
+    print_power_interval(power_estimate, nreps_used, nreps, precision)
     print("\nMean failed learning rate estimates: {}%".format(np.round(mean_propfailed_estimates*100, 2)))
+    print("Mean likelihood evaluations per participant ({}): {}; mean iterations: {}".format(estimator,
+          np.round(np.mean(allreps_output['mean_nfev']), 1), np.round(np.mean(allreps_output['mean_nit']), 1)))
+    if instrument:
+        allreps_output = add_instrumentation(allreps_output, records, nreps_used, wall_seconds, n_cpu, instrumentation_file = instrumentation_file)
+        if telemetry_file is not None and os.path.isfile(telemetry_file): os.remove(telemetry_file)
     return allreps_output, power_estimate
 
 def power_estimation_groupdifference(npp_per_group = 20, ntrials = 480, nreps = 100, cut_off = 0.05, 
-                                     high_performance = False, nreversals = 12, cohens_d = 0.5, reward_probability = 0.8): 
+                                     high_performance = False, nreversals = 12, cohens_d = 0.5, reward_probability = 0.8, 
+                                     estimator = 'Nelder-Mead', initialisation = 'random', scheduling = 'repetition', pool = None, 
+                                     seed = None, checkpoint_file = None, precision = None, cache_folder = None, cache_size = None, 
+                                     cache_age = None, design_randomisation = 'fixed', instrument = False, instrumentation_file = None, 
+                                     dataset_store = None, nstimuli = 2, nactions = 2): 
     """
     Parameters
     ----------
@@ -89,11 +951,61 @@ def power_estimation_groupdifference(npp_per_group = 20, ntrials = 480, nreps =
         Estimated effect size included in the power analysis. 
     reward_probability : float (element within [0, 1]), optional
         The probability that reward will be congruent with the current stimulus-response mapping rule. The default is 0.8.
+    estimator : string, optional
+        Estimation method used for each participant: 'Nelder-Mead', 'profile' or 'L-BFGS-B'. 
+        For more details see function fit_participant(). The default is 'Nelder-Mead'.
+    initialisation : string, optional
+        Start point of the optimization for each participant: 'random' or 'grid'. For more details see function fit_participant(). 
+        The default is 'random'.
+    scheduling : string, optional
+        How the work is divided over the cores: 'repetition' (one task per repetition) or 'participant' (one task per participant 
+        in each repetition, see function schedule_participants()). The default is 'repetition'.
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes created with create_executor(), with number_of_workers(high_performance) processes. 
+        The pool is not closed by this function, so it can be reused. When None, a pool is created and closed within this function. 
+        The default is None.
+    seed : integer, optional
+        Master seed from which the random numbers of the design and of each participant in each repetition are derived 
+        (see function participant_generator() in Functions.py). The default is None.
+    checkpoint_file : string, optional
+        Path of a csv file to which the output of each repetition (proportion failed estimates, statistic, true and estimated 
+        parameters, seed) is appended as soon as the repetition is finished. When the file already exists, the repetitions in it 
+        are not done again, so an interrupted power analysis can be resumed by calling this function again with the same arguments 
+        (without a seed, the seed in the file is used); a ValueError is raised when the file belongs to another power analysis (see function read_checkpoint()). 
+        When None, nothing is written to disk. The default is None.
+    precision : float, optional
+        Target half-width of the 95% confidence interval of the power estimate. When not None, nreps is the maximal number of 
+        repetitions: the power analysis stops as soon as the confidence interval is narrow enough (see function collect_repetitions()). 
+        When None, all nreps repetitions are done. The default is None.
+    cache_folder : string, optional
+        Folder with the results of earlier runs (see function cache_file()). Repetitions of an earlier run with the same configuration 
+        (and the same seed) are reused and only the missing repetitions are calculated; the new repetitions are added to the cache. 
+        The cache file also works as checkpoint file. Only used when a seed is given. When None, no cache is used. The default is None.
+    cache_size, cache_age : float, optional
+        Limits of the cache in MB and days, see function evict_cache(). The defaults are None (no limits).
+    design_randomisation : string, optional
+        'fixed' (all repetitions use the same design), 'repetition' (each repetition uses its own design from a bank of designs, 
+        see function create_design_bank() in Functions.py) or 'participant' (each participant uses its own design). 
+        With 'repetition' or 'participant' the variability between designs is part of the power estimate. The default is 'fixed'.
+    instrument : bool, optional
+        Whether the time spent on data simulation and parameter estimation, the number of likelihood evaluations and restarts
+        and the optimizer status of each participant are recorded (see function add_instrumentation()). The default is False.
+    instrumentation_file : string, optional
+        When instrument = True, csv file in which the instrumentation of each participant is saved. The default is None.
+    dataset_store : string, optional
+        Folder in which the simulated data and true parameters of each participant are kept (see DatasetStore.py), so other estimators 
+        or cut-offs can be tried later on the same datasets with function refit_store(). Repetitions that are read from a checkpoint 
+        or the cache are not simulated and thus not stored. Cannot be used with a DirectoryPool (ValueError). When None, the datasets are not kept. The default is None.
+    nstimuli, nactions : integer, optional
+        Number of stimuli and responses of the task, e.g. more responses for a multi-armed reversal task (see function create_design() in Functions.py). 
+        The defaults are 2 and 2.
 
     Returns
     -------
     allreps_output : TYPE
-        Pandas dataframe containing the proportion failed estimates on each repetition and the p-value on each repetition.
+        Pandas dataframe containing the proportion failed estimates, the p-value, the mean number of likelihood evaluations 
+        and optimizer iterations per participant and the seed of each repetition that was used for the power estimate.
+        With instrument = True, the columns and attributes described in function add_instrumentation() are added.
     power_estimate: float [0, 1]
         The power estimation: number of reps for which the parameter recovery was successful (significant group difference found) divided by the total number of reps. 
     
@@ -103,84 +1015,1046 @@ def power_estimation_groupdifference(npp_per_group = 20, ntrials = 480, nreps =
     Parameter estimates are considered to be adequate if they correctly reveal the group difference when a true group difference of size 'cohens_d' exists.
     Power is calculated using a simulation-based approach.
     """
+    import pandas as pd
+    
+    # a power analysis that is resumed without a seed uses the seed of its checkpoint file
+    if seed is None and checkpoint_file is not None: seed = checkpoint_seed([checkpoint_file])
+    if cache_folder is not None and seed is None: 
+        print("No seed given: the results are not cached.")
+        cache_folder = None
+    # the design and all repetitions are derived from the master seed, so the power analysis can be reproduced and resumed
+    if seed is None: seed = np.random.randint(0, 2**31 - 1)
+    if design_randomisation == 'repetition': 
+        # one design per repetition, design rep only depends on the seed and rep (see function shuffle_designs() in Functions.py)
+        start_design = create_design_bank(nreps, ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, 
+                                          rng = design_generator(seed), nstimuli = nstimuli, nactions = nactions)
+    else: 
+        # with design_randomisation = 'participant', the workers shuffle this design for each participant (see function select_design())
+        start_design = create_design(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, rng = design_generator(seed), 
+                                     nstimuli = nstimuli, nactions = nactions)
+    n_cpu = number_of_workers(high_performance)
+    # First: check what the power is when true parameters would be recoverable 
+    # (statsmodels is only imported here: the workers do not need it)
+    from statsmodels.stats.power import tt_ind_solve_power
+    power = tt_ind_solve_power(nobs1 = npp_per_group, ratio = 1, effect_size = cohens_d, alpha = cut_off, power = None, 
+                            alternative = 'larger')
+    print("\nPower if estimates would be perfect: {}%".format(np.round(power, 4)*100))    
+    
+    # Calculate the mean_groupdifference based on cohens_d and with the s_pooled == 0.1
+        # formula: cohens_d = (mean1 - mean2)/s_pooled ==> cohens_d * s_pooled = (mean1 - mean2)
+        # thus with s_pooled == 0.1: cohens_d * 0.1 = group_difference
+    s_pooled = 0.1
+    group_difference = cohens_d * s_pooled 
+    LR_means = [0.5 - group_difference/2, 0.5 + group_difference/2]
+    LR_distributions = np.array([[LR_means[0], 0.1], [LR_means[1], 0.1]])
+    
+    inverseTemp_distribution = np.array([2.0, 1.0])
+    # mean and standard deviation for the true distributions that will be used: 
+        # assumed distribution learning rates: normal distribution with mean 0.5 and sd 0.1
+        # assumed distribution inverse temperatures: normal distribution with mean 2 and sd 1
+    own_pool = pool is None
+    if own_pool: pool = create_executor(n_cpu)
+    # a pool of workers on several machines (see Distributed.py) knows how many workers it has
+    if hasattr(pool, 'number_of_workers'): n_cpu = pool.number_of_workers()
+    # everything that determines the simulated datasets
+    simulation_configuration = {'criterion': 'group_difference', 'npp_per_group': npp_per_group, 'ntrials': ntrials, 
+                                'nreversals': nreversals, 'reward_probability': reward_probability, 
+                                'LR_distributions': LR_distributions, 'inverseTemp_distribution': inverseTemp_distribution, 
+                                'seed': seed, 'design_randomisation': design_randomisation}
+    # only added for other tasks than 2 stimuli X 2 responses, so the cache files and stores of the 2 X 2 task stay valid
+    if (nstimuli, nactions) != (2, 2): simulation_configuration.update(nstimuli = nstimuli, nactions = nactions)
+    estimation_configuration = dict(simulation_configuration, estimator = estimator, initialisation = initialisation)
+    if cache_folder is not None: checkpoint_file = cache_file(cache_folder, estimation_configuration)
+    if dataset_store is not None: 
+        # the workers write the datasets to memory-mapped files, which is not safe over a shared file system from several machines
+        if isinstance(base_pool(pool), DirectoryPool): raise ValueError("A dataset store cannot be used with workers on other machines (DirectoryPool)")
+        create_store(dataset_store, nreps, 2*npp_per_group, ntrials, simulation_configuration)
+    # repetitions that are already done in an earlier (interrupted) run of the same configuration
+    configuration = configuration_key(estimation_configuration)[0]
+    records = read_checkpoint(checkpoint_file, configuration) if checkpoint_file is not None else {}
+    reps_todo = [rep for rep in range(nreps) if rep not in records]
+    if len(reps_todo) < nreps: print("{} of {} repetitions already done, read from {}.".format(nreps - len(reps_todo), nreps, checkpoint_file))
+    # with a target precision only a few repetitions per worker are submitted ahead, so little work is wasted when the power analysis stops
+    window = None if precision is None else 2
+    # put the design in shared memory: the workers attach to it instead of receiving a copy with each task
+    shared_block, design_descriptor = share_design(start_design)
+    if scheduling == 'participant': 
+        # the distributions from which the true parameters of each participant are drawn, shape (2*npp_per_group, 2, 2): 
+        # participants of group 0 and group 1 are put below each other, in the same order as in groupdifference_repetition
+        parameter_distributions = np.concatenate([np.tile([LR_distributions[group], inverseTemp_distribution], (npp_per_group, 1, 1)) for group in range(2)])
+        # reduce the participant results to the statistic of each repetition
+        results = ((rep, groupdifference_statistic(estimations[:, 0].reshape(2, npp_per_group), estimations[:, 0].reshape(2, npp_per_group) < 0.01) 
+                    + (np.mean(nfev), np.mean(nit), True_parameters, estimations, telemetry)) 
+                   for rep, True_parameters, estimations, nfev, nit, telemetry in schedule_participants(pool, n_cpu, parameter_distributions, reps_todo, seed,
+                                                                                                        design_descriptor, estimator = estimator,
+                                                                                                        initialisation = initialisation, window = window,
+                                                                                                        design_randomisation = design_randomisation,
+                                                                                                        instrument = instrument, dataset_store = dataset_store,
+                                                                                                        nactions = nactions))
+    else: 
+        results = submit_tasks(pool, repetition_task, [(rep, groupdifference_repetition, (inverseTemp_distribution, LR_distributions, npp_per_group, 
+                                                                                          ntrials, design_descriptor, rep, False, estimator, 
+                                                                                          initialisation, seed, design_randomisation, instrument, dataset_store, 
+                                                                                          nactions)) 
+                               for rep in reps_todo], window = window, n_cpu = n_cpu)
+    # the instrumentation is written to a temporary file while the repetitions are collected, so it is not lost when the power analysis is interrupted
+    telemetry_file = None if not instrument or instrumentation_file is None else instrumentation_file + '.part'
+    collection_start = time.time()
+    # the tasks are done while the repetitions are collected; the shared design is also released when a task fails
+    try: 
+        records, nreps_used = collect_repetitions(results, seed, nreps, records, checkpoint_file = checkpoint_file,
+                                                  successful = lambda p_value: p_value <= cut_off, precision = precision,
+                                                  telemetry_file = telemetry_file, n_cpu = None if scheduling == 'participant' else n_cpu, 
+                                                  configuration = configuration)
+    finally: release_design(shared_block)
+    wall_seconds = time.time() - collection_start
+    # before calling pool.join(), should call pool.close() to indicate that there will be no new processing
+    if own_pool: 
+        pool.close()
+        pool.join()
+    if cache_folder is not None: evict_cache(cache_folder, cache_size = cache_size, cache_age = cache_age)
+    allreps_output = pd.DataFrame([records[rep] for rep in range(nreps_used)], columns = ['propfailed_estimates', 'statistic', 'mean_nfev', 'mean_nit', 'seed'])
+    allreps_output = allreps_output.rename(columns = {'statistic': 'p_values'})
+    mean_propfailed_estimates = np.mean(allreps_output['propfailed_estimates'])
+    # check for which % of repetitions the group difference was significant 
+    # note that we're working with a one-sided t-test (if interested in two-sided need to divide the p-value obtained at each rep with 2)
+    power_estimate = np.mean((allreps_output['p_values'] <= cut_off))
+    print(str("\nPower to detect a significant group difference when the estimated effect size d = {}".format(cohens_d)
+          + " with {} trials and {} participants per group: {}%".format(ntrials, 
+                                                                     npp_per_group, power_estimate*100)))
+    print_power_interval(power_estimate, nreps_used, nreps, precision)
+    print("\nMean failed learning rate estimates per repetition: {}%".format(np.round(mean_propfailed_estimates*100, 2)))
+    print("Mean likelihood evaluations per participant ({}): {}; mean iterations: {}".format(estimator,
+          np.round(np.mean(allreps_output['mean_nfev']), 1), np.round(np.mean(allreps_output['mean_nit']), 1)))
+    if instrument:
+        allreps_output = add_instrumentation(allreps_output, records, nreps_used, wall_seconds, n_cpu, instrumentation_file = instrumentation_file)
+        if telemetry_file is not None and os.path.isfile(telemetry_file): os.remove(telemetry_file)
+    return allreps_output, power_estimate
+
+def refit_store(dataset_store, cut_off = None, nreps = None, estimator = 'Nelder-Mead', initialisation = 'random', seed = None, 
+                high_performance = False, pool = None, checkpoint_file = None, precision = None): 
+    """
+    Parameters
+    ----------
+    dataset_store : string
+        Folder of a dataset store that was filled by power_estimation_correlation() or power_estimation_groupdifference() (argument dataset_store).
+    cut_off : float, optional
+        Critical value that will be used to evaluate whether the repetition was successful (a correlation >= cut_off, or a p-value <= cut_off). 
+        When None, 0.7 for the correlation criterion and 0.05 for the group difference criterion. The default is None.
+    nreps : integer, optional
+        Number of stored repetitions that are fitted again. When None, all stored repetitions. The default is None.
+    estimator, initialisation : string, optional
+        Estimation settings, see function fit_participant() in Functions.py. The defaults are 'Nelder-Mead' and 'random'.
+    seed : integer, optional
+        Master seed for the random start points of the estimation (see function refit_generator() in Functions.py). 
+        When None, the seed of the stored power analysis. The default is None.
+    high_performance : bool (True or False), optional
+        Defines whether multiple cores on the computer will be used. The default is False.
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes created with create_executor(); when None, a pool is created and closed within this function. The default is None.
+    checkpoint_file, precision : optional
+        See function power_estimation_correlation(). The defaults are None.
+
+    Returns
+    -------
+    allreps_output : pandas DataFrame
+        The same as the output of power_estimation_correlation() (column correlations) or power_estimation_groupdifference() (column p_values), 
+        depending on the criterion of the store.
+    power_estimate : float
+        The power estimate with these estimation settings and this cut_off.
+
+    Description
+    -----------
+    Function to estimate the power again with other estimation settings or another cut-off, on exactly the same datasets as 
+    an earlier power analysis: the data are read from the dataset store instead of being simulated, so only the parameter estimation is done again. 
+    Differences between estimators are then not due to simulation noise.
+    """
+    import pandas as pd
+    configuration = store_configuration(dataset_store)
+    correlation = configuration['criterion'] == 'correlation'
+    if cut_off is None: cut_off = 0.7 if correlation else 0.05
+    if seed is None: seed = configuration['seed']
+    reps = stored_repetitions(dataset_store)
+    if nreps is not None: reps = reps[:nreps]
+    nreps = len(reps)
+    if nreps == 0: raise ValueError("No complete repetitions stored in {}".format(dataset_store))
+    print("Fitting the datasets of {} repetitions in {} again ({}).".format(nreps, dataset_store, estimator))
+    n_cpu = number_of_workers(high_performance)
+    own_pool = pool is None
+    if own_pool: pool = create_executor(n_cpu)
+    if hasattr(pool, 'number_of_workers'): n_cpu = pool.number_of_workers()
+    # the stored repetitions are numbered 0, ..., nreps - 1 in the output; a checkpoint file can only be resumed with the same stored repetitions
+    refit_configuration = configuration_key({'dataset_store': configuration, 'repetitions': reps, 'estimator': estimator, 
+                                             'initialisation': initialisation, 'seed': seed})[0]
+    records = read_checkpoint(checkpoint_file, refit_configuration) if checkpoint_file is not None else {}
+    results = submit_tasks(pool, repetition_task, [(index, refit_repetition, (dataset_store, rep, estimator, initialisation, seed)) 
+                                                   for index, rep in enumerate(reps) if index not in records], 
+                           window = None if precision is None else 2, n_cpu = n_cpu)
+    successful = (lambda statistic: statistic >= cut_off) if correlation else (lambda statistic: statistic <= cut_off)
+    records, nreps_used = collect_repetitions(results, seed, nreps, records, checkpoint_file = checkpoint_file, 
+                                              successful = successful, precision = precision, n_cpu = n_cpu, configuration = refit_configuration)
+    if own_pool: 
+        pool.close()
+        pool.join()
+    
+    allreps_output = pd.DataFrame([records[rep] for rep in range(nreps_used)], columns = ['propfailed_estimates', 'statistic', 'mean_nfev', 'mean_nit', 'seed'])
+    allreps_output = allreps_output.rename(columns = {'statistic': 'correlations' if correlation else 'p_values'})
+    power_estimate = np.mean(successful(allreps_output.iloc[:, 1]))
+    print("\nPower with the stored datasets ({}, cut_off = {}): {}%".format(configuration['criterion'], cut_off, power_estimate*100))
+    print_power_interval(power_estimate, nreps_used, nreps, precision)
+    print("\nMean failed learning rate estimates: {}%".format(np.round(np.mean(allreps_output['propfailed_estimates'])*100, 2)))
+    print("Mean likelihood evaluations per participant ({}): {}; mean iterations: {}".format(estimator,
+          np.round(np.mean(allreps_output['mean_nfev']), 1), np.round(np.mean(allreps_output['mean_nit']), 1)))
+    return allreps_output, power_estimate
+
+def sample_size_search(target_power = 0.8, criterion = 'correlation', search = 'npp', start = 20, minimum = 5, maximum = 1000, 
+                       resolution = 1, seed = None, high_performance = False, pool = None, checkpoint_file = None, **power_arguments): 
+    """
+    Parameters
+    ----------
+    target_power : float (element within [0, 1]), optional
+        The power that should be reached. The default is 0.8.
+    criterion : string, optional
+        'correlation' (see function power_estimation_correlation()) or 'group_difference' (see function power_estimation_groupdifference()). 
+        The default is 'correlation'.
+    search : string, optional
+        The variable that is searched: 'npp' (number of participants, per group for the group difference criterion) or 'ntrials'. 
+        The default is 'npp'.
+    start : integer, optional
+        The first value of the search variable that is evaluated. The default is 20.
+    minimum, maximum : integer, optional
+        The smallest and largest value of the search variable that can be evaluated. The defaults are 5 and 1000.
+    resolution : integer, optional
+        The search stops when the minimal value is known up to this resolution (e.g. 10 trials). The default is 1.
+    seed : integer, optional
+        Master seed that is used for each evaluated value (common random numbers). When None, one seed is drawn for the whole search, 
+        or the seed in the checkpoint files of an interrupted search is used. The default is None.
+    high_performance : bool (True or False), optional
+        Defines whether multiple cores on the computer will be used. The default is False.
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes created with create_executor(); when None, one pool is created for the whole search. The default is None.
+    checkpoint_file : string, optional
+        When not None, each evaluated value gets its own checkpoint file: the value is added to the file name (e.g. Checkpoint_line0_npp40.csv). 
+        The default is None.
+    **power_arguments : 
+        Other arguments of the power function, e.g. ntrials, nreps, cut_off, precision.
+
+    Returns
+    -------
+    minimal_size : integer or None
+        The smallest evaluated value of the search variable with power >= target_power; None when the power at maximum is too low.
+    search_output : pandas DataFrame
+        The evaluated values of the search variable, with the power estimate and the number of repetitions used for each value.
+
+    Description
+    -----------
+    Function to find the smallest number of participants (or trials) that reaches the target power, with a number of power analyses 
+    that is logarithmic in the search range instead of one power analysis for each value: 
+        1. Bracketing: starting from 'start', the value is doubled until the target power is reached (or halved until it is not reached anymore).
+        2. Bisection: the interval between the largest value that does not reach the target power and the smallest value that does 
+            is halved until it is smaller than or equal to 'resolution'.
+    All evaluated values use the same master seed, so the same design and the same repetition seeds are used for each value 
+    (common random numbers): the difference in power between two values is then mostly due to the value itself and not to simulation noise, 
+    which keeps the estimated power curve close to monotone during the bisection.
+    """
+    import pandas as pd
+    if seed is None and checkpoint_file is not None: 
+        # an interrupted search is resumed with the seed of the values that it already evaluated
+        name, extension = os.path.splitext(checkpoint_file)
+        seed = checkpoint_seed(sorted(glob.glob('{}_{}*{}'.format(glob.escape(name), search, extension))))
+    if seed is None: seed = np.random.randint(0, 2**31 - 1)
+    power_function = power_estimation_correlation if criterion == 'correlation' else power_estimation_groupdifference
+    search_argument = search if search == 'ntrials' or criterion == 'correlation' else 'npp_per_group'
+    own_pool = pool is None
+    if own_pool: pool = create_executor(number_of_workers(high_performance))
+    evaluated = {}
+    def reaches_target(size): 
+        if size not in evaluated: 
+            print("\nSample size search: power with {} = {}".format(search, size))
+            size_checkpoint_file = None
+            if checkpoint_file is not None: 
+                name, extension = os.path.splitext(checkpoint_file)
+                size_checkpoint_file = '{}_{}{}{}'.format(name, search, size, extension)
+            output, power_estimate = power_function(high_performance = high_performance, pool = pool, seed = seed, 
+                                                    checkpoint_file = size_checkpoint_file, **{search_argument: size}, **power_arguments)
+            evaluated[size] = (power_estimate, output.shape[0])
+        return evaluated[size][0] >= target_power
+    
+    # 1. bracketing: lower never reaches the target power, upper does
+    lower, upper, size = minimum - 1, None, min(max(start, minimum), maximum)
+    if reaches_target(size): 
+        upper = size
+        while upper > minimum: 
+            size = max(minimum, upper // 2)
+            if reaches_target(size): upper = size
+            else: 
+                lower = size
+                break
+    else: 
+        lower = size
+        while lower < maximum: 
+            size = min(maximum, lower * 2)
+            if reaches_target(size): 
+                upper = size
+                break
+            else: lower = size
+    # 2. bisection
+    if upper is not None: 
+        while upper - lower > resolution: 
+            size = (lower + upper) // 2
+            if reaches_target(size): upper = size
+            else: lower = size
+    if own_pool: 
+        pool.close()
+        pool.join()
+    
+    search_output = pd.DataFrame([(size, power_estimate, nreps_used) for size, (power_estimate, nreps_used) in sorted(evaluated.items())], 
+                                 columns = [search, 'power', 'nreps_used'])
+    if upper is None: print("\nThe target power of {}% is not reached with {} = {}.".format(target_power*100, search, maximum))
+    else: print("\nMinimal {} to reach a power of {}%: {} ({} power analyses).".format(search, target_power*100, upper, len(evaluated)))
+    return upper, search_output
+
+def power_curve(npp_values = np.arange(10, 201, 10), criterion = 'correlation', pool_size = None, ntrials = 480, nreversals = 12, 
+                reward_probability = 0.8, nreps = 100, cut_off = 0.7, cohens_d = 0.5, estimator = 'Nelder-Mead', initialisation = 'random', 
+                high_performance = False, pool = None, seed = None, design_randomisation = 'fixed', nstimuli = 2, nactions = 2): 
+    """
+    Parameters
+    ----------
+    npp_values : numpy array, optional
+        The numbers of participants (per group for the group difference criterion) for which the power is calculated. 
+        The default is 10, 20, ..., 200.
+    criterion : string, optional
+        'correlation' or 'group_difference', see functions power_estimation_correlation() and power_estimation_groupdifference(). 
+        The default is 'correlation'.
+    pool_size : integer, optional
+        Number of hypothetical participants (per group) that are simulated and fitted. Should be clearly larger than the largest npp value, 
+        since cohorts are drawn without replacement from this pool. When None, 5 times the largest npp value is used. The default is None.
+    ntrials, nreversals, reward_probability : optional
+        The design, see function create_design(). The defaults are 480, 12 and 0.8.
+    nreps : integer, optional
+        Number of cohorts that are drawn for each npp value. The default is 100.
+    cut_off, cohens_d : float, optional
+        The success criterion of a cohort and the effect size, see the power functions. The defaults are 0.7 and 0.5.
+    estimator, initialisation : string, optional
+        Estimation settings, see function fit_participant().
+    high_performance : bool (True or False), optional
+        Defines whether multiple cores on the computer will be used to fit the pool. The default is False.
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes created with create_executor(); when None, a pool is created and closed within this function. The default is None.
+    seed : integer, optional
+        Master seed for the design, the participant pool and the drawn cohorts. The default is None.
+    design_randomisation : string, optional
+        'fixed' (all participants in the pool use the same design) or 'participant' (each participant uses its own design, see function 
+        select_design() in Functions.py). Since the pool is fitted as one repetition, 'repetition' is the same as 'fixed'. The default is 'fixed'.
+    nstimuli, nactions : integer, optional
+        Number of stimuli and responses of the task, see function create_design() in Functions.py. The defaults are 2 and 2.
+
+    Returns
+    -------
+    curve_output : pandas DataFrame
+        For each npp value: the power estimate and the mean proportion failed estimates over the drawn cohorts.
+    participant_pool : pandas DataFrame
+        The true and estimated parameters of each participant in the pool (and its group for the group difference criterion).
+
+    Description
+    -----------
+    Function to calculate the power for many numbers of participants at once. Since the hypothetical participants are independent draws 
+    from the same distributions, the data simulation and parameter estimation (the expensive part) is done only once, for a large pool of participants. 
+    For each npp value, nreps cohorts of npp participants are then drawn without replacement from this pool 
+    and the statistic of each cohort is calculated from the stored true and estimated learning rates 
+    (see functions correlation_statistic() and groupdifference_statistic()). 
+    The cost is thus one pool fit instead of nreps fits for each npp value. 
+    Note that all cohorts share the participants of one pool (and one design, unless design_randomisation = 'participant'): for npp values close to pool_size the cohorts overlap strongly 
+    and the power estimate depends on the pool, so pool_size should be several times the largest npp value.
+    """
+    import pandas as pd
+    npp_values = np.sort(np.asarray(npp_values, dtype = int))
+    if pool_size is None: pool_size = 5 * npp_values[-1]
+    pool_size = max(pool_size, npp_values[-1])
+    if seed is None: seed = np.random.randint(0, 2**31 - 1)
+    start_design = create_design(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability, rng = design_generator(seed), 
+                                 nstimuli = nstimuli, nactions = nactions)
+    n_cpu = number_of_workers(high_performance)
+    own_pool = pool is None
+    if own_pool: pool = create_executor(n_cpu)
+    # a pool of workers on several machines (see Distributed.py) knows how many workers it has
+    if hasattr(pool, 'number_of_workers'): n_cpu = pool.number_of_workers()
     
-    start_design = create_design(ntrials = ntrials, nreversals = nreversals, reward_probability = reward_probability)
-    if high_performance == True: n_cpu = cpu_count() - 2
-    else: n_cpu = 1
-    if __name__ == '__main__': 
-        # First: check what the power is when true parameters would be recoverable 
-        power = tt_ind_solve_power(nobs1 = npp_per_group, ratio = 1, effect_size = cohens_d, alpha = cut_off, power = None, 
-                                alternative = 'larger')
-        print("\nPower if estimates would be perfect: {}%".format(np.round(power, 4)*100))    
-        
-        # Calculate the mean_groupdifference based on cohens_d and with the s_pooled == 0.1
-            # formula: cohens_d = (mean1 - mean2)/s_pooled ==> cohens_d * s_pooled = (mean1 - mean2)
-            # thus with s_pooled == 0.1: cohens_d * 0.1 = group_difference
-        s_pooled = 0.1
-        group_difference = cohens_d * s_pooled 
-        LR_means = [0.5 - group_difference/2, 0.5 + group_difference/2]
-        LR_distributions = np.array([[LR_means[0], 0.1], [LR_means[1], 0.1]])
-        
-        inverseTemp_distribution = np.array([2.0, 1.0])
-        # mean and standard deviation for the true distributions that will be used: 
-            # assumed distribution learning rates: normal distribution with mean 0.5 and sd 0.1
-            # assumed distribution inverse temperatures: normal distribution with mean 2 and sd 1
-        pool = Pool(processes = n_cpu)
-        out = pool.starmap(groupdifference_repetition, [(inverseTemp_distribution, LR_distributions, npp_per_group, 
-                                                     ntrials, start_design, rep, nreps, n_cpu, False) for rep in range(nreps)])
-        # before calling pool.join(), should call pool.close() to indicate that there will be no new processing
+    # the participant pool: same distributions as in power_estimation_correlation() and power_estimation_groupdifference()
+    inverseTemp_distribution = np.array([2.0, 1.0])
+    if criterion == 'correlation': LR_distributions = np.array([[0.5, 0.1]])
+    else: 
+        group_difference = cohens_d * 0.1
+        LR_distributions = np.array([[0.5 - group_difference/2, 0.1], [0.5 + group_difference/2, 0.1]])
+    ngroups = LR_distributions.shape[0]
+    parameter_distributions = np.concatenate([np.tile([LR_distributions[group], inverseTemp_distribution], (pool_size, 1, 1)) for group in range(ngroups)])
+    print("Power curve: fitting a pool of {} participants.".format(ngroups*pool_size))
+    shared_block, design_descriptor = share_design(start_design)
+    # the pool is fitted as repetition 0 (the same participants as in repetition 0 of a power analysis with npp = pool_size)
+    try: 
+        rep, True_parameters, estimations, nfev, nit, telemetry = next(schedule_participants(pool, n_cpu, parameter_distributions, [0], seed, design_descriptor,
+                                                                                             estimator = estimator, initialisation = initialisation, 
+                                                                                             design_randomisation = 'participant' if design_randomisation == 'participant' else 'fixed',
+                                                                                             nactions = nactions))
+    # the shared design is also released when a task fails
+    finally: release_design(shared_block)
+    if own_pool: 
         pool.close()
         pool.join()
-        allreps_output = pd.DataFrame(out, columns = ['propfailed_estimates', 'p_values'])
-        mean_propfailed_estimates = np.mean(allreps_output['propfailed_estimates'])
-        # check for which % of repetitions the group difference was significant 
-        # note that we're working with a one-sided t-test (if interested in two-sided need to divide the p-value obtained at each rep with 2)
-        power_estimate = np.mean((allreps_output['p_values'] <= cut_off))
-        print(str("\nPower to detect a significant group difference when the estimated effect size d = {}".format(cohens_d)
-              + " with {} trials and {} participants per group: {}%".format(ntrials, 
-                                                                         npp_per_group, power_estimate*100)))
-        print("\nMean failed learning rate estimates per repetition: {}%".format(np.round(mean_propfailed_estimates*100, 2)))
-        return allreps_output, power_estimate
+    
+    # draw nreps cohorts for each npp value from the pool and calculate the statistic of each cohort
+    True_LRs, LRestimations = True_parameters[:, 0].reshape(ngroups, pool_size), estimations[:, 0].reshape(ngroups, pool_size)
+    failed = LRestimations < 0.01
+    # the cohorts are drawn with their own stream of random numbers (see function design_generator() in Functions.py)
+    rng = np.random.default_rng(np.random.SeedSequence(int(seed), spawn_key = (2, )))
+    curve = []
+    for npp in npp_values: 
+        statistics, propfailed = np.empty(nreps), np.empty(nreps)
+        for rep in range(nreps): 
+            cohort = np.array([rng.choice(pool_size, size = npp, replace = False) for group in range(ngroups)])
+            cohort_LRs, cohort_estimations, cohort_failed = [np.take_along_axis(values, cohort, axis = 1) for values in [True_LRs, LRestimations, failed]]
+            if criterion == 'correlation': 
+                propfailed[rep], statistics[rep] = correlation_statistic(cohort_LRs[0], cohort_estimations[0], cohort_failed[0])
+            else: propfailed[rep], statistics[rep] = groupdifference_statistic(cohort_estimations, cohort_failed)
+        power_estimate = np.mean(statistics >= cut_off) if criterion == 'correlation' else np.mean(statistics <= cut_off)
+        curve.append((npp, power_estimate, np.mean(propfailed)))
+    curve_output = pd.DataFrame(curve, columns = ['npp', 'power', 'propfailed_estimates'])
+    participant_pool = pd.DataFrame({'group': np.repeat(np.arange(ngroups), pool_size), 'True_LRs': True_parameters[:, 0], 
+                                     'True_inverseTemps': True_parameters[:, 1], 'LRestimations': estimations[:, 0], 
+                                     'inverseTempestimations': estimations[:, 1]})
+    print(curve_output.to_string(index = False))
+    return curve_output, participant_pool
+
+def surrogate_features(configurations, axes, centers): 
+    """Design matrix of the surrogate power model: an intercept and the centred logarithm of each axis (e.g. npp, ntrials, cohens_d)."""
+    configurations = np.atleast_2d(np.asarray(configurations, dtype = float))
+    return np.column_stack([np.ones(configurations.shape[0])] + [np.log(configurations[:, axis]) - centers[axis] for axis in axes])
+
+def fit_surrogate(configurations, nsuccesses, nreps, axes, centers, prior_sd = 10): 
+    """
+    Parameters
+    ----------
+    configurations : numpy array, shape = (nconfigurations X naxes)
+        The simulated configurations, e.g. with columns npp, ntrials (and cohens_d).
+    nsuccesses, nreps : numpy array, shape = (nconfigurations, )
+        The number of successful repetitions and the number of repetitions of each simulated configuration.
+    axes : list
+        The columns of configurations that are included in the model (the axes that vary).
+    centers : numpy array, shape = (naxes, )
+        The logarithms that are subtracted from each axis, which keeps the intercept and slopes uncorrelated.
+    prior_sd : float, optional
+        Standard deviation of a normal prior on each coefficient, which keeps the coefficients finite 
+        when all simulated configurations have power 0 or 1. The default is 10.
+
+    Returns
+    -------
+    model : dict
+        'coefficients' and their 'covariance' (the inverse of the Fisher information), with 'axes' and 'centers'.
+
+    Description
+    -----------
+    Function to fit the surrogate power model power = 1 / (1 + exp(-(b0 + b1 * log(npp) + b2 * log(ntrials) + ...))) to the repetitions 
+    of the simulated configurations (binomial likelihood). The slopes are restricted to be >= 0, so the power can only increase 
+    with the number of participants, the number of trials and the effect size.
+    """
+    X = surrogate_features(configurations, axes, centers)
+    nsuccesses, nreps = np.asarray(nsuccesses, dtype = float), np.asarray(nreps, dtype = float)
+    def negative_log_posterior(coefficients): 
+        linear_predictor = X @ coefficients
+        # log(1 + exp(x)) without overflow
+        log_likelihood = np.sum(nsuccesses * linear_predictor - nreps * np.logaddexp(0, linear_predictor))
+        gradient = X.T @ (nreps * special.expit(linear_predictor) - nsuccesses) + coefficients / prior_sd**2
+        return -log_likelihood + np.sum(coefficients**2) / (2 * prior_sd**2), gradient
+    optimization_output = optimize.minimize(negative_log_posterior, np.zeros(X.shape[1]), jac = True, method = 'L-BFGS-B', 
+                                            bounds = [(None, None)] + [(0, None)] * len(axes))
+    coefficients = optimization_output.x
+    power = special.expit(X @ coefficients)
+    fisher_information = (X.T * (nreps * power * (1 - power))) @ X + np.eye(X.shape[1]) / prior_sd**2
+    return {'coefficients': coefficients, 'covariance': np.linalg.inv(fisher_information), 'axes': axes, 'centers': centers}
+
+def predict_surrogate(model, configurations, confidence = 0.95): 
+    """
+    Parameters
+    ----------
+    model : dict
+        The surrogate power model, see function fit_surrogate().
+    configurations : numpy array, shape = (nconfigurations X naxes)
+        The configurations for which the power is predicted.
+    confidence : float, optional
+        The confidence level of the interval. The default is 0.95.
+
+    Returns
+    -------
+    power, lower, upper : numpy array, shape = (nconfigurations, )
+        The predicted power and its confidence interval.
+    linear_predictor, standard_error : numpy array, shape = (nconfigurations, )
+        The prediction on the logit scale and its standard error.
+    """
+    X = surrogate_features(configurations, model['axes'], model['centers'])
+    linear_predictor = X @ model['coefficients']
+    standard_error = np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', X, model['covariance'], X), 0))
+    z = stat.norm.ppf(0.5 + confidence / 2)
+    return (special.expit(linear_predictor), special.expit(linear_predictor - z * standard_error), 
+            special.expit(linear_predictor + z * standard_error), linear_predictor, standard_error)
+
+def surrogate_power(npp_values, ntrials_values, cohens_d_values = None, criterion = 'correlation', target_power = 0.8, nsimulations = 8, 
+                    seed = None, high_performance = False, pool = None, checkpoint_file = None, **power_arguments): 
+    """
+    Parameters
+    ----------
+    npp_values, ntrials_values : numpy array
+        The grid of numbers of participants (per group for the group difference criterion) and numbers of trials.
+    cohens_d_values : numpy array, optional
+        The effect sizes of the grid (only for the group difference criterion). When None, the cohens_d in power_arguments is used. 
+        The default is None.
+    criterion : string, optional
+        'correlation' or 'group_difference', see functions power_estimation_correlation() and power_estimation_groupdifference(). 
+        The default is 'correlation'.
+    target_power : float, optional
+        The power around which the surrogate should be most precise. The default is 0.8.
+    nsimulations : integer, optional
+        Number of configurations of the grid for which a power analysis is done (at least the corners and the centre of the grid). The default is 8.
+    seed : integer, optional
+        Master seed that is used for each simulated configuration (common random numbers). When None, one seed is drawn, 
+        or the seed in the checkpoint files of an interrupted run is used. The default is None.
+    high_performance : bool (True or False), optional
+        Defines whether multiple cores on the computer will be used. The default is False.
+    pool : multiprocessing.Pool, optional
+        Pool of worker processes created with create_executor(); when None, one pool is created for all simulations. The default is None.
+    checkpoint_file : string, optional
+        When not None, each simulated configuration gets its own checkpoint file (e.g. Checkpoint_line0_npp40_ntrials200.csv). The default is None.
+    **power_arguments : 
+        Other arguments of the power function, e.g. nreps, cut_off, nreversals, precision.
+
+    Returns
+    -------
+    surface : pandas DataFrame
+        For each configuration of the grid: the predicted power with its 95% confidence interval, 
+        and for the simulated configurations the simulated power and the number of repetitions used.
+    model : dict
+        The fitted surrogate power model, see function fit_surrogate(); predict_surrogate() predicts the power of other configurations.
+
+    Description
+    -----------
+    Function to estimate the power for a whole grid of designs with a power analysis for only a few of them. The power of the simulated 
+    configurations is described by a smooth, monotone model: logistic in log(npp), log(ntrials) and log(cohens_d) (see function fit_surrogate()), 
+    which then predicts the power of every configuration of the grid, with a confidence interval from the Fisher information, at negligible cost. 
+    The configurations are chosen adaptively: after the corners and the centre of the grid, each next power analysis is done for the 
+    configuration for which it is least certain on which side of target_power the power lies (the largest probability under the model that 
+    the predicted power is on the wrong side), so the simulations concentrate where the power crosses target_power. 
+    Note that the model assumes that the power increases with each axis; for the correlation criterion this only holds when the recovered 
+    learning rates correlate above cut_off with the true ones for a large number of trials.
+    """
+    import pandas as pd
+    power_function = power_estimation_correlation if criterion == 'correlation' else power_estimation_groupdifference
+    npp_argument = 'npp' if criterion == 'correlation' else 'npp_per_group'
+    if seed is None and checkpoint_file is not None: 
+        # an interrupted run is resumed with the seed of the configurations that it already simulated
+        name, extension = os.path.splitext(checkpoint_file)
+        seed = checkpoint_seed(sorted(glob.glob('{}_{}*{}'.format(glob.escape(name), npp_argument, extension))))
+    if seed is None: seed = np.random.randint(0, 2**31 - 1)
+    if cohens_d_values is None: cohens_d_values = [power_arguments.pop('cohens_d', 0.5)]
+    else: power_arguments.pop('cohens_d', None)
+    grid_values = [np.unique(npp_values), np.unique(ntrials_values), np.unique(cohens_d_values)]
+    if criterion == 'correlation': grid_values = grid_values[:2]
+    names = ['npp', 'ntrials', 'cohens_d'][:len(grid_values)]
+    grid = np.array(np.meshgrid(*grid_values, indexing = 'ij')).reshape(len(grid_values), -1).T
+    # only the axes with more than one value are in the model; the logarithms are centred on the middle of the grid
+    axes = [axis for axis in range(len(grid_values)) if len(grid_values[axis]) > 1]
+    centers = np.array([np.mean(np.log([values[0], values[-1]])) for values in grid_values])
+    own_pool = pool is None
+    if own_pool: pool = create_executor(number_of_workers(high_performance))
+    simulated = {}
+    def simulate(index): 
+        configuration = dict(zip(names, grid[index]))
+        arguments = {npp_argument: int(configuration['npp']), 'ntrials': int(configuration['ntrials'])}
+        if criterion == 'group_difference': arguments['cohens_d'] = float(configuration['cohens_d'])
+        print("\nSurrogate power model: power analysis for {}".format(arguments))
+        configuration_checkpoint_file = None
+        if checkpoint_file is not None: 
+            name, extension = os.path.splitext(checkpoint_file)
+            configuration_checkpoint_file = '{}_{}{}'.format(name, '_'.join('{}{}'.format(key, value) for key, value in arguments.items()), extension)
+        output, power_estimate = power_function(high_performance = high_performance, pool = pool, seed = seed, 
+                                                checkpoint_file = configuration_checkpoint_file, **arguments, **power_arguments)
+        simulated[index] = (power_estimate * output.shape[0], output.shape[0])
+    def fit(): 
+        indices = sorted(simulated)
+        return fit_surrogate(grid[indices], [simulated[index][0] for index in indices], [simulated[index][1] for index in indices], axes, centers)
+    
+    # 1. the corners and the centre of the grid
+    corners = np.array(np.meshgrid(*[[values[0], values[-1]] for values in grid_values], indexing = 'ij')).reshape(len(grid_values), -1).T
+    centre = np.exp(centers)
+    initial = [int(np.argmin(np.sum((np.log(grid) - np.log(point))**2, axis = 1))) for point in np.vstack([corners, centre])]
+    for index in list(dict.fromkeys(initial))[:max(nsimulations, 1)]: simulate(index)
+    # 2. adaptive: the configuration for which it is most likely that the power is on the other side of target_power than predicted
+    while len(simulated) < min(nsimulations, grid.shape[0]): 
+        power, lower, upper, linear_predictor, standard_error = predict_surrogate(fit(), grid)
+        misclassification = stat.norm.cdf(-np.abs(linear_predictor - special.logit(target_power)) / np.maximum(standard_error, 1e-12))
+        misclassification[sorted(simulated)] = -1
+        simulate(int(np.argmax(misclassification)))
+    if own_pool: 
+        pool.close()
+        pool.join()
+    
+    model = fit()
+    power, lower, upper, linear_predictor, standard_error = predict_surrogate(model, grid)
+    surface = pd.DataFrame(grid, columns = names)
+    for column in ['npp', 'ntrials']: surface[column] = surface[column].astype(int)
+    surface['power'], surface['power_lower'], surface['power_upper'] = power, lower, upper
+    surface['simulated_power'] = [simulated[index][0] / simulated[index][1] if index in simulated else np.nan for index in range(grid.shape[0])]
+    surface['nreps_used'] = [simulated[index][1] if index in simulated else 0 for index in range(grid.shape[0])]
+    print("\nSurrogate power model from {} power analyses (coefficients {}):".format(len(simulated), np.round(model['coefficients'], 3)))
+    print(surface.to_string(index = False))
+    return surface, model
 
 #%%
 
+# columns of the Input_file
+input_columns = ['ntrials', 'nreversals', 'npp', 'reward_probability', 'full_speed', 'criterion', 
+                 'significance_cutoff', 'cohens_d', 'nreps', 'output_folder']
+# optional columns and the value that is used when the column is absent
+optional_columns = {'estimator': 'Nelder-Mead', 'initialisation': 'random', 'scheduling': 'repetition', 'seed': None, 'checkpoint': 0, 
+                    'precision': None, 'target_power': None, 'search': 'npp', 
+                    'curve': None, 'cache_folder': None, 'cache_size': None, 'cache_age': None, 'design_randomisation': 'fixed',
+                    'instrument': 0, 'queue_folder': None, 'surrogate': None, 'dataset_store': None, 'nstimuli': 2, 'nactions': 2}
 
-import os 
+def row_settings(parameter_file, i): 
+    """
+    Parameters
+    ----------
+    parameter_file : pandas DataFrame
+        The Input_file.
+    i : integer
+        The row of the Input_file.
 
-if __name__ == '__main__': 
+    Returns
+    -------
+    settings : dict
+        The settings of this row: the values of input_columns (with output_folder as plot_folder), the options for the power functions, 
+        the checkpoint file, the modes target_power, search and curve, and queue_folder. None when the values in this row are not valid.
+    """
+    import pandas as pd
+    settings = dict(zip(input_columns[:-1] + ['plot_folder'], parameter_file.loc[i, input_columns]))
+    options = {column: (parameter_file.loc[i, column] if column in parameter_file.columns else default) 
+               for column, default in optional_columns.items()}
+    # an empty cell in an optional column means: use the default
+    options = {column: (optional_columns[column] if pd.isna(value) else value) for column, value in options.items()}
+    variables_fine = check_input_parameters(*[settings[column] for column in input_columns[:-1] + ['plot_folder']], **options)
+    if variables_fine == 0: return None
+    # with checkpoint = 1 each finished repetition is written to Checkpoint_line{i}.csv in the output folder; 
+    # running the Input_file again then resumes this row where it was interrupted
+    settings['checkpoint_file'] = os.path.join(settings['plot_folder'], 'Checkpoint_line{}.csv'.format(i)) if options.pop('checkpoint') == 1 else None
+    if options['seed'] is not None: options['seed'] = int(options['seed'])
+    options['nstimuli'], options['nactions'] = int(options['nstimuli']), int(options['nactions'])
+    # the numbers of participants of a curve row as text of integers (a single number is read as e.g. 20.0 when other rows have no curve)
+    if options['curve'] is not None: options['curve'] = ' '.join(str(int(float(value))) for value in str(options['curve']).split())
+    # with instrument = 1 the instrumentation of each participant is saved in Instrumentation_line{i}.csv (and a summary in Instrumentation_line{i}_summary.csv)
+    options['instrument'] = options['instrument'] == 1
+    for mode in ['target_power', 'search', 'curve', 'surrogate', 'queue_folder', 'dataset_store']: settings[mode] = options.pop(mode)
+    settings['row'], settings['options'] = i, options
+    return settings
+
+def read_rows(parameter_file): 
+    """Function that returns the settings of each row of the Input_file (see function row_settings()), up to the first row with values that are not valid."""
+    rows = []
+    for i in range(parameter_file.shape[0]): 
+        settings = row_settings(parameter_file, i)
+        if settings is None: break
+        rows.append(settings)
+    return rows
+
+def row_participants(settings): 
+    """Number of participants in one repetition of a row: npp, or 2 x npp for the group difference criterion (npp per group)."""
+    return settings['npp'] * (2 if settings['criterion'] == 'group_difference' else 1)
+
+def row_cost(settings): 
+    """Estimated cost of one repetition of a row, in trials that are simulated and fitted: ntrials x the number of participants."""
+    return settings['ntrials'] * row_participants(settings)
+
+def row_power_analyses(settings): 
+    """
+    Parameters
+    ----------
+    settings : dict
+        The settings of a row of the Input_file (see function row_settings()).
+
+    Returns
+    -------
+    power_analyses : list
+        (nreps, participants per repetition, ntrials, scheduling) for each power analysis of the row.
+
+    Description
+    -----------
+    Function to list the work of a row before it is done (see function predict_row()). A power row is one power analysis, 
+    without the repetitions that are already in its checkpoint file. A curve row fits one pool of 5 x the largest npp participants 
+    (see function power_curve()). The values of a search row are only known during the search: one bracketing step and a bisection 
+    down to 1 around the start value are assumed (see function sample_size_search()). A surrogate row simulates the corners and the centre 
+    of its grid and then configurations that are assumed to cost as much as the average configuration, 8 in total (see function surrogate_power()). 
+    With a target precision, or when repetitions are read from the cache, the work is an upper bound.
+    """
+    s, options = settings, settings['options']
+    nreps, ntrials, scheduling = s['nreps'], s['ntrials'], options['scheduling']
+    ngroups = 2 if s['criterion'] == 'group_difference' else 1
+    if s['curve'] is not None: 
+        return [(1, ngroups * 5 * np.max(np.array(str(s['curve']).split(), dtype = int)), ntrials, 'participant')]
+    if s['surrogate'] is not None: 
+        grid_values = [np.array(values.split(), dtype = float) for values in str(s['surrogate']).split('/')]
+        npp_values, ntrials_values = np.unique(grid_values[0].astype(int)), np.unique(grid_values[1].astype(int))
+        ncohens_d = len(np.unique(grid_values[2])) if len(grid_values) > 2 else 1
+        # the corners (for each corner of the cohens_d axis) and the configuration closest to the centre
+        corners = [(npp, ntrials) for npp in {npp_values[0], npp_values[-1]} for ntrials in {ntrials_values[0], ntrials_values[-1]}] * min(ncohens_d, 2)
+        centre = tuple(values[np.argmin(np.abs(np.log(values) - np.mean(np.log(values[[0, -1]]))))] for values in [npp_values, ntrials_values])
+        nsimulations = min(8, len(npp_values) * len(ntrials_values) * ncohens_d)
+        configurations = (corners + [centre])[:nsimulations]
+        configurations += [(int(np.mean(npp_values)), int(np.mean(ntrials_values)))] * (nsimulations - len(configurations))
+        return [(nreps, ngroups * npp, ntrials, scheduling) for npp, ntrials in configurations]
+    if s['target_power'] is not None: 
+        start = s['npp'] if s['search'] == 'npp' else ntrials
+        return [(nreps, ngroups * s['npp'], ntrials, scheduling)] * (2 + int(np.ceil(np.log2(max(start, 2)))))
+    done = read_checkpoint(s['checkpoint_file']) if s['checkpoint_file'] is not None else {}
+    return [(len([rep for rep in range(nreps) if rep not in done]), row_participants(s), ntrials, scheduling)]
+
+def predict_row(settings, calibration, n_cpu): 
+    """
+    Parameters
+    ----------
+    settings : dict
+        The settings of a row of the Input_file (see function row_settings()).
+    calibration : dict
+        The costs measured on this machine, see function calibrate_costs() in Benchmarks.py.
+    n_cpu : integer
+        Number of worker processes that do the row.
+
+    Returns
+    -------
+    prediction : dict
+        'participant_fits' (number of participants that are simulated and estimated), 'cpu_seconds' (their total duration), 
+        'wall_seconds' (duration with n_cpu workers), 'main_memory' (the designs and results in the main process), 
+        'worker_memory' (the largest task of one worker), 'peak_memory' (the memory of the main process and the n_cpu workers 
+        together, the memory of the python processes themselves included) and 'store_size' (the files of the dataset store of the row, 
+        0 without a dataset_store), all in seconds and bytes.
+
+    Description
+    -----------
+    Function to predict the duration and memory of a row before it is started. One participant costs its simulation plus 
+    nfev likelihood evaluations of its estimator and initialisation, as measured for a task with the same nstimuli and nactions (see function calibrate_costs()). The tasks are done in waves of n_cpu tasks: with scheduling 'repetition' 
+    a task is a repetition, with 'participant' a chunk of participants (see function schedule_participants()). 
+    The memory of a worker is that of a python process with the kernels plus its largest task: the data of the participants 
+    of one repetition (or one participant) and the allocations of one estimation. A dataset store takes one bit per trial for each of the 
+    5 columns of the data with 2 stimuli and 2 responses, and one byte per trial otherwise (see DatasetStore.py).
+    """
+    options = settings['options']
+    task, design_randomisation = (options['nstimuli'], options['nactions']), options['design_randomisation']
+    fit_task = (options['estimator'], options['initialisation']) + task
+    process_memory = calibration['process_memory'] or 0
+    prediction = {'participant_fits': 0, 'cpu_seconds': 0.0, 'wall_seconds': 0.0, 'main_memory': 0.0, 'worker_memory': 0.0, 'store_size': 0.0}
+    for nreps, npp, ntrials, scheduling in row_power_analyses(settings): 
+        participant_seconds = (max(np.polyval(calibration['simulation'][task], ntrials), 0) 
+                               + calibration['nfev'][fit_task] * max(np.polyval(calibration['evaluation'][fit_task], ntrials), 0))
+        estimation_memory = max(np.polyval(calibration['memory'][fit_task], ntrials), 0)
+        if scheduling == 'participant': 
+            chunksize = max(1, int(np.ceil(nreps * npp / (4 * n_cpu))))
+            wall_seconds = np.ceil(np.ceil(nreps * npp / chunksize) / n_cpu) * chunksize * participant_seconds
+            worker_memory = estimation_memory + ntrials * 5 * 8
+        else: 
+            wall_seconds = np.ceil(nreps / n_cpu) * npp * participant_seconds
+            # the responses of all participants of the repetition (and their own designs with design_randomisation = 'participant')
+            worker_memory = estimation_memory + npp * ntrials * 8 * (6 if design_randomisation == 'participant' else 1)
+        # the design (one per repetition with design_randomisation = 'repetition') and the true and estimated parameters of each participant
+        main_memory = ntrials * 5 * 8 * (nreps if design_randomisation == 'repetition' else 1) + nreps * npp * 8 * 4
+        prediction['participant_fits'] += nreps * npp
+        prediction['cpu_seconds'] += nreps * npp * participant_seconds
+        prediction['wall_seconds'] += wall_seconds
+        # the power analyses of a row are done one after another
+        prediction['main_memory'] = max(prediction['main_memory'], main_memory)
+        prediction['worker_memory'] = max(prediction['worker_memory'], worker_memory)
+    if settings['dataset_store'] is not None: 
+        # the whole store is made at once (the repetitions in a checkpoint file included): the data, true parameters and stored flags
+        nreps, npp, ntrials = settings['nreps'], row_participants(settings), settings['ntrials']
+        trial_bytes = np.ceil(ntrials / 8) if max(task) <= 2 else ntrials
+        prediction['store_size'] = nreps * npp * (5 * trial_bytes + 2 * 8 + 1)
+    prediction['peak_memory'] = (n_cpu + 1) * process_memory + prediction['main_memory'] + n_cpu * prediction['worker_memory']
+    return prediction
+
+def dry_run(parameter_file, sequential = False, output_file = None): 
+    """
+    Parameters
+    ----------
+    parameter_file : pandas DataFrame
+        The Input_file.
+    sequential : bool, optional
+        Whether the rows will be done one after another (see function run_input_file()). The default is False.
+    output_file : string, optional
+        When not None, the predictions are saved in this csv file. The default is None.
+
+    Returns
+    -------
+    predictions : pandas DataFrame
+        For each row of the Input_file: its mode, number of workers, number of participant fits, CPU time, wall time, peak memory and the size of its dataset store.
+
+    Description
+    -----------
+    Function to predict the duration and memory of each row of the Input_file before any power analysis is started, e.g. to request 
+    the right allocation on a cluster. The costs of the simulation and the estimation are measured on this machine by a short calibration 
+    (see function calibrate_costs() in Benchmarks.py), so run the dry run on the kind of machine that will do the power analysis. 
+    Rows with a queue_folder are predicted for the workers that are active in the queue folder at this moment (at least one). 
+    When all rows are done at once, they share the workers: the total wall time is then at least the total CPU time divided by the workers 
+    and at least the wall time of the longest row, and the memory of the rows adds up.
+    """
+    import pandas as pd
+    # imported here: the calibration is only needed for a dry run
+    from Benchmarks import calibrate_costs
+    from Distributed import alive_workers
+    rows = read_rows(parameter_file)
+    if len(rows) == 0: return pd.DataFrame()
+    # each estimator is calibrated with each start point that a row uses it with
+    calibration = calibrate_costs(fit_settings = tuple(sorted({(settings['options']['estimator'], settings['options']['initialisation']) for settings in rows})), 
+                                  tasks = tuple(sorted({(settings['options']['nstimuli'], settings['options']['nactions']) for settings in rows})))
+    print("Calibration on this machine ({} backend) took {} seconds.".format(calibration['backend'], np.round(calibration['calibration_seconds'], 1)))
+    local_cpu = max([number_of_workers(settings['full_speed']) for settings in rows if settings['queue_folder'] is None] + [1])
+    predictions = []
+    for settings in rows: 
+        if settings['queue_folder'] is not None: 
+            n_cpu = max(1, len(alive_workers(settings['queue_folder']))) if os.path.isdir(os.path.join(settings['queue_folder'], 'workers')) else 1
+        # also when all rows are done at once, a row uses at most the workers that its full_speed asks for (see RowPool)
+        else: n_cpu = number_of_workers(settings['full_speed'])
+        mode = ('curve' if settings['curve'] is not None else 'surrogate' if settings['surrogate'] is not None 
+                else 'search' if settings['target_power'] is not None else 'power')
+        prediction = predict_row(settings, calibration, n_cpu)
+        # the workers of a queue folder run on other machines: only the main process uses memory on this machine
+        if settings['queue_folder'] is not None: prediction['peak_memory'] = (calibration['process_memory'] or 0) + prediction['main_memory']
+        predictions.append(dict({'row': settings['row'], 'mode': mode, 'criterion': settings['criterion'], 'ntrials': settings['ntrials'], 
+                                 'npp': settings['npp'], 'nreps': settings['nreps'], 'estimator': settings['options']['estimator'], 
+                                 'workers': n_cpu, 'queue_folder': settings['queue_folder']}, **prediction))
+    predictions = pd.DataFrame(predictions)
+    table = predictions[['row', 'mode', 'criterion', 'ntrials', 'npp', 'nreps', 'estimator', 'workers', 'participant_fits']].copy()
+    table['cpu_hours'] = np.round(predictions['cpu_seconds'] / 3600, 3)
+    table['wall_minutes'] = np.round(predictions['wall_seconds'] / 60, 2)
+    # the memory on this machine
+    table['peak_memory_MB'] = np.round(predictions['peak_memory'] / 2**20).astype(int)
+    # the disk space of the dataset stores (one byte instead of one bit per trial with more than 2 stimuli or responses)
+    if (predictions['store_size'] > 0).any(): table['store_MB'] = np.round(predictions['store_size'] / 2**20, 1)
+    print("\nPredicted cost of each row of the Input_file:")
+    print(table.to_string(index = False))
+    if calibration['process_memory'] is None: print("The memory of the python processes themselves is not included (not available on this system).")
+    if (predictions['mode'] == 'search').any() or (predictions['mode'] == 'surrogate').any(): 
+        print("The evaluated values of search and surrogate rows are only known while they run: their prediction is a rough estimate.")
+    local = predictions.loc[predictions['queue_folder'].isna()]
+    if sequential: 
+        wall_seconds, peak_memory = predictions['wall_seconds'].sum(), predictions['peak_memory'].max()
+    else: 
+        # rows with a queue folder run on other machines, at the same time as the local rows
+        wall_seconds = max([local['cpu_seconds'].sum() / local_cpu, local['wall_seconds'].max() if local.shape[0] > 0 else 0] 
+                           + predictions.loc[predictions['queue_folder'].notna(), 'wall_seconds'].tolist())
+        peak_memory = ((local_cpu + 1) * (calibration['process_memory'] or 0) + local['main_memory'].sum() 
+                       + local_cpu * (local['worker_memory'].max() if local.shape[0] > 0 else 0))
+    print("\nPredicted total ({}): {} minutes, peak memory on this machine {} MB with {} local workers.".format(
+        'rows one after another' if sequential else 'all rows at once', np.round(wall_seconds / 60, 2), int(np.round(peak_memory / 2**20)), local_cpu))
+    if output_file is not None: 
+        predictions.to_csv(output_file, sep = ';', index = False)
+        print("Predictions saved in {}".format(output_file))
+    return predictions
+
+def compute_row(settings, pool): 
+    """
+    Parameters
+    ----------
+    settings : dict
+        The settings of a row of the Input_file (see function row_settings()).
+    pool : multiprocessing.Pool, DirectoryPool or RowPool
+        The pool that executes the tasks of this row.
+
+    Returns
+    -------
+    result : tuple
+        ('curve', curve_output, participant_pool), ('surrogate', surface, model), ('search', minimal_size, search_output) 
+        or ('power', output, power_estimate), depending on the mode of the row.
+
+    Description
+    -----------
+    Function to do the power analysis of one row of the Input_file. The outputs and the plot are made by function save_row().
+    """
+    s, options = settings, settings['options']
+    i, criterion, full_speed = s['row'], s['criterion'], s['full_speed']
+    print("Power estimation for row {} in the input_file has begun, time for coffee whilst waiting :).".format(i))
+    if s['curve'] is not None: 
+        # power curve mode: the power for each npp in the curve column (separated by spaces), from one fitted pool of participants
+        curve_output, participant_pool = power_curve(npp_values = np.array(str(s['curve']).split(), dtype = int), criterion = criterion, 
+                                                     ntrials = s['ntrials'], nreversals = s['nreversals'], reward_probability = s['reward_probability'], 
+                                                     nreps = s['nreps'], cut_off = s['significance_cutoff'], cohens_d = s['cohens_d'], 
+                                                     estimator = options['estimator'], initialisation = options['initialisation'], 
+                                                     high_performance = full_speed, pool = pool, seed = options['seed'], 
+                                                     design_randomisation = options['design_randomisation'], 
+                                                     nstimuli = options['nstimuli'], nactions = options['nactions'])
+        return 'curve', curve_output, participant_pool
+    if s['surrogate'] is not None: 
+        # surrogate mode: the power for a grid of npp, ntrials (and cohens_d) values, separated by /, from a few power analyses
+        grid_values = [np.array(values.split(), dtype = float) for values in str(s['surrogate']).split('/')]
+        surface, model = surrogate_power(grid_values[0].astype(int), grid_values[1].astype(int), 
+                                         cohens_d_values = grid_values[2] if len(grid_values) > 2 else None, criterion = criterion, 
+                                         target_power = 0.8 if s['target_power'] is None else s['target_power'], 
+                                         high_performance = full_speed, pool = pool, checkpoint_file = s['checkpoint_file'], 
+                                         nreps = s['nreps'], cut_off = s['significance_cutoff'], cohens_d = s['cohens_d'], 
+                                         nreversals = s['nreversals'], reward_probability = s['reward_probability'], **options)
+        return 'surrogate', surface, model
+    if s['target_power'] is not None: 
+        # search mode: the smallest npp (or ntrials) that reaches the target power, starting from the npp (or ntrials) in this row
+        search, npp, ntrials = s['search'], s['npp'], s['ntrials']
+        fixed_arguments = {'ntrials': ntrials} if search == 'npp' else {('npp' if criterion == 'correlation' else 'npp_per_group'): npp}
+        if criterion == 'group_difference': fixed_arguments['cohens_d'] = s['cohens_d']
+        minimal_size, search_output = sample_size_search(target_power = s['target_power'], criterion = criterion, search = search, 
+                                                         start = npp if search == 'npp' else ntrials, 
+                                                         minimum = 5 if search == 'npp' else max(5, s['nreversals'] + 1), 
+                                                         high_performance = full_speed, pool = pool, checkpoint_file = s['checkpoint_file'], 
+                                                         nreps = s['nreps'], cut_off = s['significance_cutoff'], nreversals = s['nreversals'], 
+                                                         reward_probability = s['reward_probability'], **fixed_arguments, **options)
+        return 'search', minimal_size, search_output
+    instrumentation_file = os.path.join(s['plot_folder'], 'Instrumentation_line{}.csv'.format(i))
+    if criterion == "correlation": 
+        output, power_estimate = power_estimation_correlation(npp = s['npp'], ntrials = s['ntrials'], nreps = s['nreps'], cut_off = s['significance_cutoff'], 
+                                           high_performance = full_speed, nreversals = s['nreversals'], 
+                                           reward_probability = s['reward_probability'], 
+                                           pool = pool, checkpoint_file = s['checkpoint_file'],
+                                           instrumentation_file = instrumentation_file, dataset_store = s['dataset_store'], **options)
+    else: 
+        output, power_estimate = power_estimation_groupdifference(npp_per_group = s['npp'], ntrials = s['ntrials'], 
+                                           nreps = s['nreps'], cut_off = s['significance_cutoff'], high_performance = full_speed, 
+                                           nreversals = s['nreversals'], cohens_d = s['cohens_d'], 
+                                           reward_probability = s['reward_probability'], 
+                                           pool = pool, checkpoint_file = s['checkpoint_file'],
+                                           instrumentation_file = instrumentation_file, dataset_store = s['dataset_store'], **options)
+    return 'power', output, power_estimate
+
+def save_row(settings, result, start_time, plots = 'inline'): 
+    """
+    Parameters
+    ----------
+    settings : dict
+        The settings of a row of the Input_file (see function row_settings()).
+    result : tuple
+        The result of function compute_row() for this row.
+    start_time : datetime
+        Start of the power analysis of the Input_file.
+    plots : string, optional
+        'inline' to make the plot of this row in this process, 'background' to make it in a separate process (see Plotting.py), 
+        'none' to only save the results. The default is 'inline'.
+
+    Returns
+    -------
+    plot_process : subprocess.Popen or None
+        The process that makes the plot when plots is 'background'.
+
+    Description
+    -----------
+    Function to save the outputs of one row of the Input_file: Output_line{i}.csv (power mode), Samplesize_line{i}.csv (search mode), 
+    Powercurve_line{i}.csv (curve mode) or Powersurface_line{i}.csv (surrogate mode), and Row_line{i}.json with the settings and the 
+    power estimate of the row. The plot is made from these files by Plotting.py, so the power analysis itself never imports matplotlib or seaborn.
+    """
+    s, i = settings, settings['row']
+    plot_folder = s['plot_folder']
+    # everything Plotting.py needs besides the saved outputs
+    row = {'mode': result[0], 'criterion': s['criterion'], 'significance_cutoff': float(s['significance_cutoff']), 'npp': int(s['npp']), 
+           'ntrials': int(s['ntrials']), 'cohens_d': float(s['cohens_d']), 'search': s['search'], 
+           'target_power': 0.8 if s['target_power'] is None else float(s['target_power']), 'power_estimate': None, 'minimal_size': None}
+    if result[0] == 'curve': 
+        result[1].to_csv(os.path.join(plot_folder, 'Powercurve_line{}.csv'.format(i)), sep = ';', index = False)
+    elif result[0] == 'surrogate': 
+        result[1].to_csv(os.path.join(plot_folder, 'Powersurface_line{}.csv'.format(i)), sep = ';', index = False)
+    elif result[0] == 'search': 
+        row['minimal_size'] = None if result[1] is None else int(result[1])
+        result[2].to_csv(os.path.join(plot_folder, 'Samplesize_line{}.csv'.format(i)), sep = ';', index = False)
+    else: 
+        row['power_estimate'] = float(result[2])
+        result[1].to_csv(os.path.join(plot_folder, 'Output_line{}.csv'.format(i)), sep = ';', index = False)
+    with open(os.path.join(plot_folder, 'Row_line{}.json'.format(i)), 'w') as file: json.dump(row, file)
+    end_time = datetime.now()
+    print("\nPower analysis of row {} ended at {}; run lasted {} hours.".format(i, end_time, end_time-start_time))
+    if plots == 'inline': 
+        # matplotlib and seaborn are only imported when the first plot is made
+        import Plotting
+        Plotting.plot_row(plot_folder, i)
+    elif plots == 'background': 
+        return subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Plotting.py'), plot_folder, '--rows', str(i)])
+    return None
+
+def run_input_file(parameter_file, sequential = False, plots = 'inline'): 
+    """
+    Parameters
+    ----------
+    parameter_file : pandas DataFrame
+        The Input_file.
+    sequential : bool, optional
+        Whether the rows are done one after another instead of all at once (see Description). The default is False.
+    plots : string, optional
+        How the plots are made: 'inline' (by this process), 'background' (by a separate process for each row, while the next rows are computed) 
+        or 'none' (only the results are saved; make the plots later with Plotting.py). The default is 'inline'.
+
+    Description
+    -----------
+    Function to do the power analysis of each row of the Input_file, up to the first row with values that are not valid. 
+    By default all rows are done at once: every row is started in its own thread and hands its tasks to one shared pool 
+    (see BatchPool), which always runs the most expensive waiting tasks first (cost: ntrials x npp). A cheap row then does not wait 
+    behind an expensive one, and the workers stay busy during the last repetitions of a row. A row never uses more workers at once than 
+    its full_speed asks for (see RowPool), so a row with full_speed = 0 uses one core next to rows with full_speed = 1. The outputs and the plot of a row are saved 
+    as soon as that row is finished (see function save_row()). The rows use their own seeds, so the results are the same as when the rows are done one after another; 
+    only the order of the printed messages differs. Rows with a queue_folder share a pool of workers on other machines (see Distributed.py).
+    """
     start_time = datetime.now()
-    
     print("Power analysis started at {}.".format(start_time))
-    
+    rows = read_rows(parameter_file)
+    # the pool of each row: a pool of warm worker processes on this machine or a queue folder for workers on other machines, 
+    # created when first needed and reused by all rows
+    executors = {}
+    # the processes that make the plots when plots is 'background'
+    plot_processes = []
+    if sequential: 
+        # one pool per number of workers, the rows are done one after another
+        for settings in rows: 
+            key = settings['queue_folder'] if settings['queue_folder'] is not None else number_of_workers(settings['full_speed'])
+            if key not in executors: executors[key] = create_executor(key) if settings['queue_folder'] is None else DirectoryPool(key)
+            plot_processes.append(save_row(settings, compute_row(settings, executors[key]), start_time, plots = plots))
+    else: 
+        # one shared pool for all rows on this machine (with the largest number of workers that a row asks for) and one per queue folder
+        n_cpu = max([number_of_workers(settings['full_speed']) for settings in rows if settings['queue_folder'] is None] + [1])
+        row_pools = {}
+        for settings in rows: 
+            key = settings['queue_folder'] if settings['queue_folder'] is not None else 'local'
+            if key not in executors: 
+                pool = create_executor(n_cpu) if key == 'local' else DirectoryPool(key)
+                executors[key] = BatchPool(pool, n_cpu) if key == 'local' else BatchPool(pool)
+            # a row on this machine uses at most the number of workers it asks for with full_speed
+            max_workers = number_of_workers(settings['full_speed']) if key == 'local' else None
+            row_pools[settings['row']] = executors[key].row_pool(settings['ntrials'], row_participants(settings), max_workers = max_workers)
+        # the most expensive rows are started first, so their tasks are also submitted first when the costs are equal
+        rows = sorted(rows, key = row_cost, reverse = True)
+        with ThreadPoolExecutor(max_workers = max(1, len(rows))) as threads: 
+            futures = {threads.submit(compute_row, settings, row_pools[settings['row']]): settings for settings in rows}
+            # the outputs are saved (and the inline plots made) here, by the main thread, as soon as a row is finished (matplotlib is not thread-safe)
+            for future in as_completed(futures): 
+                settings = futures[future]
+                try: result = future.result()
+                except Exception as error: 
+                    print("Power analysis of row {} failed: {!r}".format(settings['row'], error))
+                    continue
+                plot_processes.append(save_row(settings, result, start_time, plots = plots))
+    # all rows are done: close the worker processes
+    for pool in executors.values(): 
+        pool.close()
+        pool.join()
+    for process in plot_processes: 
+        if process is not None: process.wait()
+    end_time = datetime.now()
+    print("\nPower analysis ended at {}; run lasted {} hours.".format(end_time, end_time-start_time))
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser(description = "Power analysis for each row of Input_file.csv in the current folder.")
+    parser.add_argument('--sequential', action = 'store_true', help = "do the rows one after another instead of all at once")
+    parser.add_argument('--plots', choices = ['inline', 'background', 'none'], default = 'inline', 
+                        help = "make the plots in this process, in a separate process for each row, or not at all (headless; see Plotting.py)")
+    parser.add_argument('--dry_run', action = 'store_true', 
+                        help = "only predict the wall time and peak memory of each row (saved in Dry_run.csv) from a short calibration on this machine")
+    arguments = parser.parse_args()
+    import pandas as pd
     parameter_file = pd.read_csv(os.path.join(os.getcwd(), "Input_file.csv"), delimiter = ';')
-    
-    for i in range(parameter_file.shape[0]):
-        ntrials, nreversals, npp, reward_probability, full_speed, criterion, significance_cutoff, cohens_d, nreps, plot_folder  = parameter_file.loc[i, :]
-        variables_fine = check_input_parameters(ntrials, nreversals, npp, reward_probability, full_speed, criterion, significance_cutoff, cohens_d, nreps, plot_folder)
-        if variables_fine == 0: break 
-        # should implement all the errors!
-        print("Power estimation for row {} in the input_file has begun, time for coffee whilst waiting :).".format(i))
-        if parameter_file.loc[i, 'criterion'] == "correlation": 
-            output, power_estimate = power_estimation_correlation(npp = npp, ntrials = ntrials, nreps = nreps, cut_off = significance_cutoff, 
-                                               high_performance = full_speed, nreversals = nreversals, 
-                                               reward_probability = reward_probability)
-            fig, axes = plt.subplots(nrows = 1, ncols = 1)
-            sns.kdeplot(output["correlations"], label = "correlations", ax = axes)
-            fig.suptitle("P(correlation >= {} with {} pp, {} trials)".format(significance_cutoff, npp, ntrials), fontweight = 'bold')
-            axes.set_title("Power = {}% based on {} reps".format(np.round(power_estimate*100, 2), nreps))
-        elif parameter_file.loc[i, 'criterion'] == "group_difference": 
-            output, power_estimate = power_estimation_groupdifference(npp_per_group = npp, ntrials = ntrials, 
-                                               nreps = nreps, cut_off = significance_cutoff, high_performance = full_speed, 
-                                               nreversals = nreversals, cohens_d = cohens_d, 
-                                               reward_probability = reward_probability)
-            fig, axes = plt.subplots(nrows = 1, ncols = 1)
-            sns.kdeplot(output["p_values"], label = "p_values", ax = axes)
-            fig.suptitle("P(p-value <= {}) with {} pp, {} trials".format(significance_cutoff, npp, ntrials), fontweight = 'bold')
-            axes.set_title("Power = {}% based on {} reps with ES = {}".format(np.round(power_estimate*100, 2), nreps, cohens_d))
-        else: print("Criterion not found")
-        axes.axvline(x = significance_cutoff, lw = 2, linestyle ="dashed", color ='k', label ='significance_cutoff')
-        fig.legend(loc = 'center right')
-        fig.tight_layout()
-        end_time = datetime.now()
-        print("\nPower analysis ended at {}; run lasted {} hours.".format(end_time, end_time-start_time))
-        fig.savefig(os.path.join(plot_folder, 'Distributionplot_line{}.jpg'.format(i)))
+    if arguments.dry_run: dry_run(parameter_file, sequential = arguments.sequential, output_file = os.path.join(os.getcwd(), 'Dry_run.csv'))
+    else: run_input_file(parameter_file, sequential = arguments.sequential, plots = arguments.plots)
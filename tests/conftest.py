@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""The modules of COMPASS are scripts in the folder above this one; make them importable for the tests."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the distributed execution (see Distributed.py): a power analysis on worker processes that work through a queue folder
+should give exactly the same repetitions as on a local pool with the same seed.
+"""
+import pandas as pd
+import pytest
+from Distributed import DirectoryPool, start_local_workers
+from PowerAnalysis import power_estimation_correlation
+
+settings = dict(npp = 10, ntrials = 60, nreversals = 2, nreps = 4, seed = 5)
+
+@pytest.mark.parametrize('scheduling', ['repetition', 'participant'])
+def test_directory_pool_same_as_local_pool(tmp_path, scheduling):
+    local_output, local_power = power_estimation_correlation(scheduling = scheduling, **settings)
+    queue_folder = str(tmp_path / 'queue')
+    pool = DirectoryPool(queue_folder, timeout = 60)
+    workers = start_local_workers(queue_folder, nworkers = 2, idle_timeout = 60)
+    try:
+        distributed_output, distributed_power = power_estimation_correlation(scheduling = scheduling, pool = pool, **settings)
+    finally:
+        pool.close()
+        pool.join()
+        for worker in workers: worker.wait(timeout = 60)
+    pd.testing.assert_frame_equal(distributed_output, local_output)
+    assert distributed_power == local_power
+    assert all(worker.returncode == 0 for worker in workers)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the kernel backends (see Kernels.py): with fixed seeds, the numba backend should give the same simulated responses 
+as the numpy backend and the same log likelihoods up to rounding, for the 2 X 2 task and for a task with more stimuli and responses.
+"""
+import numpy as np
+import pytest
+import Kernels
+from Functions import create_design, simulate_responses, likelihood, design_generator, participant_generator
+
+requires_numba = pytest.mark.skipif(Kernels.numba is None, reason = "numba is not installed")
+tasks = [(2, 2), (4, 3)]
+
+@pytest.fixture
+def restore_backend():
+    """The backend that was active before the test is selected again afterwards."""
+    backend = Kernels.get_backend()
+    yield
+    Kernels.set_backend(backend)
+
+@requires_numba
+@pytest.mark.parametrize('task', tasks)
+def test_check_backends(task):
+    assert Kernels.check_backends(tasks = (task, )) is True
+
+@requires_numba
+@pytest.mark.parametrize('nstimuli, nactions', tasks)
+def test_functions_same_for_both_backends(nstimuli, nactions, restore_backend):
+    design = create_design(ntrials = 240, nreversals = 6, reward_probability = 0.8, rng = design_generator(3), nstimuli = nstimuli, nactions = nactions)
+    parameter_sets = [np.array([0.3, 1.5]), np.array([0.8, 6.0]), np.array([1.9, 1000.0])]
+    results = {}
+    for backend in ['numpy', 'numba']:
+        Kernels.set_backend(backend)
+        data = np.array(design, dtype = np.int64)
+        data[:, 2] = simulate_responses(simulation_LR = 0.5, simulation_inverseTemp = 2.0, design = design, rng = participant_generator(3, 0, 0),
+                                        nactions = nactions)
+        results[backend] = (data[:, 2], np.array([likelihood(parameter_set, data, nactions) for parameter_set in parameter_sets]))
+    np.testing.assert_array_equal(results['numba'][0], results['numpy'][0])
+    np.testing.assert_allclose(results['numba'][1], results['numpy'][1], rtol = 1e-10, atol = 0)